@@ -0,0 +1,492 @@
+"""
+JSON API, version 1 (/api/v1): the crud functions behind the HTML pages, for
+scripts and integrations.
+
+- Bodies are the pydantic models in schemas.py (dates as DD/MM/YYYY, like the
+  forms); responses carry ISO dates and are serialized with orjson straight from
+  plain dicts (no jsonable_encoder pass).
+- Lists are keyset-paginated (utils/pagination.py): `limit` (max 500) and the
+  `next_cursor` of the previous page as `cursor`.
+- `fields=id,name,...` trims list and item responses to those fields.
+- Bulk variants: POST /actions/bulk, PATCH /milestones.
+- GET /search: full-text search of action comments and milestone notes.
+- GET /changes: what changed since a cursor, for clients keeping a local copy
+  (long-polls with `wait`).
+- Auth: the browser session (writes also need the X-CSRF-Token header), or
+  `Authorization: Bearer <token>` with a workspace's token (`manage.py
+  workspaces token`), or API_TOKEN, which stands for the default workspace.
+  Either way everything is read from and written to that one workspace.
+"""
+from __future__ import annotations
+import hmac
+import time
+from datetime import date, timedelta
+from typing import Annotated, Iterable
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+
+from . import events
+from .crud import aio
+from .crud import dependencies as cd
+from .crud import portfolio as cpf
+from .crud.changes import CursorExpired
+from .db import async_session_scope
+from .models import Project
+from .schemas import ActionBulk, ActionCreate, CategoryCreate, MilestoneBatch, MilestoneCreate, ProjectCreate
+from .security.auth import current_workspace_id
+from .security.csrf import validate_csrf
+from .settings import settings
+from .utils.pagination import Page
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+async def authenticate(request: Request) -> int:
+    """The caller's workspace: a bearer token's, or the browser session's."""
+    auth = request.headers.get("authorization", "")
+    if auth[:7].lower() == "bearer ":
+        token = auth[7:].strip()
+        async with async_session_scope() as db:
+            if settings.api_token and hmac.compare_digest(token.encode(), settings.api_token.encode()):
+                return await aio.workspaces.default_workspace_id(db)
+            workspace_id = await aio.workspaces.workspace_for_token(db, token)
+        if workspace_id is None:
+            raise HTTPException(status_code=401, detail="Invalid API token")
+        return workspace_id
+    workspace_id = current_workspace_id(request)
+    if not workspace_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if request.method not in SAFE_METHODS:
+        validate_csrf(request, request.headers.get("x-csrf-token", ""))
+    return workspace_id
+
+
+# every endpoint takes it: the session it opens is scoped to that workspace (app/tenancy.py)
+WorkspaceId = Annotated[int, Depends(authenticate)]
+
+router = APIRouter(prefix="/api/v1", dependencies=[Depends(authenticate)], default_response_class=ORJSONResponse)
+
+
+# --- serialization ---
+
+CATEGORY_FIELDS = ("id", "name", "description")
+PROJECT_FIELDS = ("id", "category_id", "name", "objective", "description", "color", "end_date", "status",
+                  "milestones", "milestones_done", "avg_percent", "overdue", "at_risk")
+MILESTONE_FIELDS = ("id", "project_id", "name", "note", "end_date", "percent_complete", "status",
+                    "projected_end", "effective_risk")
+ACTION_FIELDS = ("id", "date", "minutes", "comment", "project_id", "milestone_id", "project_name", "milestone_name")
+SEARCH_FIELDS = ("kind", "id", "date", "minutes", "project_id", "project_name", "milestone_id", "milestone_name",
+                 "rank", "highlight")
+
+
+def _category(c) -> dict:
+    return {"id": c.id, "name": c.name, "description": c.description}
+
+
+def _project(p) -> dict:
+    current = p.progress_date == date.today()
+    return {
+        "id": p.id, "category_id": p.category_id, "name": p.name, "objective": p.objective,
+        "description": p.description, "color": p.color, "end_date": p.end_date, "status": p.status,
+        "milestones": p.ms_total, "milestones_done": p.ms_done, "avg_percent": round(p.avg_percent, 1),
+        # date-dependent counters: null until today's maintenance sweep or a milestone write
+        "overdue": p.ms_overdue if current else None, "at_risk": p.ms_risk if current else None,
+    }
+
+
+def _milestone(m) -> dict:
+    return {
+        "id": m.id, "project_id": m.project_id, "name": m.name, "note": m.note, "end_date": m.end_date,
+        "percent_complete": m.percent_complete, "status": m.status,
+        "projected_end": m.projected_end, "effective_risk": m.effective_risk,
+    }
+
+
+def _action(a) -> dict:
+    return {f: getattr(a, f) for f in ACTION_FIELDS}
+
+
+def _search_hit(h) -> dict:
+    return {f: getattr(h, f) for f in SEARCH_FIELDS}
+
+
+def _dependency(d) -> dict:
+    return {"id": d.id, "project_id": d.project_id,
+            "from_milestone_id": d.from_milestone_id, "to_milestone_id": d.to_milestone_id}
+
+
+_CHANGED = {"category": _category, "project": _project, "milestone": _milestone,
+            "dependency": _dependency, "action": _action}
+
+
+def _change(c) -> dict:
+    out = {"entity": c.entity, "id": c.id, "op": c.op}
+    if c.row is not None:
+        out["data"] = _CHANGED[c.entity](c.row)
+    return out
+
+
+def _fields(fields: str | None, allowed: Iterable[str]) -> list[str] | None:
+    if not fields:
+        return None
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    return wanted
+
+
+def _pick(d: dict, wanted: list[str] | None) -> dict:
+    return d if wanted is None else {f: d[f] for f in wanted}
+
+
+def _item(d: dict, wanted: list[str] | None, status_code: int = 200) -> ORJSONResponse:
+    return ORJSONResponse(_pick(d, wanted), status_code=status_code)
+
+
+def _page(page: Page, serialize, wanted: list[str] | None) -> ORJSONResponse:
+    return ORJSONResponse({"items": [_pick(serialize(r), wanted) for r in page.items],
+                           "next_cursor": page.next_cursor})
+
+
+def _failed(e: ValueError) -> HTTPException:
+    msg = str(e)
+    return HTTPException(status_code=404 if msg.endswith("not found") else 400, detail=msg)
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+
+
+# --- categories ---
+
+@router.get("/categories")
+async def list_categories(ws: WorkspaceId, cursor: str | None = None, limit: int = 50, fields: str | None = None):
+    wanted = _fields(fields, CATEGORY_FIELDS)
+    async with async_session_scope(ws) as db:
+        try:
+            page = await aio.categories.page_categories(db, cursor, limit)
+        except ValueError as e:
+            raise _failed(e)
+    return _page(page, _category, wanted)
+
+
+@router.get("/categories/{category_id}")
+async def get_category(ws: WorkspaceId, category_id: int, fields: str | None = None):
+    wanted = _fields(fields, CATEGORY_FIELDS)
+    async with async_session_scope(ws) as db:
+        c = await aio.categories.get_category(db, category_id)
+        if not c:
+            raise HTTPException(status_code=404, detail="Category not found")
+        return _item(_category(c), wanted)
+
+
+async def _save_category(ws: int, category_id: int | None, body: CategoryCreate, status_code: int):
+    try:
+        async with async_session_scope(ws) as db:
+            c = await aio.categories.upsert_category(db, id=category_id, name=body.name.strip(),
+                                                     description=(body.description or "").strip() or None)
+            out = _category(c)
+    except ValueError as e:
+        raise _failed(e)
+    return _item(out, None, status_code)
+
+
+@router.post("/categories")
+async def create_category(ws: WorkspaceId, body: CategoryCreate):
+    return await _save_category(ws, None, body, 201)
+
+
+@router.put("/categories/{category_id}")
+async def update_category(ws: WorkspaceId, category_id: int, body: CategoryCreate):
+    return await _save_category(ws, category_id, body, 200)
+
+
+# --- projects ---
+
+@router.get("/projects")
+async def list_projects(ws: WorkspaceId, category_id: int | None = None, status: str | None = None,
+                        cursor: str | None = None, limit: int = 50, fields: str | None = None):
+    wanted = _fields(fields, PROJECT_FIELDS)
+    async with async_session_scope(ws) as db:
+        try:
+            page = await aio.projects.page_projects(db, category_id, status, cursor, limit)
+        except ValueError as e:
+            raise _failed(e)
+    return _page(page, _project, wanted)
+
+
+@router.get("/projects/{project_id}")
+async def get_project(ws: WorkspaceId, project_id: int, fields: str | None = None):
+    wanted = _fields(fields, PROJECT_FIELDS)
+    async with async_session_scope(ws) as db:
+        p = await aio.run(db, Session.get, Project, project_id)  # get_project also loads the milestones
+        if not p:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return _item(_project(p), wanted)
+
+
+async def _save_project(ws: int, project_id: int | None, body: ProjectCreate, status_code: int):
+    try:
+        async with async_session_scope(ws) as db:
+            p = await aio.projects.upsert_project(
+                db, id=project_id, category_id=body.category_id, name=body.name.strip(),
+                objective=(body.objective or "").strip() or None,
+                description=(body.description or "").strip() or None,
+                color=(body.color or "").strip() or None,
+                end_date_dmy=body.end_date_dmy.strip(), status=body.status,
+            )
+            out = _project(p)
+    except ValueError as e:
+        raise _failed(e)
+    return _item(out, None, status_code)
+
+
+@router.post("/projects")
+async def create_project(ws: WorkspaceId, body: ProjectCreate):
+    return await _save_project(ws, None, body, 201)
+
+
+@router.put("/projects/{project_id}")
+async def update_project(ws: WorkspaceId, project_id: int, body: ProjectCreate):
+    return await _save_project(ws, project_id, body, 200)
+
+
+@router.get("/projects/{project_id}/graph")
+async def project_graph(request: Request, ws: WorkspaceId, project_id: int):
+    today = date.today()
+    async with async_session_scope(ws) as db:
+        version = await aio.projects.project_graph_version(db, project_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        headers = {"ETag": cd.graph_etag(project_id, version, today), "Cache-Control": "private, no-cache"}
+        if _not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        data = await aio.dependencies.graph_for_project(db, project_id, today)
+    headers["ETag"] = cd.graph_etag(project_id, data["version"], today)
+    return ORJSONResponse(data, headers=headers)
+
+
+# --- milestones ---
+
+@router.get("/milestones")
+async def list_milestones(ws: WorkspaceId, project_id: int | None = None, status: str | None = None,
+                          cursor: str | None = None, limit: int = 50, fields: str | None = None):
+    wanted = _fields(fields, MILESTONE_FIELDS)
+    async with async_session_scope(ws) as db:
+        try:
+            page = await aio.milestones.page_milestones(db, project_id, status, cursor, limit)
+        except ValueError as e:
+            raise _failed(e)
+    return _page(page, _milestone, wanted)
+
+
+@router.get("/milestones/{milestone_id}")
+async def get_milestone(ws: WorkspaceId, milestone_id: int, fields: str | None = None):
+    wanted = _fields(fields, MILESTONE_FIELDS)
+    async with async_session_scope(ws) as db:
+        m = await aio.milestones.get_milestone(db, milestone_id)
+        if not m:
+            raise HTTPException(status_code=404, detail="Milestone not found")
+        return _item(_milestone(m), wanted)
+
+
+async def _save_milestone(ws: int, milestone_id: int | None, body: MilestoneCreate, status_code: int):
+    try:
+        async with async_session_scope(ws) as db:
+            m = await aio.milestones.upsert_milestone(
+                db, id=milestone_id, project_id=body.project_id, name=body.name.strip(),
+                end_date_dmy=body.end_date_dmy.strip(), percent_complete=body.percent_complete,
+                status=body.status, note=(body.note or "").strip() or None, dependent_to_id=body.dependent_to_id,
+            )
+            out = _milestone(m)
+    except ValueError as e:
+        raise _failed(e)
+    return _item(out, None, status_code)
+
+
+@router.post("/milestones")
+async def create_milestone(ws: WorkspaceId, body: MilestoneCreate):
+    return await _save_milestone(ws, None, body, 201)
+
+
+@router.put("/milestones/{milestone_id}")
+async def update_milestone(ws: WorkspaceId, milestone_id: int, body: MilestoneCreate):
+    return await _save_milestone(ws, milestone_id, body, 200)
+
+
+@router.patch("/milestones")
+async def update_milestones(ws: WorkspaceId, body: MilestoneBatch):
+    """Bulk percent / status / note changes; per-item results, bad items skipped."""
+    changes = [c.model_dump(exclude_unset=True) for c in body.changes]
+    async with async_session_scope(ws) as db:
+        results = await aio.milestones.apply_milestone_changes(db, changes)
+    return ORJSONResponse({
+        "updated": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "results": results,
+    })
+
+
+# --- actions ---
+
+@router.get("/actions")
+async def list_actions(ws: WorkspaceId, start: date | None = None, end: date | None = None,
+                       project_id: int | None = None, cursor: str | None = None, limit: int = 50,
+                       fields: str | None = None):
+    """Newest first; `start` / `end` are ISO dates, either may be left open."""
+    wanted = _fields(fields, ACTION_FIELDS)
+    async with async_session_scope(ws) as db:
+        try:
+            page = await aio.actions.page_actions(db, start, end, project_id, cursor, limit)
+        except ValueError as e:
+            raise _failed(e)
+    return _page(page, _action, wanted)
+
+
+@router.post("/actions")
+async def create_action(ws: WorkspaceId, body: ActionCreate):
+    try:
+        async with async_session_scope(ws) as db:
+            a = await aio.actions.add_action(
+                db, project_id=body.project_id, milestone_id=body.milestone_id,
+                date_dmy=body.date_dmy.strip(), hhmm=body.hhmm.strip(),
+                comment=(body.comment or "").strip() or None,
+            )
+            row = await aio.actions.get_action_row(db, a.id, a.date)
+            out = {"id": a.id, "date": a.date, "minutes": a.minutes, "comment": a.comment,
+                   "project_id": a.project_id, "milestone_id": a.milestone_id,
+                   "project_name": row.project_name, "milestone_name": row.milestone_name}
+    except ValueError as e:
+        raise _failed(e)
+    return _item(out, None, 201)
+
+
+@router.post("/actions/bulk")
+async def create_actions(ws: WorkspaceId, body: ActionBulk):
+    """Up to 1000 actions in one insert; rejected items are reported by index, the rest are kept."""
+    items = [{"project_id": a.project_id, "milestone_id": a.milestone_id, "date": a.date_dmy,
+              "hhmm": a.hhmm, "comment": a.comment} for a in body.actions]
+    async with async_session_scope(ws) as db:
+        errors = await aio.actions.add_actions_bulk(db, items)
+    return ORJSONResponse({
+        "inserted": len(items) - len(errors),
+        "failed": len(errors),
+        "errors": [{"index": i, "error": msg} for i, msg in errors],
+    }, status_code=201 if len(errors) < len(items) else 400)
+
+
+# --- search ---
+
+@router.get("/search")
+async def search(ws: WorkspaceId, q: str = "", kind: str | None = None, project_id: int | None = None,
+                 category_id: int | None = None, start: date | None = None, end: date | None = None,
+                 cursor: str | None = None, limit: int = 50, fields: str | None = None):
+    """
+    Full-text search of action comments and milestone notes, best match first.
+    `kind` is action or milestone; `highlight` is an HTML excerpt with the matches in <mark>.
+    Only the newest 1000 matches of each kind are ranked: `truncated` says there were
+    more, reached by narrowing the words or the dates.
+    """
+    wanted = _fields(fields, SEARCH_FIELDS)
+    async with async_session_scope(ws) as db:
+        try:
+            page = await aio.search.search_text(db, q, kind=kind, project_id=project_id, category_id=category_id,
+                                                start=start, end=end, cursor=cursor, limit=limit)
+        except ValueError as e:
+            raise _failed(e)
+    return ORJSONResponse({"items": [_pick(_search_hit(h), wanted) for h in page.items],
+                           "next_cursor": page.next_cursor, "truncated": page.truncated})
+
+
+# --- change feed ---
+
+CHANGES_MAX_WAIT = 30  # seconds
+# a waiting request is woken by the workspace's "changes" events (events.py); it also
+# looks every few seconds for writes that send none (maintenance, other processes
+# with the local events backend)
+CHANGES_POLL_SECONDS = 5.0
+
+
+@router.get("/changes")
+async def changes(ws: WorkspaceId, since: str | None = None, limit: int = 500, wait: float = 0):
+    """
+    Categories, projects, milestones, dependencies and actions written after the
+    cursor `since`, oldest first, each once: upserts with the current row in `data`
+    (shaped like the entity's GET), deletes with the id only. A deleted category
+    or project takes what belongs to it along. Follow `cursor`; `more` means the
+    next batch is ready. Without `since`: no changes, the cursor to start from
+    (take it before a full load). `wait` (up to 30 seconds) holds an empty answer
+    until something changes. 410: the cursor is older than the kept log, load
+    everything again.
+    """
+    deadline = time.monotonic() + max(0.0, min(wait, CHANGES_MAX_WAIT))
+    with events.subscribe(ws) as sub:
+        while True:
+            async with async_session_scope(ws) as db:
+                try:
+                    feed = await aio.changes.read_changes(db, since, limit)
+                except CursorExpired as e:
+                    raise HTTPException(status_code=410, detail=str(e))
+                except ValueError as e:
+                    raise _failed(e)
+                items = [_change(c) for c in feed.changes]
+            left = deadline - time.monotonic()
+            if items or feed.more or since is None or left <= 0:
+                break
+            since = feed.cursor
+            await sub.get(min(CHANGES_POLL_SECONDS, left))
+    return ORJSONResponse({"changes": items, "cursor": feed.cursor, "more": feed.more})
+
+
+# --- aggregations ---
+
+@router.get("/totals")
+async def totals(ws: WorkspaceId, start: date | None = None, end: date | None = None, by: str = "day"):
+    """Minutes over [start, end] (default: the last 7 days) per day, project or category."""
+    end = end or date.today()
+    start = start or end - timedelta(days=6)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start is after end")
+    async with async_session_scope(ws) as db:
+        if by == "day":
+            rows = [{"date": d, "minutes": m} for d, m in await aio.actions.totals_by_day_range(db, start, end)]
+        elif by == "project":
+            rows = [{"project_id": r.project_id, "name": r.name, "minutes": r.total_minutes}
+                    for r in await aio.actions.totals_by_project_range(db, start, end)]
+        elif by == "category":
+            rows = [{"category_id": r.category_id, "name": r.category, "minutes": r.minutes}
+                    for r in await aio.actions.totals_by_category_range(db, start, end)]
+        else:
+            raise HTTPException(status_code=400, detail="by must be day, project or category")
+    return ORJSONResponse({"start": start, "end": end, "by": by,
+                           "total": sum(r["minutes"] for r in rows), "rows": rows})
+
+
+@router.get("/progress")
+async def progress(ws: WorkspaceId):
+    """Per project with milestones: progress counters and today's overdue / at-risk counts."""
+    today = date.today()
+    async with async_session_scope(ws) as db:
+        overview = await aio.reports.project_progress_overview(db)
+        health = await aio.reports.project_milestone_health(db, today)
+    return ORJSONResponse({"date": today, "projects": [{
+        "project_id": pid, "milestones": p.total_ms, "milestones_done": p.done_ms,
+        "avg_percent": round(p.avg_percent, 1),
+        "overdue": health[pid].overdue if pid in health else 0,
+        "at_risk": health[pid].risk if pid in health else 0,
+    } for pid, p in sorted(overview.items())]})
+
+
+@router.get("/portfolio")
+async def portfolio(request: Request, ws: WorkspaceId, category_id: int | None = None):
+    today = date.today()
+    async with async_session_scope(ws) as db:
+        stamp = await aio.portfolio.portfolio_stamp(db)
+        headers = {"ETag": cpf.portfolio_etag(stamp, category_id, today), "Cache-Control": "private, no-cache"}
+        if _not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        data, _ = await aio.portfolio.portfolio(db, today, category_id, stamp)
+    return ORJSONResponse(data, headers=headers)
@@ -1,7 +1,9 @@
-from . import categories, projects, milestones, dependencies, actions, reports, users
+from . import categories, projects, progress, schedule, milestones, dependencies, portfolio, actions, reports, users
+from . import workspaces, search, changes
+from . import aio
 
 __all__ = [
-    "categories", "projects", "milestones", "dependencies",
-    "actions", "reports", "users"
+    "categories", "projects", "progress", "schedule", "milestones", "dependencies", "portfolio",
+    "actions", "reports", "users", "workspaces", "search", "changes", "aio"
 ]
 
@@ -1,13 +1,20 @@
 from __future__ import annotations
-from typing import Optional, List
+from collections import defaultdict
+from typing import Optional, List, Any
 from types import SimpleNamespace
 from datetime import date, timedelta
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert, update, delete
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from ..models import Action, Project, Milestone, Category
+from .. import events
+from ..models import Action, ActionDaily, Project, Milestone, Category
+from ..tenancy import session_workspace
 from ..utils.formatting import parse_dmy, hhmm_to_minutes
+from ..utils.pagination import Keyset, Page
+from .changes import record_changes
+from .reports import invalidate_report_dates, invalidate_reports_all
 
 
 # ------------------------
@@ -48,50 +55,424 @@ def add_action(
     )
     db.add(a)
     db.flush()
+    _bump_rollup(db, proj.workspace_id, d, project_id, milestone_id, minutes, 1)
+    record_changes(db, "action", [a.id], workspace_id=proj.workspace_id)
+    invalidate_report_dates(db, [d])
+    events.emit(db, "action", {"id": a.id, "date": d}, workspace_id=proj.workspace_id)
+    _emit_totals(db, proj.workspace_id, {d})
     return a
 
 
+# newest first: follows ix_actions_ws_date_id
+ACTION_KEYSET = Keyset((Action.date, True), (Action.id, True))
+
+
+def actions_by_date_stmt(day: date):
+    return (
+        select(
+            Action.id,
+            Action.date,
+            Action.minutes,
+            Action.comment,
+            Project.name.label("project_name"),
+            Milestone.name.label("milestone_name"),
+        )
+        .join(Project, Project.id == Action.project_id)
+        .join(Milestone, Milestone.id == Action.milestone_id, isouter=True)
+        .where(Action.date == day)
+        .order_by(Action.id.desc())
+    )
+
+
+def _action_row(r) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=r.id,
+        date=r.date,
+        minutes=int(r.minutes or 0),
+        comment=r.comment,
+        project_name=r.project_name,
+        milestone_name=r.milestone_name,
+    )
+
+
 def list_actions_by_date(db: Session, day: date) -> List[SimpleNamespace]:
     """
     Return actions for a given date with project/milestone names,
     in a template-friendly structure.
     """
+    rows = db.execute(actions_by_date_stmt(day)).all()
+    return [_action_row(r) for r in rows]
+
+
+def page_actions_by_date(
+    db: Session, day: date, cursor: Optional[str] = None, limit: Optional[int] = None
+) -> Page:
+    """list_actions_by_date one keyset page at a time (newest first); items are the same rows."""
+    page = ACTION_KEYSET.page(db, actions_by_date_stmt(day).order_by(None), cursor, limit)
+    return Page([_action_row(r) for r in page.items], page.next_cursor)
+
+
+def get_action_row(db: Session, action_id: int, day: date) -> Optional[SimpleNamespace]:
+    """One action in the list_actions_by_date shape (e.g. to render a freshly added row)."""
+    r = db.execute(actions_by_date_stmt(day).where(Action.id == action_id)).first()
+    return _action_row(r) if r else None
+
+
+def export_actions_stmt(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    project_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+):
+    """Actions with project/milestone/category names for export, oldest first."""
     stmt = (
         select(
             Action.id,
             Action.date,
             Action.minutes,
-            Action.comment,
+            Action.project_id,
             Project.name.label("project_name"),
+            Action.milestone_id,
             Milestone.name.label("milestone_name"),
+            Project.category_id,
+            Category.name.label("category_name"),
+            Action.comment,
         )
         .join(Project, Project.id == Action.project_id)
         .join(Milestone, Milestone.id == Action.milestone_id, isouter=True)
-        .where(Action.date == day)
-        .order_by(Action.id.desc())
+        .join(Category, Category.id == Project.category_id, isouter=True)
+        .order_by(Action.date, Action.id)
     )
-    rows = db.execute(stmt).all()
-    return [
-        SimpleNamespace(
-            id=r.id,
-            date=r.date,
-            minutes=int(r.minutes or 0),
-            comment=r.comment,
-            project_name=r.project_name,
-            milestone_name=r.milestone_name,
+    if start:
+        stmt = stmt.where(Action.date >= start)
+    if end:
+        stmt = stmt.where(Action.date <= end)
+    if project_id:
+        stmt = stmt.where(Action.project_id == project_id)
+    if category_id:
+        stmt = stmt.where(Project.category_id == category_id)
+    return stmt
+
+
+# ------------------------
+# Daily rollup maintenance
+# ------------------------
+
+def _bump_rollup(
+    db: Session,
+    workspace_id: int,
+    day: date,
+    project_id: int,
+    milestone_id: Optional[int],
+    minutes: int,
+    entries: int,
+) -> None:
+    """
+    Apply a (minutes, entries) delta to the rollup row of (day, project, milestone).
+    Call with positive deltas on insert, negative on delete, and both on an edit
+    that moves an action between keys. Runs in the caller's transaction.
+    `workspace_id` is the project's (new rows are Core inserts, not stamped on flush).
+    """
+    ms_match = (
+        ActionDaily.milestone_id.is_(None) if milestone_id is None
+        else ActionDaily.milestone_id == milestone_id
+    )
+    row_id = db.execute(
+        select(ActionDaily.id)
+        .where(ActionDaily.date == day, ActionDaily.project_id == project_id, ms_match)
+        .order_by(ActionDaily.id)
+        .limit(1)
+        .with_for_update()
+    ).scalar()
+    if row_id is None:
+        if entries > 0:
+            db.execute(insert(ActionDaily).values(
+                workspace_id=workspace_id, date=day, project_id=project_id, milestone_id=milestone_id,
+                minutes=minutes, entries=entries,
+            ))
+        return
+    db.execute(
+        update(ActionDaily)
+        .where(ActionDaily.id == row_id)
+        .values(minutes=ActionDaily.minutes + minutes, entries=ActionDaily.entries + entries)
+        .execution_options(synchronize_session=False)
+    )
+    if entries < 0:
+        db.execute(delete(ActionDaily).where(ActionDaily.id == row_id, ActionDaily.entries <= 0))
+
+
+def rollup_source_stmt(start: Optional[date] = None, end: Optional[date] = None):
+    """Rollup rows computed from `actions`, for all dates or only [start, end]."""
+    src = (
+        select(
+            Action.workspace_id,
+            Action.date,
+            Action.project_id,
+            Action.milestone_id,
+            func.sum(Action.minutes),
+            func.count(Action.id),
         )
-        for r in rows
-    ]
+        .group_by(Action.workspace_id, Action.date, Action.project_id, Action.milestone_id)
+    )
+    if start:
+        src = src.where(Action.date >= start)
+    if end:
+        src = src.where(Action.date <= end)
+    return src
+
+
+def rebuild_action_rollup(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Recompute the daily rollup from `actions`, for all dates or only [start, end].
+    Returns the number of rollup rows written. Partitions detached from `actions`
+    (app.partitions) are no longer visible here: restrict rebuilds to attached years.
+    A workspace-scoped session rebuilds only that workspace.
+    """
+    clear = delete(ActionDaily)
+    if start:
+        clear = clear.where(ActionDaily.date >= start)
+    if end:
+        clear = clear.where(ActionDaily.date <= end)
+    db.execute(clear)
+    src = rollup_source_stmt(start, end)
+    ws = session_workspace(db)
+    if ws is not None:
+        # INSERT ... SELECT is not scoped by the session (see app/tenancy.py)
+        src = src.where(Action.workspace_id == ws)
+    db.execute(
+        insert(ActionDaily).from_select(
+            ["workspace_id", "date", "project_id", "milestone_id", "minutes", "entries"], src
+        )
+    )
+    db.flush()
+    invalidate_reports_all(db)
+    count = select(func.count(ActionDaily.id))
+    if start:
+        count = count.where(ActionDaily.date >= start)
+    if end:
+        count = count.where(ActionDaily.date <= end)
+    return int(db.execute(count).scalar_one() or 0)
+
+
+def ensure_action_rollup(db: Session) -> bool:
+    """Backfill the rollup once for databases that predate it. Returns True if rebuilt."""
+    has_rollup = db.execute(select(ActionDaily.id).limit(1)).first() is not None
+    if has_rollup:
+        return False
+    has_actions = db.execute(select(Action.id).limit(1)).first() is not None
+    if not has_actions:
+        return False
+    rebuild_action_rollup(db)
+    return True
+
+
+def action_rows_stmt():
+    """Actions with their project / milestone names (the /api/v1 action shape)."""
+    return (
+        select(
+            Action.id,
+            Action.date,
+            Action.minutes,
+            Action.comment,
+            Action.project_id,
+            Action.milestone_id,
+            Project.name.label("project_name"),
+            Milestone.name.label("milestone_name"),
+        )
+        .join(Project, Project.id == Action.project_id)
+        .join(Milestone, Milestone.id == Action.milestone_id, isouter=True)
+    )
+
+
+def page_actions(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    project_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Page:
+    """Actions in [start, end] (either side open), newest first, with project/milestone names."""
+    stmt = action_rows_stmt()
+    if start:
+        stmt = stmt.where(Action.date >= start)
+    if end:
+        stmt = stmt.where(Action.date <= end)
+    if project_id:
+        stmt = stmt.where(Action.project_id == project_id)
+    return ACTION_KEYSET.page(db, stmt, cursor, limit)
+
+
+# ------------------------
+# Bulk import
+# ------------------------
+
+def load_action_refs(
+    db: Session, project_ids: Optional[set] = None, milestone_ids: Optional[set] = None
+) -> SimpleNamespace:
+    """
+    Valid ids for import validation, loaded once per import instead of a get() per row.
+    Limited to the given ids when known up front (small batches); all ids otherwise.
+    `projects` maps each project to its workspace, which its actions are written to.
+    """
+    projects = select(Project.id, Project.workspace_id)
+    milestones = select(Milestone.id, Milestone.project_id)
+    if project_ids is not None:
+        projects = projects.where(Project.id.in_(project_ids))
+    if milestone_ids is not None:
+        milestones = milestones.where(Milestone.id.in_(milestone_ids))
+    return SimpleNamespace(
+        projects=dict(db.execute(projects).all()),
+        milestone_projects=dict(db.execute(milestones).all()),
+    )
+
+
+def _import_int(value: Any, name: str, required: bool) -> Optional[int]:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+
+
+def action_from_import(rec: dict, refs: SimpleNamespace) -> dict:
+    """
+    Validate one imported record against `refs` (see load_action_refs) and return
+    the `actions` row to insert. Same rules as add_action; raises ValueError.
+    """
+    raw_date = str(rec.get("date") or "").strip()
+    d = parse_dmy(raw_date)
+    if not d:
+        try:
+            d = date.fromisoformat(raw_date)
+        except ValueError:
+            raise ValueError("Invalid date (use DD/MM/YYYY or YYYY-MM-DD)")
+
+    if rec.get("minutes") not in (None, ""):
+        minutes = _import_int(rec.get("minutes"), "minutes", True)
+        if minutes <= 0:
+            raise ValueError("minutes must be positive")
+    else:
+        minutes = hhmm_to_minutes(str(rec.get("hhmm") or "").strip())
+
+    project_id = _import_int(rec.get("project_id"), "project_id", True)
+    if project_id not in refs.projects:
+        raise ValueError("Project not found")
+    milestone_id = _import_int(rec.get("milestone_id"), "milestone_id", False) or None
+    if milestone_id is not None:
+        owner = refs.milestone_projects.get(milestone_id)
+        if owner is None:
+            raise ValueError("Milestone not found")
+        if owner != project_id:
+            raise ValueError("Milestone does not belong to the selected project")
+
+    comment = rec.get("comment")
+    comment = str(comment).strip() if comment is not None else ""
+    return {"workspace_id": refs.projects[project_id], "project_id": project_id, "milestone_id": milestone_id,
+            "date": d, "minutes": minutes, "comment": comment or None}
+
+
+def _insert_actions(db: Session, rows: list[dict]) -> None:
+    # one executemany (batched multi-row VALUES), returning the ids for the change log
+    inserted = db.execute(insert(Action).returning(Action.id, Action.workspace_id), rows).all()
+    by_workspace: dict[int, list[int]] = defaultdict(list)
+    for action_id, ws in inserted:
+        by_workspace[ws].append(action_id)
+    for ws, ids in by_workspace.items():
+        record_changes(db, "action", ids, workspace_id=ws)
+    deltas: dict[tuple, list[int]] = defaultdict(lambda: [0, 0])
+    for r in rows:
+        acc = deltas[(r["workspace_id"], r["date"], r["project_id"], r["milestone_id"])]
+        acc[0] += r["minutes"]
+        acc[1] += 1
+    for (ws, d, pid, mid), (minutes, entries) in deltas.items():
+        _bump_rollup(db, ws, d, pid, mid, minutes, entries)
+    invalidate_report_dates(db, {r["date"] for r in rows})
+
+
+def insert_actions_batch(db: Session, rows: list[tuple[int, dict]]) -> list[tuple[int, str]]:
+    """
+    Insert validated (line, row) pairs in one statement and apply their rollup
+    deltas once per (date, project, milestone). Runs in a savepoint: if the batch
+    fails (e.g. a project deleted meanwhile), rows are retried one by one so only
+    the offending lines are rejected. Returns [(line, error)] for rejected rows.
+    """
+    if not rows:
+        return []
+    try:
+        with db.begin_nested():
+            _insert_actions(db, [r for _, r in rows])
+        _emit_inserted(db, [r for _, r in rows])
+        return []
+    except SQLAlchemyError:
+        pass
+    errors, inserted = [], []
+    for line, row in rows:
+        try:
+            with db.begin_nested():
+                _insert_actions(db, [row])
+            inserted.append(row)
+        except SQLAlchemyError as e:
+            errors.append((line, str(getattr(e, "orig", e)).splitlines()[0]))
+    _emit_inserted(db, inserted)
+    return errors
+
+
+def _emit_inserted(db: Session, rows: list[dict]) -> None:
+    """"actions" and "totals" events of a batch, per workspace."""
+    days: dict[int, set[date]] = defaultdict(set)
+    counts: dict[int, int] = defaultdict(int)
+    for r in rows:
+        days[r["workspace_id"]].add(r["date"])
+        counts[r["workspace_id"]] += 1
+    for ws, ds in days.items():
+        events.emit(db, "actions", {"count": counts[ws], "start": min(ds), "end": max(ds)}, workspace_id=ws)
+        _emit_totals(db, ws, ds)
+
+
+def add_actions_bulk(db: Session, items: list[dict]) -> list[tuple[int, str]]:
+    """
+    add_action for many records ({"project_id", "milestone_id", "date", "hhmm" or
+    "minutes", "comment"}, as in imports): validated against the ids they reference,
+    inserted with one statement. Returns [(index, error)] for the rejected ones.
+    """
+    refs = load_action_refs(
+        db,
+        project_ids={r.get("project_id") for r in items},
+        milestone_ids={r.get("milestone_id") for r in items if r.get("milestone_id")},
+    )
+    rows, errors = [], []
+    for i, rec in enumerate(items):
+        try:
+            rows.append((i, action_from_import(rec, refs)))
+        except ValueError as e:
+            errors.append((i, str(e)))
+    errors += insert_actions_batch(db, rows)
+    return sorted(errors)
+
+
+def _emit_totals(db: Session, workspace_id: int, days: set[date]) -> None:
+    """
+    "totals" event: the minutes of the days [start, end] moved. Pages fetch the new
+    totals when it arrives, after the commit: summed here, inside the transaction,
+    they would miss a concurrent writer's minutes.
+    """
+    if days:
+        events.emit(db, "totals", {"start": min(days), "end": max(days)}, workspace_id=workspace_id)
 
 
 # ------------------------
 # Aggregations for reports
+# (read from the daily rollup, so cost follows days × projects, not entries)
 # ------------------------
 
 def total_minutes_range(db: Session, start: date, end: date) -> int:
     """Total minutes across a closed date interval [start, end]."""
-    stmt = select(func.coalesce(func.sum(Action.minutes), 0)).where(
-        Action.date >= start, Action.date <= end
+    stmt = select(func.coalesce(func.sum(ActionDaily.minutes), 0)).where(
+        ActionDaily.date >= start, ActionDaily.date <= end
     )
     return int(db.execute(stmt).scalar_one() or 0)
 
@@ -102,9 +483,9 @@ def totals_by_day_range(db: Session, start: date, end: date) -> List[tuple[date,
     Returns list of (date, minutes) in chronological order.
     """
     stmt = (
-        select(Action.date, func.coalesce(func.sum(Action.minutes), 0))
-        .where(Action.date >= start, Action.date <= end)
-        .group_by(Action.date)
+        select(ActionDaily.date, func.coalesce(func.sum(ActionDaily.minutes), 0))
+        .where(ActionDaily.date >= start, ActionDaily.date <= end)
+        .group_by(ActionDaily.date)
     )
     rows = dict(db.execute(stmt).all())  # {date: minutes}
     out: List[tuple[date, int]] = []
@@ -124,11 +505,11 @@ def totals_by_project_range(
     Returns list of SimpleNamespace(name, project_id, total_minutes).
     """
     stmt = (
-        select(Project.id, Project.name, func.coalesce(func.sum(Action.minutes), 0).label("m"))
-        .join(Project, Project.id == Action.project_id)
-        .where(Action.date >= start, Action.date <= end)
+        select(Project.id, Project.name, func.coalesce(func.sum(ActionDaily.minutes), 0).label("m"))
+        .join(Project, Project.id == ActionDaily.project_id)
+        .where(ActionDaily.date >= start, ActionDaily.date <= end)
         .group_by(Project.id, Project.name)
-        .order_by(func.coalesce(func.sum(Action.minutes), 0).desc())
+        .order_by(func.coalesce(func.sum(ActionDaily.minutes), 0).desc())
     )
     if limit:
         stmt = stmt.limit(limit)
@@ -151,14 +532,14 @@ def totals_by_category_range(
         select(
             Category.id,
             Category.name,
-            func.coalesce(func.sum(Action.minutes), 0).label("m"),
+            func.coalesce(func.sum(ActionDaily.minutes), 0).label("m"),
         )
-        .select_from(Action)
-        .join(Project, Project.id == Action.project_id)
+        .select_from(ActionDaily)
+        .join(Project, Project.id == ActionDaily.project_id)
         .join(Category, Category.id == Project.category_id, isouter=True)
-        .where(Action.date >= start, Action.date <= end)
+        .where(ActionDaily.date >= start, ActionDaily.date <= end)
         .group_by(Category.id, Category.name)
-        .order_by(func.coalesce(func.sum(Action.minutes), 0).desc())
+        .order_by(func.coalesce(func.sum(ActionDaily.minutes), 0).desc())
     )
     rows = db.execute(stmt).all()
     out: List[SimpleNamespace] = []
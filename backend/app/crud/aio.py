@@ -0,0 +1,61 @@
+"""
+Async entry points to the crud modules, for handlers holding an AsyncSession:
+
+    from ..crud import aio
+    async with async_session_scope() as db:
+        rows = await aio.actions.list_actions_by_date(db, day)
+
+Every crud function keeps a single (sync `Session`) implementation; the proxies
+run it through `AsyncSession.run_sync`, which drives the same ORM code over the
+async driver (asyncpg / aiosqlite) on the event loop, without a worker thread.
+"""
+from __future__ import annotations
+from functools import wraps
+from types import ModuleType
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import categories as _categories, projects as _projects, milestones as _milestones
+from . import dependencies as _dependencies, actions as _actions, reports as _reports, users as _users
+from . import portfolio as _portfolio, workspaces as _workspaces, search as _search, changes as _changes
+
+
+def run(db: AsyncSession, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Awaitable[Any]:
+    """Run any `fn(session, *args, **kwargs)` against an AsyncSession."""
+    return db.run_sync(fn, *args, **kwargs)
+
+
+class AsyncCrud:
+    """Awaitable view of a crud module: `await proxy.fn(async_db, ...)` calls `module.fn(sync_db, ...)`."""
+
+    def __init__(self, module: ModuleType):
+        self._module = module
+
+    def __getattr__(self, name: str):
+        fn = getattr(self._module, name)
+        if not callable(fn) or name.startswith("_"):
+            raise AttributeError(f"{self._module.__name__}.{name} is not a crud function")
+
+        @wraps(fn)
+        async def call(db: AsyncSession, *args: Any, **kwargs: Any):
+            return await db.run_sync(fn, *args, **kwargs)
+
+        setattr(self, name, call)  # cache: later lookups skip __getattr__
+        return call
+
+    def __repr__(self) -> str:
+        return f"<AsyncCrud {self._module.__name__}>"
+
+
+categories = AsyncCrud(_categories)
+projects = AsyncCrud(_projects)
+milestones = AsyncCrud(_milestones)
+dependencies = AsyncCrud(_dependencies)
+portfolio = AsyncCrud(_portfolio)
+actions = AsyncCrud(_actions)
+reports = AsyncCrud(_reports)
+users = AsyncCrud(_users)
+workspaces = AsyncCrud(_workspaces)
+search = AsyncCrud(_search)
+changes = AsyncCrud(_changes)
@@ -1,10 +1,18 @@
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 from ..models import Category
+from ..utils.pagination import Keyset, Page
+from .changes import DELETE, record_changes
+from .reports import invalidate_reports_all
+
+CATEGORY_KEYSET = Keyset((Category.name, False), (Category.id, False))
 
 def list_categories(db: Session) -> list[Category]:
     return list(db.execute(select(Category).order_by(Category.name)).scalars())
 
+def page_categories(db: Session, cursor: str | None = None, limit: int | None = None) -> Page:
+    return CATEGORY_KEYSET.page(db, select(Category), cursor, limit, scalars=True)
+
 def get_category(db: Session, category_id: int) -> Category | None:
     return db.get(Category, category_id)
 
@@ -15,14 +23,20 @@ def upsert_category(db: Session, *, id: int | None, name: str, description: str
             raise ValueError("Category not found")
         obj.name = name
         obj.description = description
+        invalidate_reports_all(db)
     else:
         obj = Category(name=name, description=description)
         db.add(obj)
     db.flush()
+    record_changes(db, "category", [obj.id])
     return obj
 
 def delete_category(db: Session, category_id: int) -> None:
     obj = db.get(Category, category_id)
     if obj:
+        # its projects go with it (and theirs with them)
+        record_changes(db, "project", [p.id for p in obj.projects], DELETE)
+        record_changes(db, "category", [obj.id], DELETE)
         db.delete(obj)
+        invalidate_reports_all(db)
 
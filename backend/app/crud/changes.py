@@ -0,0 +1,168 @@
+"""
+Change log for incremental sync (GET /api/v1/changes).
+
+Every crud write of a category, project, milestone, dependency or action appends
+a `changes` row (entity, id, upsert or delete) in its own transaction, with
+record_changes, the way it invalidates reports. Derived writes count too: the
+milestones whose projections moved and the projects whose progress counters were
+rewritten, maintenance sweeps included. A deleted category takes its projects
+with it, and a deleted project its milestones, dependencies and actions; only the
+category and project deletes are logged.
+
+A client keeps a cursor and reads what was written after it (read_changes): each
+entity once per batch with its current row, so catching up costs what changed,
+not the size of the workspace. The cursor is (txid, id), see models.CHANGE_TXID.
+
+Changes older than CHANGE_LOG_DAYS are pruned by maintenance, which notes the last
+one pruned per workspace (Workspace.changes_pruned_id); a cursor from before it is
+refused (CursorExpired) and the client loads everything again.
+"""
+from __future__ import annotations
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, literal, literal_column, select, update
+from sqlalchemy.orm import Session
+
+from .. import events
+from ..models import Action, Category, Change, Dependency, Milestone, Project, Workspace
+from ..settings import settings
+from ..tenancy import session_workspace
+from ..utils.pagination import Keyset, decode_cursor, encode_cursor
+
+UPSERT, DELETE = "upsert", "delete"
+ENTITIES = {
+    "category": Category,
+    "project": Project,
+    "milestone": Milestone,
+    "dependency": Dependency,
+    "action": Action,
+}
+
+# follows ix_changes_workspace_txid_id
+CHANGE_KEYSET = Keyset((Change.txid, False), (Change.id, False))
+
+# transactions below this one have all ended (committed or not)
+_PG_XMIN = literal_column("pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+
+class CursorExpired(ValueError):
+    """The cursor predates pruned changes: the client has to load everything again."""
+
+
+def record_changes(db: Session, entity: str, ids: Iterable[int | None], op: str = UPSERT,
+                   workspace_id: int | None = None) -> None:
+    """
+    Log a write of these rows, in the caller's transaction. Deletes are recorded
+    before the rows go. The workspace is the session's (or `workspace_id`); on
+    unscoped sessions it is read from the rows themselves. Long-polling readers of
+    a known workspace are woken with a "changes" event on commit.
+    """
+    ids = sorted({int(i) for i in ids if i})
+    if not ids:
+        return
+    ws = workspace_id or session_workspace(db)
+    if ws is not None:
+        db.execute(insert(Change), [{"workspace_id": ws, "entity": entity, "entity_id": i, "op": op} for i in ids])
+        events.emit(db, "changes", {}, workspace_id=ws)
+        return
+    model = ENTITIES[entity]
+    db.execute(insert(Change).from_select(
+        ["workspace_id", "entity", "entity_id", "op"],
+        select(model.workspace_id, literal(entity), model.id, literal(op)).where(model.id.in_(ids)),
+    ))
+
+
+def _visible(db: Session, stmt):
+    """PostgreSQL: only changes of finished transactions, so none can show up behind a cursor later."""
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = stmt.where(Change.txid < _PG_XMIN)
+    return stmt
+
+
+def _pruned_id(db: Session) -> int:
+    return db.execute(
+        select(Workspace.changes_pruned_id).where(Workspace.id == session_workspace(db))
+    ).scalar() or 0
+
+
+def changes_head(db: Session) -> str:
+    """Cursor of the workspace's latest change: where a client that just loaded everything starts."""
+    last = db.execute(
+        _visible(db, select(Change.txid, Change.id)).order_by(Change.txid.desc(), Change.id.desc()).limit(1)
+    ).first()
+    return encode_cursor(tuple(last) if last else (0, _pruned_id(db)))
+
+
+def _rows(db: Session, entity: str, ids: list[int]) -> dict[int, object]:
+    """Current rows by id: ORM objects, or name-joined rows for actions."""
+    if not ids:
+        return {}
+    if entity == "action":
+        from .actions import action_rows_stmt
+        return {r.id: r for r in db.execute(action_rows_stmt().where(Action.id.in_(ids)))}
+    model = ENTITIES[entity]
+    return {o.id: o for o in db.execute(select(model).where(model.id.in_(ids))).scalars()}
+
+
+def read_changes(db: Session, since: str | None, limit: int | None = None) -> SimpleNamespace:
+    """
+    Changes after the cursor `since`, at most `limit` log entries per batch,
+    collapsed to the last one per (entity, id) in the order they were written.
+    Returns SimpleNamespace(changes=[SimpleNamespace(entity, id, op, row)],
+    cursor, more): `row` is the current row of an upsert (None for deletes); rows
+    gone since are skipped, their delete follows. Without `since`, no changes and
+    the head cursor. Raises CursorExpired for a pruned cursor.
+    """
+    if since is None:
+        return SimpleNamespace(changes=[], cursor=changes_head(db), more=False)
+    key = decode_cursor(since, CHANGE_KEYSET.columns)
+    if not all(isinstance(v, int) for v in key):
+        raise ValueError("Invalid cursor")
+    if key[1] < _pruned_id(db):
+        raise CursorExpired("Cursor expired: load everything again")
+
+    stmt = _visible(db, select(Change.txid, Change.id, Change.entity, Change.entity_id, Change.op))
+    page = CHANGE_KEYSET.page(db, stmt, since, limit)
+    latest: dict[tuple[str, int], str] = {}
+    for c in page.items:
+        latest.pop((c.entity, c.entity_id), None)  # re-inserted: ordered by the last write
+        latest[(c.entity, c.entity_id)] = c.op
+    rows = {entity: _rows(db, entity, [i for (e, i), op in latest.items() if e == entity and op == UPSERT])
+            for entity in ENTITIES}
+
+    changes = []
+    for (entity, entity_id), op in latest.items():
+        row = rows[entity].get(entity_id) if op == UPSERT else None
+        if op == UPSERT and row is None:
+            continue
+        changes.append(SimpleNamespace(entity=entity, id=entity_id, op=op, row=row))
+    cursor = encode_cursor(CHANGE_KEYSET.key(page.items[-1])) if page.items else since
+    return SimpleNamespace(changes=changes, cursor=cursor, more=page.next_cursor is not None)
+
+
+def prune_changes(db: Session, now: datetime | None = None) -> int:
+    """Maintenance: drop changes older than CHANGE_LOG_DAYS (0 keeps them all); returns how many."""
+    if settings.change_log_days <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=settings.change_log_days)
+    # ids are handed out in time order: everything up to the newest old one goes
+    mark = db.execute(
+        select(Change.id).where(Change.created_at < cutoff).order_by(Change.id.desc()).limit(1)
+    ).scalar()
+    if mark is None:
+        return 0
+    last = (
+        select(func.max(Change.id))
+        .where(Change.workspace_id == Workspace.id, Change.id <= mark)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(Workspace)
+        .values(changes_pruned_id=func.coalesce(last, Workspace.changes_pruned_id))
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(
+        delete(Change).where(Change.id <= mark).execution_options(synchronize_session=False)
+    ).rowcount
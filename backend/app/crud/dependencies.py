@@ -3,10 +3,13 @@ from sqlalchemy import select, and_
 from sqlalchemy.orm import Session
 from ..models import Dependency, Milestone
 from ..crud.milestones import list_project_milestones_health
+from ..crud.changes import DELETE, record_changes
+from ..crud.projects import project_graph_version, touch_project_graphs
+from ..crud.schedule import check_new_dependency, project_dep_graph, refresh_projections
+from ..utils.formatting import dmy
+from ..utils.depgraph import DepGraph
 
 def add_dependency(db: Session, project_id: int, from_id: int, to_id: int) -> Dependency:
-    if from_id == to_id:
-        raise ValueError("A milestone cannot depend on itself")
     exists = db.execute(
         select(Dependency).filter(
             Dependency.project_id == project_id,
@@ -16,9 +19,13 @@ def add_dependency(db: Session, project_id: int, from_id: int, to_id: int) -> De
     ).scalars().first()
     if exists:
         return exists
+    check_new_dependency(db, project_id, from_id, to_id)
     dep = Dependency(project_id=project_id, from_milestone_id=from_id, to_milestone_id=to_id)
     db.add(dep)
     db.flush()
+    record_changes(db, "dependency", [dep.id])
+    touch_project_graphs(db, [project_id])
+    refresh_projections(db, project_id, [to_id])
     return dep
 
 def list_dependencies(db: Session, project_id: int) -> list[Dependency]:
@@ -30,52 +37,60 @@ def list_dependencies(db: Session, project_id: int) -> list[Dependency]:
 
 def remove_dependency(db: Session, dep_id: int):
     d = db.get(Dependency, dep_id)
-    if d: db.delete(d)
+    if d:
+        record_changes(db, "dependency", [d.id], DELETE)
+        db.delete(d)
+        db.flush()
+        touch_project_graphs(db, [d.project_id])
+        refresh_projections(db, d.project_id, [d.to_milestone_id])
 
 # --- vis-network graph data ---
 
+# Format 4: one row per node / edge, columns named once, with topological levels,
+# slack and the projected end (when it slipped past the planned one) precomputed.
+# The client places nodes by level instead of running vis-network's hierarchical
+# layout. Styling is applied by static/js/nodeview_vis.js (FocusPointGraph.expand).
+GRAPH_FORMAT = 4
+GRAPH_NODE_FIELDS = ["id", "name", "percent", "end", "health", "status", "level", "slack", "projected"]
+GRAPH_EDGE_FIELDS = ["id", "from", "to"]
+
+def graph_etag(project_id: int, version: int, today: date) -> str:
+    # health depends on today, so the tag changes daily as well as on writes
+    return f'W/"g{GRAPH_FORMAT}-{project_id}-{version}-{today.isoformat()}"'
+
 def graph_for_project(db: Session, project_id: int, today: date) -> dict:
     """
-    Returns dict with 'nodes' and 'edges' for vis-network.
-    Nodes contain id, label, title (tooltip), color, border, and size by %.
-    Edges contain from, to, arrows='to', color.
+    Compact graph of a project's milestones (nodes) and dependencies (edges):
+    {"format", "version", "node_fields", "nodes": [[...], ...], "edge_fields", "edges",
+     "critical": [milestone ids], "cycle": [ids] | None}.
+    `version` is the project's graph_version read before the rows, so a concurrent
+    write can only make the payload newer than its ETag, never older.
     """
+    version = project_graph_version(db, project_id)
     ms = list_project_milestones_health(db, project_id, today)
-    deps = list_dependencies(db, project_id)
-
-    nodes = []
-    for m in ms:
-        # color border by health; white background; size by percent
-        border = {"ok": "#2ec27e", "risk": "#ffcc66", "late": "#ff6b6b"}.get(m["health"], "#ddd")
-        size = 20 + (m["percent_complete"] / 100.0) * 20  # 20..40
-        label = f'{m["name"]}\n{m["percent_complete"]}% · {m["end_date"].strftime("%d/%m/%Y")}'
-        nodes.append({
-            "id": str(m["id"]),
-            "label": label,
-            "title": f'{m["name"]} — ends {m["end_date"].strftime("%d/%m/%Y")}',
-            "shape": "box",
-            "margin": 8,
-            "color": {
-                "background": "#ffffff",
-                "border": border,
-                "highlight": {"background": "#ffffff", "border": "#7c4dff"},
-                "hover": {"background": "#ffffff", "border": "#7c4dff"},
-            },
-            "font": {"color": "#111", "size": 12, "multi": "html"},
-            "borderWidth": 3,
-            "widthConstraint": {"maximum": 260},
-            "heightConstraint": {"minimum": 36, "maximum": 80},
-            "size": size,
-        })
-
-    edges = [{
-        "id": str(d.id),
-        "from": str(d.from_milestone_id),
-        "to": str(d.to_milestone_id),
-        "arrows": "to",
-        "color": {"color": "#2f1bb3", "highlight": "#7c4dff", "hover": "#7c4dff"},
-        "width": 3
-    } for d in deps]
-
-    return {"nodes": nodes, "edges": edges}
+    deps = db.execute(
+        select(Dependency.id, Dependency.from_milestone_id, Dependency.to_milestone_id)
+        .where(Dependency.project_id == project_id)
+    ).all()
+    g = project_dep_graph(db, project_id) if version is not None else DepGraph({}, [])
+    return {
+        "format": GRAPH_FORMAT,
+        "version": version,
+        "node_fields": GRAPH_NODE_FIELDS,
+        "edge_fields": GRAPH_EDGE_FIELDS,
+        **compact_graph(ms, deps, g),
+    }
 
+def compact_graph(ms: list[dict], deps, g: DepGraph) -> dict:
+    """nodes / edges rows (GRAPH_NODE_FIELDS / GRAPH_EDGE_FIELDS), critical path and cycle
+    from milestone health rows, (id, from, to) dependency rows and the project's DepGraph."""
+    levels, slack = g.levels(), g.slack()
+    return {
+        "nodes": [[m["id"], m["name"], m["percent_complete"], dmy(m["end_date"]), m["health"], m["status"],
+                   levels.get(m["id"], 0), slack.get(m["id"]),
+                   dmy(m["projected_end"]) if m["projected_end"] else None]
+                  for m in ms],
+        "edges": [list(d) for d in deps],
+        "critical": g.critical_path(),
+        "cycle": g.find_cycle(),
+    }
@@ -1,15 +1,18 @@
+from collections import defaultdict
 from datetime import date
-from sqlalchemy import select
+from sqlalchemy import select, func, case, or_, and_, text, union
 from sqlalchemy.orm import Session, selectinload
-from ..models import Milestone, Dependency
-from ..utils.formatting import parse_dmy
+from ..models import Milestone, Dependency, Project
+from ..utils.formatting import parse_dmy, dmy
+from ..utils.pagination import Keyset, Page
+from .changes import record_changes
+from .reports import invalidate_report_milestones
+from .projects import touch_project_graphs
+from .schedule import check_new_dependency, milestone_health, refresh_projections, worst_risk
 
 def _health(m: Milestone, today: date) -> str:
-    if (today > m.end_date and m.percent_complete < 100):
-        return "late"
-    if ((m.end_date - today).days <= 7 and m.percent_complete < 80):
-        return "risk"
-    return "ok"
+    """Stored effective risk (dependencies included), never better than the milestone's own health today."""
+    return worst_risk(m.effective_risk, milestone_health(m, today))
 
 def upsert_milestone(
     db: Session, *, id: int | None, project_id: int, name: str, end_date_dmy: str,
@@ -19,11 +22,14 @@ def upsert_milestone(
     if not end_d:
         raise ValueError("Invalid end date (use DD/MM/YYYY)")
     percent_complete = max(0, min(100, int(percent_complete)))
+    if not db.get(Project, project_id):
+        raise ValueError("Project not found")
 
     if id:
         m = db.get(Milestone, id)
         if not m:
             raise ValueError("Milestone not found")
+        touched = {m.project_id, project_id}
         m.project_id = project_id
         m.name = name
         m.end_date = end_d
@@ -31,17 +37,19 @@ def upsert_milestone(
         m.status = status
         m.note = note
     else:
+        touched = {project_id}
         m = Milestone(
             project_id=project_id, name=name, end_date=end_d,
             percent_complete=percent_complete, status=status, note=note
         )
         db.add(m)
         db.flush()  # to have m.id
+    # before the cycle check below, so it does not cache a graph with these uncommitted edits
+    touch_project_graphs(db, touched)
 
     # optional dependency: dependent_to_id -> m (i.e., m depends on dependent_to_id)
+    dep = None
     if dependent_to_id:
-        if dependent_to_id == m.id:
-            raise ValueError("A milestone cannot depend on itself")
         exists = db.execute(
             select(Dependency).filter(
                 Dependency.project_id == project_id,
@@ -50,20 +58,35 @@ def upsert_milestone(
             )
         ).scalars().first()
         if not exists:
-            db.add(Dependency(
+            check_new_dependency(db, project_id, dependent_to_id, m.id)
+            dep = Dependency(
                 project_id=project_id,
                 from_milestone_id=dependent_to_id,
                 to_milestone_id=m.id
-            ))
+            )
+            db.add(dep)
 
     db.flush()
+    record_changes(db, "milestone", [m.id])
+    if dep is not None:
+        record_changes(db, "dependency", [dep.id])
+    for pid in touched:
+        refresh_projections(db, pid, [m.id] if pid == m.project_id else None)
+    invalidate_report_milestones(db)
     return m
 
+def get_milestone(db: Session, milestone_id: int) -> Milestone | None:
+    return db.get(Milestone, milestone_id)
+
 def set_percent(db: Session, milestone_id: int, value: int) -> Milestone:
     m = db.get(Milestone, milestone_id)
     if not m: raise ValueError("Milestone not found")
     m.percent_complete = max(0, min(100, int(value)))
     db.flush()
+    record_changes(db, "milestone", [m.id])
+    invalidate_report_milestones(db)
+    touch_project_graphs(db, [m.project_id])
+    refresh_projections(db, m.project_id, [m.id])
     return m
 
 def set_note(db: Session, milestone_id: int, note: str | None) -> Milestone:
@@ -71,8 +94,93 @@ def set_note(db: Session, milestone_id: int, note: str | None) -> Milestone:
     if not m: raise ValueError("Milestone not found")
     m.note = note
     db.flush()
+    record_changes(db, "milestone", [m.id])
+    touch_project_graphs(db, [m.project_id])
     return m
 
+MILESTONE_STATUSES = {"active", "on_hold", "archived", "done"}
+
+def apply_milestone_changes(db: Session, changes: list[dict]) -> list[dict]:
+    """
+    Batch update for reviews: each change is {"id", and any of "percent_complete",
+    "note", "status"}. Targets are loaded in one query and written with one flush;
+    a bad item is reported in its result and skipped, the others still apply.
+    Returns one {"id", "ok", ...} per change, in order.
+    """
+    ids = {int(c["id"]) for c in changes if c.get("id") is not None}
+    found = {m.id: m for m in db.execute(select(Milestone).where(Milestone.id.in_(ids))).scalars()} if ids else {}
+
+    results, report_dirty, touched = [], False, defaultdict(set)
+    for c in changes:
+        m = found.get(c.get("id"))
+        if m is None:
+            results.append({"id": c.get("id"), "ok": False, "error": "Milestone not found"})
+            continue
+        status = c.get("status")
+        if status is not None and status not in MILESTONE_STATUSES:
+            results.append({"id": m.id, "ok": False, "error": f"Unknown status '{status}'"})
+            continue
+        if c.get("percent_complete") is not None:
+            pct = max(0, min(100, int(c["percent_complete"])))
+            report_dirty |= pct != m.percent_complete
+            m.percent_complete = pct
+        if status is not None:
+            report_dirty |= status != m.status
+            m.status = status
+        if "note" in c:
+            m.note = (c["note"] or "").strip() or None
+        touched[m.project_id].add(m.id)
+        results.append({"id": m.id, "ok": True, "percent_complete": m.percent_complete,
+                        "status": m.status, "note": m.note})
+
+    db.flush()
+    record_changes(db, "milestone", [r["id"] for r in results if r["ok"]])
+    if report_dirty:
+        invalidate_report_milestones(db)
+    touch_project_graphs(db, touched)
+    for pid, ids in touched.items():
+        refresh_projections(db, pid, ids)
+    return results
+
+# per project by end date: follows ix_milestones_project_end_name
+MILESTONE_KEYSET = Keyset((Milestone.project_id, False), (Milestone.end_date, False),
+                          (Milestone.name, False), (Milestone.id, False))
+
+def page_milestones(
+    db: Session, project_id: int | None = None, status: str | None = None,
+    cursor: str | None = None, limit: int | None = None
+) -> Page:
+    stmt = select(Milestone)
+    if project_id:
+        stmt = stmt.where(Milestone.project_id == project_id)
+    if status:
+        stmt = stmt.where(Milestone.status == status)
+    return MILESTONE_KEYSET.page(db, stmt, cursor, limit, scalars=True)
+
+def list_review_milestones(db: Session, until: date, today: date) -> list[dict]:
+    """Open milestones due on or before `until` (overdue ones included), for the week review."""
+    rows = db.execute(
+        select(Milestone, Project.name.label("project_name"))
+        .join(Project, Project.id == Milestone.project_id)
+        .where(Milestone.status != "done", Milestone.end_date <= until)
+        .order_by(Milestone.end_date, Project.name, Milestone.name)
+    ).all()
+    return [{
+        "id": m.id, "name": m.name, "project_name": project_name, "end_date": m.end_date,
+        "percent_complete": m.percent_complete, "status": m.status,
+        "note": m.note, "health": _health(m, today),
+        "projected_end": m.projected_end if m.projected_end and m.projected_end > m.end_date else None,
+    } for m, project_name in rows]
+
+def milestone_health_row(m: Milestone, today: date) -> dict:
+    return {
+        "id": m.id, "name": m.name, "end_date": m.end_date,
+        "percent_complete": m.percent_complete, "status": m.status,
+        "note": m.note, "health": _health(m, today),
+        # only when upstream slips (or being overdue) push it past its own end date
+        "projected_end": m.projected_end if m.projected_end and m.projected_end > m.end_date else None,
+    }
+
 def list_project_milestones_health(db: Session, project_id: int, today: date) -> list[dict]:
     ms = list(
         db.execute(
@@ -80,9 +188,80 @@ def list_project_milestones_health(db: Session, project_id: int, today: date) ->
             .order_by(Milestone.end_date, Milestone.name)
         ).scalars()
     )
-    return [{
-        "id": m.id, "name": m.name, "end_date": m.end_date,
-        "percent_complete": m.percent_complete, "status": m.status,
-        "note": m.note, "health": _health(m, today)
-    } for m in ms]
+    return [milestone_health_row(m, today) for m in ms]
+
+
+# --- name search (add-action autocomplete) ---
+
+_trigram_index: bool | None = None
+
+def trigram_search_available(db: Session) -> bool:
+    """pg_trgm indexes from migration 0003 present (checked once per process)."""
+    global _trigram_index
+    if _trigram_index is None:
+        _trigram_index = db.get_bind().dialect.name == "postgresql" and bool(db.execute(
+            text("SELECT to_regclass('ix_milestones_name_trgm') IS NOT NULL")
+        ).scalar())
+    return _trigram_index
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _prefix_match(expr, word: str, dialect: str):
+    # index-friendly prefix test: LIKE on text_pattern_ops (PostgreSQL), a range elsewhere
+    if dialect == "postgresql":
+        return expr.like(_like_escape(word) + "%", escape="\\")
+    return and_(expr >= word, expr < word + "\uffff")
 
+def search_milestones(db: Session, q: str, limit: int = 20) -> list[dict]:
+    """
+    Milestones whose milestone or project name matches every word of `q`.
+    Active milestones rank first, then name-prefix matches, then (pg_trgm)
+    similarity, then the nearest end date.
+    With pg_trgm words match anywhere in the names; otherwise the first word
+    must start the milestone or project name (indexed), later words match anywhere.
+    """
+    words = [w for w in q.lower().replace("→", " ").split() if w != "->"][:5]
+    if not words:
+        return []
+    dialect = db.get_bind().dialect.name
+    m_name, p_name = func.lower(Milestone.name), func.lower(Project.name)
+    first = words[0]
+
+    stmt = (
+        select(Milestone.id, Milestone.name, Milestone.project_id, Milestone.status,
+               Milestone.end_date, Project.name.label("project_name"))
+        .join(Project, Project.id == Milestone.project_id)
+    )
+    trigram = trigram_search_available(db)
+
+    def match(expr, w):
+        if trigram:
+            return expr.like(f"%{_like_escape(w)}%", escape="\\")
+        return _prefix_match(expr, w, dialect)
+
+    # The first word picks candidates through one index per table (an OR across the
+    # join could use neither); later words only filter those candidates.
+    candidates = union(
+        select(Milestone.id).where(match(m_name, first)),
+        select(Milestone.id).join(Project, Project.id == Milestone.project_id).where(match(p_name, first)),
+    )
+    stmt = stmt.where(Milestone.id.in_(select(candidates.subquery().c.id)))
+    for w in words[1:]:
+        pat = f"%{_like_escape(w)}%"
+        stmt = stmt.where(or_(m_name.like(pat, escape="\\"), p_name.like(pat, escape="\\")))
+
+    status_rank = case((Milestone.status == "active", 0), (Milestone.status == "on_hold", 1), else_=2)
+    prefix_rank = case((m_name.like(_like_escape(first) + "%", escape="\\"), 0),
+                       (p_name.like(_like_escape(first) + "%", escape="\\"), 1), else_=2)
+    order = [status_rank, prefix_rank]
+    if trigram:
+        phrase = " ".join(words)
+        order.append(func.greatest(func.similarity(m_name, phrase), func.similarity(p_name, phrase)).desc())
+    order += [Milestone.end_date, Milestone.name]
+
+    rows = db.execute(stmt.order_by(*order).limit(max(1, min(limit, 100)))).all()
+    return [{
+        "id": r.id, "name": r.name, "project_id": r.project_id, "project_name": r.project_name,
+        "status": r.status, "end_date": dmy(r.end_date), "label": f"{r.project_name} → {r.name}",
+    } for r in rows]
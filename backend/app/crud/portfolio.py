@@ -0,0 +1,122 @@
+"""
+Portfolio view: every active project's milestone health summary and compact
+dependency graph, from three bulk queries (projects, milestones, dependencies)
+whatever the number of projects.
+
+Results are cached per (workspace, category filter, day). The stamp is the report cache
+versions (milestone and project writes bump them) plus count and sum of
+projects.graph_version (every milestone or dependency write bumps one), read
+with two small queries per request, led by the workspace id.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from ..models import Category, Dependency, Milestone, Project
+from ..settings import settings
+from ..tenancy import cache_scope, session_workspace
+from ..utils.cache import LRUCache
+from ..utils.depgraph import DepGraph
+from ..utils.formatting import dmy
+from .dependencies import GRAPH_EDGE_FIELDS, GRAPH_FORMAT, GRAPH_NODE_FIELDS, compact_graph
+from .milestones import milestone_health_row
+from .reports import CACHE_GLOBAL, CACHE_MILESTONES, cache_versions
+from .schedule import worst_risk
+
+_cache = LRUCache(settings.portfolio_cache_size)
+
+
+def portfolio_stamp(db: Session) -> tuple[int, ...]:
+    versions = cache_versions(db, [CACHE_MILESTONES, CACHE_GLOBAL])
+    count, total = db.execute(
+        select(func.count(Project.id), func.coalesce(func.sum(Project.graph_version), 0))
+    ).one()
+    # the workspace leads: two workspaces can add up to the same counts
+    return (session_workspace(db) or 0, versions.get(CACHE_MILESTONES, 0), versions.get(CACHE_GLOBAL, 0),
+            int(count), int(total))
+
+
+def portfolio_etag(stamp: tuple[int, ...], category_id: int | None, today: date) -> str:
+    return f'W/"p{GRAPH_FORMAT}-{category_id or 0}-{"-".join(map(str, stamp))}-{today.isoformat()}"'
+
+
+def _summary(rows: list[dict]) -> dict:
+    open_rows = [m for m in rows if m["status"] != "done"]
+    nxt = open_rows[0] if open_rows else None  # rows come ordered by end date
+    return {
+        "milestones": len(rows),
+        "done": len(rows) - len(open_rows),
+        "avg_percent": round(sum(m["percent_complete"] for m in rows) / len(rows), 1) if rows else 0,
+        "late": sum(1 for m in open_rows if m["health"] == "late"),
+        "risk": sum(1 for m in open_rows if m["health"] == "risk"),
+        "slipping": sum(1 for m in open_rows if m["projected_end"]),
+        "health": worst_risk(*(m["health"] for m in open_rows)),
+        "next_due": {"id": nxt["id"], "name": nxt["name"], "end": dmy(nxt["end_date"])} if nxt else None,
+    }
+
+
+def build_portfolio(db: Session, today: date, category_id: int | None = None) -> dict:
+    active = select(Project.id).where(Project.status == "active")
+    if category_id:
+        active = active.where(Project.category_id == category_id)
+
+    projects = db.execute(
+        select(Project.id, Project.name, Project.color, Project.end_date, Project.category_id,
+               Category.name.label("category"))
+        .join(Category, Category.id == Project.category_id, isouter=True)
+        .where(Project.id.in_(active))
+        .order_by(Category.name, Project.name)
+    ).all()
+    ms_by_project: dict[int, list[Milestone]] = defaultdict(list)
+    for m in db.execute(
+        select(Milestone).where(Milestone.project_id.in_(active))
+        .order_by(Milestone.project_id, Milestone.end_date, Milestone.name)
+    ).scalars():
+        ms_by_project[m.project_id].append(m)
+    deps_by_project: dict[int, list[tuple[int, int, int]]] = defaultdict(list)
+    for pid, dep_id, a, b in db.execute(
+        select(Dependency.project_id, Dependency.id, Dependency.from_milestone_id, Dependency.to_milestone_id)
+        .where(Dependency.project_id.in_(active))
+    ):
+        deps_by_project[pid].append((dep_id, a, b))
+
+    out = []
+    for p in projects:
+        ms = ms_by_project.get(p.id, [])
+        deps = deps_by_project.get(p.id, [])
+        rows = [milestone_health_row(m, today) for m in ms]
+        g = DepGraph({m.id: m.end_date for m in ms}, [(a, b) for _, a, b in deps])
+        out.append({
+            "id": p.id, "name": p.name, "color": p.color, "end_date": dmy(p.end_date),
+            "category_id": p.category_id, "category": p.category or "Uncategorized",
+            "summary": _summary(rows),
+            **compact_graph(rows, deps, g),
+        })
+    return {
+        "format": GRAPH_FORMAT,
+        "date": today.isoformat(),
+        "category_id": category_id,
+        "node_fields": GRAPH_NODE_FIELDS,
+        "edge_fields": GRAPH_EDGE_FIELDS,
+        "totals": {
+            "projects": len(out),
+            "late": sum(1 for p in out if p["summary"]["health"] == "late"),
+            "risk": sum(1 for p in out if p["summary"]["health"] == "risk"),
+        },
+        "projects": out,
+    }
+
+
+def portfolio(db: Session, today: date, category_id: int | None = None,
+              stamp: tuple[int, ...] | None = None) -> tuple[dict, tuple[int, ...]]:
+    """(portfolio, stamp); served from the cache while the stamp (read here unless given) matches."""
+    stamp = stamp or portfolio_stamp(db)
+    key = (cache_scope(db), category_id or None, today)
+    entry = _cache.get(key, is_valid=lambda e: e[0] == stamp)
+    if entry is None:
+        entry = (stamp, build_portfolio(db, today, category_id))
+        _cache.put(key, entry)
+    return entry[1], stamp
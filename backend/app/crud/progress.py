@@ -0,0 +1,114 @@
+"""
+Milestone counters stored on each project (ms_total, ms_done, ms_percent_sum,
+ms_overdue, ms_risk), so the projects list and reports read one row per project
+instead of aggregating every milestone.
+
+Every milestone or dependency write ends in crud.schedule.refresh_projections,
+which recomputes the counters of that project here with one grouped query over
+its milestones, holding the project row lock so concurrent writes cannot
+overwrite each other's counters. Overdue and at-risk also move with the date: they hold as of
+Project.progress_date, the daily maintenance sweep moves every project to
+today, and readers compute instead while a project is behind (see
+crud.reports.project_milestone_health).
+
+    python -m app.manage reconcile-progress [--dry-run]
+"""
+from __future__ import annotations
+import logging
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import select, func, case, or_, update
+from sqlalchemy.orm import Session
+
+from ..models import Milestone, Project
+from .changes import record_changes
+from .reports import HEALTH_LOOKAHEAD_DAYS, milestone_health_sums
+
+log = logging.getLogger(__name__)
+
+COUNTERS = ("ms_total", "ms_done", "ms_percent_sum", "ms_overdue", "ms_risk")
+# the counters that depend on the date, only comparable once progress_date is today
+DATED = {"ms_overdue", "ms_risk"}
+_EMPTY = dict.fromkeys(COUNTERS, 0)
+
+
+def compute_progress(db: Session, today: date, project_ids: Iterable[int] | None = None) -> dict[int, dict]:
+    """{project_id: counters} from the milestones, for projects that have any (all projects when ids is None)."""
+    overdue_col, risk_col = milestone_health_sums(today, HEALTH_LOOKAHEAD_DAYS)
+    stmt = select(
+        Milestone.project_id,
+        func.count(Milestone.id),
+        func.sum(case((Milestone.status == "done", 1), else_=0)),
+        func.coalesce(func.sum(Milestone.percent_complete), 0),
+        overdue_col,
+        risk_col,
+    ).group_by(Milestone.project_id)
+    if project_ids is not None:
+        stmt = stmt.where(Milestone.project_id.in_(project_ids))
+    return {int(pid): dict(zip(COUNTERS, (int(v or 0) for v in vals))) for pid, *vals in db.execute(stmt)}
+
+
+def _write(db: Session, rows: dict[int, dict], today: date) -> None:
+    if rows:
+        db.execute(update(Project), [{"id": pid, **vals, "progress_date": today} for pid, vals in rows.items()])
+        record_changes(db, "project", rows)
+
+
+def refresh_project_progress(db: Session, project_ids: Iterable[int | None], today: date | None = None) -> None:
+    """
+    Recompute the counters of these projects (after a milestone write, flushed).
+    The values are absolute: callers hold the project rows locked (refresh_projections).
+    """
+    ids = {int(pid) for pid in project_ids if pid}
+    if not ids:
+        return
+    today = today or date.today()
+    computed = compute_progress(db, today, ids)
+    _write(db, {pid: computed.get(pid, _EMPTY) for pid in ids}, today)
+
+
+def reconcile_project_progress(db: Session, today: date | None = None, fix: bool = True) -> list[dict]:
+    """
+    Compare every project's stored counters with a full recompute; returns one
+    {"project_id", "name", "fields": {column: (stored, actual)}} per project that
+    disagrees. Date-dependent counters of projects not refreshed today are stale,
+    not wrong: they are brought up to date without being reported. With `fix`,
+    mismatched and stale projects are rewritten.
+    """
+    today = today or date.today()
+    computed = compute_progress(db, today)
+    mismatches, rewrite = [], {}
+    for row in db.execute(select(Project.id, Project.name, Project.progress_date,
+                                 *(getattr(Project, c) for c in COUNTERS))):
+        actual = computed.get(row.id, _EMPTY)
+        current = row.progress_date == today
+        fields = {c: (getattr(row, c), actual[c]) for c in COUNTERS
+                  if getattr(row, c) != actual[c] and (current or c not in DATED)}
+        if fields:
+            mismatches.append({"project_id": row.id, "name": row.name, "fields": fields})
+        if fields or not current:
+            rewrite[row.id] = actual
+    if fix:
+        _write(db, rewrite, today)
+    return mismatches
+
+
+def refresh_all_project_progress(db: Session, today: date | None = None) -> list[dict]:
+    """
+    Daily sweep (maintenance): overdue / at-risk move with the date. Once any project
+    is behind today, reconciles and rewrites them all; a no-op for the rest of the day.
+    Returns the mismatches found (logged: counters that were wrong, not just stale).
+    """
+    today = today or date.today()
+    # all-zero counters (no milestones) hold whatever the date
+    behind = db.execute(
+        select(Project.id).where(Project.ms_total > 0,
+                                 or_(Project.progress_date.is_(None), Project.progress_date != today)).limit(1)
+    ).first()
+    if behind is None:
+        return []
+    mismatches = reconcile_project_progress(db, today)
+    for m in mismatches:
+        log.warning("project %s progress counters were off: %s", m["project_id"], m["fields"])
+    return mismatches
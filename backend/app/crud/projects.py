@@ -1,8 +1,14 @@
 from datetime import date
-from sqlalchemy import select
+from typing import Iterable
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session, selectinload
 from ..models import Project, Category, Milestone
 from ..utils.formatting import parse_dmy
+from ..utils.pagination import Keyset, Page
+from .changes import record_changes
+from .reports import invalidate_report_project
+
+PROJECT_KEYSET = Keyset((Project.name, False), (Project.id, False))
 
 def list_projects(db: Session, category_id: int | None = None) -> list[Project]:
     stmt = select(Project).options(selectinload(Project.category)).order_by(Project.name)
@@ -10,6 +16,17 @@ def list_projects(db: Session, category_id: int | None = None) -> list[Project]:
         stmt = stmt.filter(Project.category_id == category_id)
     return list(db.execute(stmt).scalars())
 
+def page_projects(
+    db: Session, category_id: int | None = None, status: str | None = None,
+    cursor: str | None = None, limit: int | None = None
+) -> Page:
+    stmt = select(Project)
+    if category_id:
+        stmt = stmt.where(Project.category_id == category_id)
+    if status:
+        stmt = stmt.where(Project.status == status)
+    return PROJECT_KEYSET.page(db, stmt, cursor, limit, scalars=True)
+
 def get_project(db: Session, project_id: int) -> Project | None:
     return db.execute(
         select(Project)
@@ -17,6 +34,18 @@ def get_project(db: Session, project_id: int) -> Project | None:
         .filter(Project.id == project_id)
     ).scalars().first()
 
+def touch_project_graphs(db: Session, project_ids: Iterable[int | None]) -> None:
+    """Milestones or dependencies of these projects changed: bump their graph_version."""
+    ids = {int(pid) for pid in project_ids if pid}
+    if ids:
+        # graphs built inside this transaction must not be cached under the new version
+        db.info.setdefault("touched_graphs", set()).update(ids)
+        db.execute(update(Project).where(Project.id.in_(ids)).values(graph_version=Project.graph_version + 1))
+
+def project_graph_version(db: Session, project_id: int) -> int | None:
+    """None when the project does not exist."""
+    return db.execute(select(Project.graph_version).where(Project.id == project_id)).scalar()
+
 def upsert_project(
     db: Session, *, id: int | None, category_id: int | None, name: str,
     objective: str | None, description: str | None, color: str | None,
@@ -25,6 +54,8 @@ def upsert_project(
     end_d = parse_dmy(end_date_dmy)
     if not end_d:
         raise ValueError("Invalid end date (use DD/MM/YYYY)")
+    if category_id and not db.get(Category, category_id):
+        raise ValueError("Category not found")
     if id:
         p = db.get(Project, id)
         if not p:
@@ -36,6 +67,7 @@ def upsert_project(
         p.color = color
         p.end_date = end_d
         p.status = status
+        invalidate_report_project(db, p.id)
     else:
         p = Project(
             category_id=category_id, name=name, objective=objective,
@@ -43,6 +75,7 @@ def upsert_project(
         )
         db.add(p)
     db.flush()
+    record_changes(db, "project", [p.id])
     return p
 
 def list_milestones_for_project(db: Session, project_id: int) -> list[Milestone]:
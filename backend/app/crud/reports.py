@@ -1,13 +1,23 @@
 from __future__ import annotations
+import logging
+from dataclasses import dataclass, field
 from datetime import datetime, date, timedelta
-from typing import List, Optional, Dict
+from typing import Iterable, List, Optional, Dict
 from types import SimpleNamespace
 
-from sqlalchemy import select, func, and_, case
+from sqlalchemy import event, insert, select, func, and_, or_, case, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
 
-from ..models import ReportFile, Project, Milestone, Category, Action
+from .. import events
+from ..models import ReportFile, ReportJob, CacheVersion, Project, Milestone, Category, ActionDaily
+from ..tenancy import cache_scope
+from ..utils.dates import week_bounds
+from ..utils.pagination import Keyset, Page
 
+log = logging.getLogger(__name__)
 
 # -------------------------------
 # Persisted files
@@ -29,6 +39,10 @@ def create_report_file(
     )
     db.add(row)
     db.flush()
+    events.emit(db, "report-file", {
+        "id": row.id, "period_type": period_type, "period_start": start, "period_end": end,
+        "created_at": row.created_at,
+    }, workspace_id=row.workspace_id)
     return row
 
 
@@ -37,35 +51,310 @@ def list_report_files(db: Session) -> List[ReportFile]:
     return db.execute(stmt).scalars().all()
 
 
+REPORT_FILE_KEYSET = Keyset((ReportFile.id, True))
+
+
+def page_report_files(db: Session, cursor: Optional[str] = None, limit: Optional[int] = None) -> Page:
+    """Newest first, one keyset page (see utils/pagination.py)."""
+    return REPORT_FILE_KEYSET.page(db, select(ReportFile), cursor, limit, scalars=True)
+
+
+# -------------------------------
+# Generation jobs
+# -------------------------------
+
+# job state changes go out as "report-job" events (events.py); every one carries
+# the job's workspace, since runners work from unscoped sessions
+
+def _emit_job(db: Session, job: ReportJob) -> None:
+    events.emit(db, "report-job", {
+        "id": job.id, "status": job.status, "progress": job.progress, "error": job.error,
+        "report_file_id": job.report_file_id, "period_type": job.period_type, "period_start": job.period_start,
+    }, workspace_id=job.workspace_id)
+
+
+def enqueue_report_job(db: Session, period_type: str, start: date, max_attempts: int = 3) -> ReportJob:
+    job = ReportJob(
+        period_type=period_type,
+        period_start=start,
+        status="queued",
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow(),
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.flush()
+    _emit_job(db, job)
+    return job
+
+
+def get_report_job(db: Session, job_id: int) -> Optional[ReportJob]:
+    return db.get(ReportJob, job_id)
+
+
+def list_report_jobs(db: Session, limit: int = 10) -> List[ReportJob]:
+    stmt = select(ReportJob).order_by(ReportJob.id.desc()).limit(limit)
+    return db.execute(stmt).scalars().all()
+
+
+def claim_report_job(db: Session) -> Optional[ReportJob]:
+    """
+    Take the oldest runnable queued job and mark it running. SKIP LOCKED lets
+    several dispatchers (web processes, CLI workers) share the queue.
+    """
+    now = datetime.utcnow()
+    job = db.execute(
+        select(ReportJob)
+        .where(ReportJob.status == "queued", ReportJob.run_after <= now)
+        .order_by(ReportJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).scalars().first()
+    if not job:
+        return None
+    job.status = "running"
+    job.attempts += 1
+    job.progress = 0
+    job.heartbeat_at = now
+    db.flush()
+    _emit_job(db, job)
+    return job
+
+
+def set_report_job_progress(db: Session, job_id: int, progress: int) -> None:
+    progress = max(0, min(100, int(progress)))
+    ws = db.execute(
+        update(ReportJob)
+        .where(ReportJob.id == job_id)
+        .values(progress=progress, heartbeat_at=datetime.utcnow())
+        .returning(ReportJob.workspace_id)
+    ).scalar()
+    if ws is not None:
+        events.emit(db, "report-job", {"id": job_id, "status": "running", "progress": progress}, workspace_id=ws)
+
+
+def heartbeat_report_jobs(db: Session, job_ids: Iterable[int]) -> None:
+    """Jobs still rendering (their future is pending): keeps them from looking stale between progress steps."""
+    job_ids = list(job_ids)
+    if job_ids:
+        db.execute(
+            update(ReportJob)
+            .where(ReportJob.id.in_(job_ids), ReportJob.status == "running")
+            .values(heartbeat_at=datetime.utcnow())
+        )
+
+
+def finish_report_job(db: Session, job_id: int, report_file_id: int) -> None:
+    ws = db.execute(
+        update(ReportJob)
+        .where(ReportJob.id == job_id)
+        .values(status="done", progress=100, error=None, report_file_id=report_file_id,
+                finished_at=datetime.utcnow())
+        .returning(ReportJob.workspace_id)
+    ).scalar()
+    if ws is not None:
+        events.emit(db, "report-job", {
+            "id": job_id, "status": "done", "progress": 100, "error": None, "report_file_id": report_file_id,
+        }, workspace_id=ws)
+
+
+def fail_report_job(db: Session, job_id: int, error: str, retry_seconds: int = 30) -> Optional[ReportJob]:
+    """Requeue with linear backoff while attempts remain, otherwise mark failed."""
+    job = db.get(ReportJob, job_id)
+    if not job:
+        return None
+    job.error = error[:2000]
+    if job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.run_after = datetime.utcnow() + timedelta(seconds=retry_seconds * job.attempts)
+    else:
+        job.status = "failed"
+        job.finished_at = datetime.utcnow()
+    db.flush()
+    _emit_job(db, job)
+    return job
+
+
+def requeue_stale_report_jobs(db: Session, stale_seconds: int) -> int:
+    """
+    Jobs left running by a dead process (restart, crash) go back to the queue, or
+    are marked failed once they have used their attempts (a job that keeps killing
+    its worker, e.g. out of memory, must not be claimed forever). Returns how many.
+    """
+    now = datetime.utcnow()
+    stale = and_(ReportJob.status == "running", ReportJob.heartbeat_at < now - timedelta(seconds=stale_seconds))
+    requeued = db.execute(
+        update(ReportJob)
+        .where(stale, ReportJob.attempts < ReportJob.max_attempts)
+        .values(status="queued", run_after=now)
+        .returning(ReportJob.id, ReportJob.workspace_id)
+    ).all()
+    for job_id, ws in requeued:
+        events.emit(db, "report-job", {"id": job_id, "status": "queued"}, workspace_id=ws)
+    error = "The worker stopped responding on every attempt"
+    failed = db.execute(
+        update(ReportJob)
+        .where(stale, ReportJob.attempts >= ReportJob.max_attempts)
+        .values(status="failed", error=error, finished_at=now)
+        .returning(ReportJob.id, ReportJob.workspace_id)
+    ).all()
+    for job_id, ws in failed:
+        events.emit(db, "report-job", {"id": job_id, "status": "failed", "error": error}, workspace_id=ws)
+    return len(requeued) + len(failed)
+
+
+# -------------------------------
+# Report cache invalidation
+# -------------------------------
+
+CACHE_GLOBAL = "global"          # anything: category renames, rollup rebuilds
+CACHE_MILESTONES = "milestones"  # progress, health, overdue/upcoming lists
+
+# Keys are bumped per workspace (prefixed, tenancy.cache_scope) by scoped sessions;
+# an unscoped session (CLI, maintenance) bumps the bare key, which stales that key
+# in every workspace.
+#
+# Bumps wait for the writer's commit and then run in a short transaction of their
+# own: the yearly/monthly rows are shared by every write of a workspace, and holding
+# their locks for the whole writing transaction would serialize all action writes.
+# Readers may serve the previous context in between; an entry built from data read
+# before the commit still carries the old stamp, so the bump invalidates it.
+
+_PENDING_BUMPS = "pending_cache_bumps"
+_BUMPING = "cache_bumps_committing"
+
+
+def period_cache_key(period_type: str, start: date) -> str:
+    """Version key of the action-derived series of one report period."""
+    return f"actions:{period_type}:{start.isoformat()}"
+
+
+def _period_keys(days: Iterable[date]) -> set[str]:
+    keys: set[str] = set()
+    for d in days:
+        keys.add(period_cache_key("weekly", week_bounds(d)[0]))
+        keys.add(period_cache_key("monthly", d.replace(day=1)))
+        keys.add(period_cache_key("yearly", d.replace(month=1, day=1)))
+    return keys
+
+
+def bump_cache_versions(db: Session, keys: Iterable[str]) -> None:
+    """Bump `keys` (in the session's workspace) once `db`'s transaction commits."""
+    prefix = cache_scope(db)
+    keys = {prefix + k for k in keys}
+    if keys:
+        txn = db.get_nested_transaction() or db.get_transaction() or db.begin()
+        db.info.setdefault(_PENDING_BUMPS, []).append((txn, keys))
+
+
+def _apply_bumps(conn: Connection, keys: Iterable[str]) -> None:
+    keys = sorted(keys)  # stable order: concurrent bumpers lock rows the same way
+    dialect = conn.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        ins = (pg_insert if dialect == "postgresql" else sqlite_insert)(CacheVersion)
+        conn.execute(
+            ins.values([{"key": k, "version": 1} for k in keys])
+            .on_conflict_do_update(index_elements=[CacheVersion.key],
+                                   set_={"version": CacheVersion.version + 1})
+        )
+        return
+    for k in keys:
+        res = conn.execute(update(CacheVersion).where(CacheVersion.key == k)
+                           .values(version=CacheVersion.version + 1))
+        if not res.rowcount:
+            conn.execute(insert(CacheVersion).values(key=k, version=1))
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(db: Session) -> None:
+    if db.get_nested_transaction() is None and db.info.get(_PENDING_BUMPS):
+        db.info[_BUMPING] = True  # the root transaction (a savepoint's bumps wait for it)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(db: Session) -> None:
+    if not db.info.pop(_BUMPING, False):
+        return
+    keys = set().union(*(k for _, k in db.info.pop(_PENDING_BUMPS, [])))
+    bind = db.get_bind()
+    try:
+        with getattr(bind, "engine", bind).begin() as conn:
+            _apply_bumps(conn, keys)
+    except Exception:
+        # the write is committed already; cached contexts stay stale until the next bump
+        log.exception("could not bump report cache versions %s", sorted(keys))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(db: Session, previous_transaction) -> None:
+    pending = db.info.get(_PENDING_BUMPS)
+    if not pending or previous_transaction.parent is None:
+        return  # the whole transaction: _after_transaction_end clears up
+
+    def rolled_back(txn) -> bool:
+        while txn is not None:
+            if txn is previous_transaction:
+                return True
+            txn = txn.parent
+        return False
+
+    db.info[_PENDING_BUMPS] = [(t, k) for t, k in pending if not rolled_back(t)]
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(db: Session, transaction) -> None:
+    if transaction.parent is None:  # committed (bumped already), rolled back or closed
+        db.info.pop(_PENDING_BUMPS, None)
+        db.info.pop(_BUMPING, None)
+
+
+def cache_versions(db: Session, keys: Iterable[str]) -> Dict[str, int]:
+    """{key: version} as the session's workspace sees it: its own bumps plus the unscoped ones."""
+    keys, prefix = list(keys), cache_scope(db)
+    wanted = set(keys) | {prefix + k for k in keys}
+    found = dict(db.execute(select(CacheVersion.key, CacheVersion.version).where(CacheVersion.key.in_(wanted))).all())
+    return {k: int(found.get(k, 0)) + (int(found.get(prefix + k, 0)) if prefix else 0) for k in keys}
+
+
+def invalidate_report_dates(db: Session, days: Iterable[date]) -> None:
+    """Actions were written on these dates: their week, month and year go stale."""
+    bump_cache_versions(db, _period_keys(days))
+
+
+def invalidate_report_milestones(db: Session) -> None:
+    bump_cache_versions(db, [CACHE_MILESTONES])
+
+
+def invalidate_report_project(db: Session, project_id: int) -> None:
+    """Project renamed/moved: periods where it logged time, plus the milestone lists."""
+    days = db.execute(
+        select(ActionDaily.date).where(ActionDaily.project_id == project_id).distinct()
+    ).scalars().all()
+    bump_cache_versions(db, _period_keys(days) | {CACHE_MILESTONES})
+
+
+def invalidate_reports_all(db: Session) -> None:
+    bump_cache_versions(db, [CACHE_GLOBAL])
+
+
 # -------------------------------
 # Report data helpers
 # -------------------------------
 
 def project_progress_overview(db: Session) -> Dict[int, SimpleNamespace]:
     """
-    For each project, return avg % complete, total milestones, done milestones.
+    For each project with milestones: avg % complete, total milestones, done milestones,
+    read from the counters stored on the project (crud.progress).
     { project_id: SimpleNamespace(avg_percent, total_ms, done_ms) }
     """
-    stmt = (
-        select(
-            Milestone.project_id,
-            func.coalesce(func.avg(Milestone.percent_complete), 0).label("avgp"),
-            func.count(Milestone.id).label("total"),
-            func.sum(
-                case((Milestone.status == "done", 1), else_=0)
-            ).label("done"),
-        )
-        .group_by(Milestone.project_id)
-    )
-    rows = db.execute(stmt).all()
-    out: Dict[int, SimpleNamespace] = {}
-    for pid, avgp, total, done in rows:
-        out[int(pid or 0)] = SimpleNamespace(
-            avg_percent=float(avgp or 0),
-            total_ms=int(total or 0),
-            done_ms=int(done or 0),
-        )
-    return out
+    rows = db.execute(
+        select(Project.id, Project.ms_percent_sum, Project.ms_total, Project.ms_done)
+        .where(Project.ms_total > 0)
+    ).all()
+    return {
+        int(pid): SimpleNamespace(avg_percent=pct_sum / total, total_ms=int(total), done_ms=int(done))
+        for pid, pct_sum, total, done in rows
+    }
 
 
 def overdue_milestones(db: Session, ref_date: date, limit: Optional[int] = 20) -> List[SimpleNamespace]:
@@ -118,6 +407,7 @@ def upcoming_milestones(db: Session, start: date, end: date, limit: Optional[int
             Milestone.name.label("milestone"),
             Milestone.end_date,
             Milestone.percent_complete,
+            Milestone.projected_end,
         )
         .select_from(Milestone)
         .join(Project, Project.id == Milestone.project_id)
@@ -127,7 +417,7 @@ def upcoming_milestones(db: Session, start: date, end: date, limit: Optional[int
     )
     rows = db.execute(stmt).all()
     out: List[SimpleNamespace] = []
-    for category, project_id, project, milestone_id, milestone, end_date, pct in rows:
+    for category, project_id, project, milestone_id, milestone, end_date, pct, projected in rows:
         out.append(SimpleNamespace(
             category=category or "Uncategorized",
             project_id=int(project_id),
@@ -136,6 +426,7 @@ def upcoming_milestones(db: Session, start: date, end: date, limit: Optional[int
             milestone=milestone,
             end=end_date,
             percent=int(pct or 0),
+            projected=projected if projected and projected > end_date else None,
         ))
         if limit and len(out) >= limit:
             break
@@ -147,38 +438,219 @@ def times_by_project_range_map(db: Session, start: date, end: date) -> Dict[int,
     {project_id: minutes} for actions within [start, end]
     """
     stmt = (
-        select(Action.project_id, func.coalesce(func.sum(Action.minutes), 0))
-        .where(and_(Action.date >= start, Action.date <= end))
-        .group_by(Action.project_id)
+        select(ActionDaily.project_id, func.coalesce(func.sum(ActionDaily.minutes), 0))
+        .where(and_(ActionDaily.date >= start, ActionDaily.date <= end))
+        .group_by(ActionDaily.project_id)
     )
     rows = db.execute(stmt).all()
     return {int(pid): int(m or 0) for pid, m in rows}
 
 
-def project_milestone_health(db: Session, ref_date: date, lookahead_days: int = 14) -> Dict[int, SimpleNamespace]:
+# projected end (stored by crud.schedule) pushed past the planned one by upstream slips
+_slipped = Milestone.projected_end > Milestone.end_date
+
+# lookahead of the overdue / at-risk counters stored on projects (crud.progress)
+HEALTH_LOOKAHEAD_DAYS = 14
+
+
+def milestone_health_sums(ref_date: date, lookahead_days: int):
+    """(overdue, risk) SUM columns for a milestone query grouped by project; see project_milestone_health."""
+    horizon = ref_date + timedelta(days=lookahead_days)
+    open_ms = Milestone.status != "done"
+    overdue_col = func.sum(case((and_(open_ms, Milestone.end_date < ref_date), 1), else_=0))
+    risk_col = func.sum(
+        case((and_(open_ms, Milestone.end_date >= ref_date,
+                   or_(and_(Milestone.end_date <= horizon, Milestone.percent_complete < 60),
+                       _slipped)), 1), else_=0)
+    )
+    return overdue_col, risk_col
+
+
+def project_milestone_health(db: Session, ref_date: date, lookahead_days: int = HEALTH_LOOKAHEAD_DAYS) -> Dict[int, SimpleNamespace]:
     """
     For each project: counts of overdue and at-risk milestones.
     - overdue: end_date < ref_date AND status != 'done'
-    - risk:    ref_date <= end_date <= ref_date+lookahead AND status != 'done' AND percent_complete < 60
+    - risk:    status != 'done' AND end_date >= ref_date AND either
+               end_date <= ref_date+lookahead AND percent_complete < 60, or
+               projected_end > end_date (upstream slips, see crud.schedule)
+    Served from the project counters when they are current for ref_date and the
+    default lookahead; computed over the milestones otherwise.
     Returns {project_id: SimpleNamespace(overdue=..., risk=...)}
     """
-    horizon = ref_date + timedelta(days=lookahead_days)
-    overdue_col = func.sum(
-        case((and_(Milestone.status != "done", Milestone.end_date < ref_date), 1), else_=0)
-    ).label("overdue")
-    risk_col = func.sum(
-        case((and_(Milestone.status != "done", Milestone.end_date >= ref_date,
-                   Milestone.end_date <= horizon, Milestone.percent_complete < 60), 1), else_=0)
-    ).label("risk")
+    if lookahead_days == HEALTH_LOOKAHEAD_DAYS:
+        stored = db.execute(
+            select(Project.id, Project.ms_overdue, Project.ms_risk, Project.progress_date)
+            .where(Project.ms_total > 0)
+        ).all()
+        if all(d == ref_date for _, _, _, d in stored):
+            return {int(pid): SimpleNamespace(overdue=int(o), risk=int(r)) for pid, o, r, _ in stored}
 
-    stmt = (
-        select(Project.id, overdue_col, risk_col)
-        .join(Project, Project.id == Milestone.project_id)
-        .group_by(Project.id)
-    )
+    overdue_col, risk_col = milestone_health_sums(ref_date, lookahead_days)
+    stmt = select(Milestone.project_id, overdue_col, risk_col).group_by(Milestone.project_id)
     rows = db.execute(stmt).all()
     out: Dict[int, SimpleNamespace] = {}
     for pid, overdue_cnt, risk_cnt in rows:
         out[int(pid)] = SimpleNamespace(overdue=int(overdue_cnt or 0), risk=int(risk_cnt or 0))
     return out
 
+
+
+# -------------------------------
+# Single-pass period aggregation
+# -------------------------------
+
+@dataclass
+class PeriodAggregates:
+    """
+    Every series a period report needs, fetched in three round trips:
+    one day × project fetch from the rollup (bucketed in Python into days,
+    projects, categories and arbitrary chunks), one query per project (stored
+    progress counters + health over its open milestones), and one milestone
+    list (overdue + upcoming).
+    """
+    start: date
+    end: date
+    days: List[tuple[date, int]]
+    projects: List[SimpleNamespace]
+    categories: List[SimpleNamespace]
+    progress: Dict[int, SimpleNamespace]
+    health: Dict[int, SimpleNamespace]
+    upcoming: List[SimpleNamespace]
+    overdue: List[SimpleNamespace]
+    project_minutes: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return sum(m for _, m in self.days)
+
+    def bucket(self, bounds: List[tuple[date, date]]) -> List[int]:
+        """Sum the day series into closed [start, end] buckets (week chunks, months...)."""
+        out = []
+        for s, e in bounds:
+            out.append(sum(m for d, m in self.days if s <= d <= e))
+        return out
+
+
+def aggregate_period(
+    db: Session,
+    start: date,
+    end: date,
+    lookahead_days: int,
+    limit: Optional[int] = 20,
+) -> PeriodAggregates:
+    """
+    Aggregate [start, end] for a report. Health is measured at `end` with
+    `lookahead_days` of horizon; upcoming covers the lookahead after `end`;
+    overdue is measured the day after `end` (same windows the reports used
+    when each series was its own query).
+    """
+    # 1) day × project minutes, with names for the project/category series
+    rows = db.execute(
+        select(
+            ActionDaily.date,
+            Project.id,
+            Project.name,
+            Category.id,
+            Category.name,
+            func.sum(ActionDaily.minutes),
+        )
+        .select_from(ActionDaily)
+        .join(Project, Project.id == ActionDaily.project_id)
+        .join(Category, Category.id == Project.category_id, isouter=True)
+        .where(ActionDaily.date >= start, ActionDaily.date <= end)
+        .group_by(ActionDaily.date, Project.id, Project.name, Category.id, Category.name)
+    ).all()
+
+    by_day: Dict[date, int] = {}
+    by_project: Dict[int, list] = {}
+    by_category: Dict[Optional[int], list] = {}
+    for d, pid, pname, cid, cname, m in rows:
+        m = int(m or 0)
+        by_day[d] = by_day.get(d, 0) + m
+        by_project.setdefault(pid, [pname, 0])[1] += m
+        by_category.setdefault(cid, [cname or "Uncategorized", 0])[1] += m
+
+    days: List[tuple[date, int]] = []
+    cur = start
+    while cur <= end:
+        days.append((cur, by_day.get(cur, 0)))
+        cur += timedelta(days=1)
+
+    projects = sorted(
+        (SimpleNamespace(project_id=pid, name=name, total_minutes=m) for pid, (name, m) in by_project.items()),
+        key=lambda p: (-p.total_minutes, p.name),
+    )
+    categories = sorted(
+        (SimpleNamespace(category_id=cid, category=name, minutes=m) for cid, (name, m) in by_category.items()),
+        key=lambda c: (-c.minutes, c.category),
+    )
+
+    # 2) per-project progress (counters stored on the project) and health at `end`,
+    #    which only needs the open milestones
+    horizon = end + timedelta(days=lookahead_days)
+    open_ms = Milestone.status != "done"
+    overdue_col, risk_col = milestone_health_sums(end, lookahead_days)
+    stats = db.execute(
+        select(Project.id, Project.ms_percent_sum, Project.ms_total, Project.ms_done, overdue_col, risk_col)
+        .select_from(Project)
+        .join(Milestone, and_(Milestone.project_id == Project.id, open_ms), isouter=True)
+        .where(Project.ms_total > 0)
+        .group_by(Project.id, Project.ms_percent_sum, Project.ms_total, Project.ms_done)
+    ).all()
+    progress: Dict[int, SimpleNamespace] = {}
+    health: Dict[int, SimpleNamespace] = {}
+    for pid, pct_sum, total, done, overdue_cnt, risk_cnt in stats:
+        progress[int(pid)] = SimpleNamespace(
+            avg_percent=pct_sum / total, total_ms=int(total), done_ms=int(done),
+        )
+        health[int(pid)] = SimpleNamespace(overdue=int(overdue_cnt or 0), risk=int(risk_cnt or 0))
+
+    # 3) open milestones due up to the end of the lookahead: split into overdue / upcoming
+    up_start, up_end = end + timedelta(days=1), horizon
+    ms_rows = db.execute(
+        select(
+            Category.name,
+            Project.id,
+            Project.name,
+            Milestone.id,
+            Milestone.name,
+            Milestone.end_date,
+            Milestone.percent_complete,
+            Milestone.projected_end,
+        )
+        .select_from(Milestone)
+        .join(Project, Project.id == Milestone.project_id)
+        .join(Category, Category.id == Project.category_id, isouter=True)
+        .where(open_ms, Milestone.end_date <= up_end)
+        .order_by(Milestone.end_date.asc())
+    ).all()
+    upcoming: List[SimpleNamespace] = []
+    overdue: List[SimpleNamespace] = []
+    for category, project_id, project, milestone_id, milestone, end_date, pct, projected in ms_rows:
+        base = dict(
+            category=category or "Uncategorized",
+            project_id=int(project_id),
+            project=project,
+            milestone_id=int(milestone_id),
+            milestone=milestone,
+            end=end_date,
+        )
+        if end_date < up_start:
+            if not limit or len(overdue) < limit:
+                overdue.append(SimpleNamespace(**base, days_late=int((up_start - end_date).days)))
+        elif not limit or len(upcoming) < limit:
+            upcoming.append(SimpleNamespace(**base, percent=int(pct or 0),
+                                            projected=projected if projected and projected > end_date else None))
+
+    return PeriodAggregates(
+        start=start,
+        end=end,
+        days=days,
+        projects=projects,
+        categories=categories,
+        progress=progress,
+        health=health,
+        upcoming=upcoming,
+        overdue=overdue,
+        project_minutes={p.project_id: p.total_minutes for p in projects},
+    )
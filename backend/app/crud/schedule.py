@@ -0,0 +1,168 @@
+"""
+Milestone scheduling over the dependency graph: the cached per-project DepGraph,
+cycle checks for new dependencies, and the stored slip projections
+(Milestone.projected_end / effective_risk).
+
+Every milestone or dependency write calls refresh_projections with the
+milestones it touched; only those and what they reach downstream are
+recomputed, and propagation stops where values come out unchanged; the
+project's progress counters are refreshed with them. Health also
+depends on the date, so refresh_all_projections re-runs everything from the
+maintenance task.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import Dependency, Milestone, Project
+from ..utils.depgraph import DepGraph, dep_graphs
+from .changes import record_changes
+from .progress import refresh_project_progress
+from .projects import touch_project_graphs
+from .reports import invalidate_report_milestones
+
+RISK_RANK = {"ok": 0, "risk": 1, "late": 2}
+
+
+def milestone_health(m: Milestone, today: date) -> str:
+    """Health of a milestone on its own: late past its end date, at risk within a week and under 80%."""
+    if (today > m.end_date and m.percent_complete < 100):
+        return "late"
+    if ((m.end_date - today).days <= 7 and m.percent_complete < 80):
+        return "risk"
+    return "ok"
+
+
+def worst_risk(*risks: str | None) -> str:
+    return max((r for r in risks if r), key=RISK_RANK.__getitem__, default="ok")
+
+
+def _is_done(m: Milestone) -> bool:
+    return m.status == "done" or m.percent_complete >= 100
+
+
+def _own_projection(m: Milestone, today: date) -> tuple[date, str]:
+    if _is_done(m):
+        # finished already: it holds nothing up past today
+        return min(m.end_date, today), "ok"
+    return max(m.end_date, today), milestone_health(m, today)
+
+
+# --- dependency graph ---
+
+
+def _build_dep_graph(db: Session, project_id: int) -> DepGraph:
+    ends = db.execute(select(Milestone.id, Milestone.end_date).where(Milestone.project_id == project_id)).all()
+    edges = db.execute(
+        select(Dependency.from_milestone_id, Dependency.to_milestone_id).where(Dependency.project_id == project_id)
+    ).all()
+    return DepGraph(dict(ends), edges)
+
+
+def project_dep_graph(db: Session, project_id: int, *, for_update: bool = False) -> DepGraph:
+    """
+    The project's dependency graph, cached per graph_version. `for_update` locks
+    the project row (PostgreSQL) so concurrent dependency writes are checked one
+    after the other. Graphs of projects this session already wrote are built fresh
+    and not cached: their new version is not committed yet.
+    """
+    stmt = select(Project.graph_version).where(Project.id == project_id)
+    if for_update:
+        stmt = stmt.with_for_update()
+    version = db.execute(stmt).scalar()
+    if version is None:
+        raise ValueError("Project not found")
+    if project_id in db.info.get("touched_graphs", ()):
+        return _build_dep_graph(db, project_id)
+    return dep_graphs.get(project_id, version, lambda: _build_dep_graph(db, project_id))
+
+
+def check_new_dependency(db: Session, project_id: int, from_id: int, to_id: int) -> None:
+    """Raise ValueError if from_id -> to_id would close a cycle."""
+    if from_id == to_id:
+        raise ValueError("A milestone cannot depend on itself")
+    g = project_dep_graph(db, project_id, for_update=True)
+    if from_id not in g.ends or to_id not in g.ends:
+        raise ValueError("Milestone not found")
+    cycle = g.cycle_if_added(from_id, to_id)
+    if cycle:
+        names = dict(db.execute(select(Milestone.id, Milestone.name).where(Milestone.id.in_(cycle))).all())
+        raise ValueError("Dependency would create a cycle: " + " → ".join(names.get(m, str(m)) for m in cycle))
+
+
+# --- projections ---
+
+
+def _apply(g: DepGraph, ms: dict[int, Milestone], seeds: Iterable[int], today: date) -> list[int]:
+    """Write the new projections of `seeds` and downstream; returns the ids of the milestones changed."""
+    reach = g.downstream(seeds)
+    own = {m: _own_projection(ms[m], today) for m in reach}
+    current = {m: (ms[m].projected_end, ms[m].effective_risk) if ms[m].projected_end else _own_projection(ms[m], today)
+               for m in reach | {p for r in reach for p in g.pred[r]}}
+    # rows never computed (NULL) are written even when the result matches the fallback
+    unset = [m for m in reach if ms[m].projected_end is None]
+    changed = g.propagate(seeds, own, current, done={m for m in reach if _is_done(ms[m])})
+    for m in unset:
+        changed.setdefault(m, current[m])
+    for m, (projected, risk) in changed.items():
+        ms[m].projected_end, ms[m].effective_risk = projected, risk
+    return list(changed)
+
+
+def refresh_projections(db: Session, project_id: int, seeds: Iterable[int] | None = None,
+                        today: date | None = None) -> int:
+    """
+    Recompute projected_end / effective_risk of `seeds` (all of the project when None)
+    and their downstream milestones, then the project's progress counters
+    (crud.progress); returns the number of milestone rows changed. Call after
+    the write is flushed and its project touched (touch_project_graphs).
+
+    The project row is locked first (PostgreSQL): concurrent writes to one
+    project refresh one after the other, each reading the milestones the
+    other committed, so neither writes back stale projections or counters.
+    """
+    today = today or date.today()
+    g = project_dep_graph(db, project_id, for_update=True)
+    seeds = set(g.ends) if seeds is None else {m for m in seeds if m in g.ends}
+    changed = []
+    if seeds:
+        reach = g.downstream(seeds)
+        need = reach | {p for m in reach for p in g.pred[m]}
+        ms = {m.id: m for m in db.execute(select(Milestone).where(Milestone.id.in_(need))).scalars()}
+        changed = _apply(g, ms, seeds, today)
+        if changed:
+            db.flush()
+            record_changes(db, "milestone", changed)
+            invalidate_report_milestones(db)  # at-risk counts read the projections
+    refresh_project_progress(db, [project_id], today)
+    return len(changed)
+
+
+def refresh_all_projections(db: Session, today: date | None = None) -> int:
+    """Full recompute for every project (maintenance: health moves with the date). Two queries in, changed rows out."""
+    today = today or date.today()
+    by_project: dict[int, dict[int, Milestone]] = defaultdict(dict)
+    for m in db.execute(select(Milestone)).scalars():
+        by_project[m.project_id][m.id] = m
+    edges: dict[int, list[tuple[int, int]]] = defaultdict(list)
+    for pid, a, b in db.execute(select(Dependency.project_id, Dependency.from_milestone_id, Dependency.to_milestone_id)):
+        edges[pid].append((a, b))
+
+    changed, touched = [], []
+    for pid, ms in by_project.items():
+        g = DepGraph({m.id: m.end_date for m in ms.values()}, edges.get(pid, ()))
+        ids = _apply(g, ms, set(ms), today)
+        if ids:
+            changed += ids
+            touched.append(pid)
+    if changed:
+        db.flush()
+        record_changes(db, "milestone", changed)
+        touch_project_graphs(db, touched)
+        refresh_project_progress(db, touched, today)
+        invalidate_report_milestones(db)
+    return len(changed)
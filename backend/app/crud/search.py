@@ -0,0 +1,241 @@
+"""
+Full-text search over action comments and milestone notes.
+
+Every word of the query has to match, as a word or a word prefix. PostgreSQL
+matches the generated `search_tsv` columns through their GIN indexes and ranks
+with ts_rank; SQLite matches the FTS5 tables of migration 0008 and ranks with
+bm25. Both kinds of hit are ranked together, best first, and keyset-paginated on
+(rank, kind, id). Highlighted excerpts are cut from the text of the page's rows.
+
+Ranking has to score every row it orders, so a common word over millions of
+comments cannot be ranked in full. Only the newest RANK_WINDOW matches of each
+kind (after the filters) are ranked: the match walks back from the newest id and
+stops there. Older matches are reached by narrowing the words or the dates;
+the result says when that cut applied (SearchPage.truncated), so the last page
+is not taken for all there is.
+"""
+from __future__ import annotations
+import html
+import re
+from datetime import date
+from types import SimpleNamespace
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import Float, String, column, func, literal_column, select, table, text, union_all
+from sqlalchemy.orm import Session
+
+from ..models import Action, Milestone, Project, FULLTEXT_TSVECTOR, SEARCH_CONFIG
+from ..utils.pagination import Keyset, Page
+
+KINDS = ("action", "milestone")
+MAX_TERMS = 8
+RANK_WINDOW = 1000
+EXCERPT_CHARS = 200
+
+# kind -> (model, date shown and filtered on); actions are searched by comment, milestones by note
+_SOURCES = {
+    "action": (Action, Action.date),
+    "milestone": (Milestone, Milestone.end_date),
+}
+# SQLite FTS5 tables (content= the model's table, rowid = its id)
+_FTS = {kind: table(f"{model.__tablename__}_fts", column("rowid")) for kind, (model, _) in _SOURCES.items()}
+
+_PG_CONFIG = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+
+_fulltext: bool | None = None
+
+
+def fulltext_available(db: Session) -> bool:
+    """tsvector columns (PostgreSQL) or FTS5 tables (SQLite) present (checked once per process)."""
+    global _fulltext
+    if _fulltext is None:
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            _fulltext = FULLTEXT_TSVECTOR
+        elif dialect == "sqlite":
+            _fulltext = db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'actions_fts'")
+            ).first() is not None
+        else:
+            _fulltext = False
+    return _fulltext
+
+
+def query_terms(q: str) -> list[str]:
+    """Lower-cased words of `q`; punctuation and query-syntax characters are dropped."""
+    return re.findall(r"[^\W_]+", q.lower())[:MAX_TERMS]
+
+
+def excerpt_html(body: Optional[str], terms: list[str]) -> str:
+    """
+    HTML excerpt of `body` (EXCERPT_CHARS long, from just before the first match),
+    words starting with one of `terms` in <mark>.
+    """
+    body = body or ""
+    words = re.compile(r"(?<![^\W_])(?:%s)[^\W_]*" % "|".join(map(re.escape, terms)), re.IGNORECASE)
+    first = words.search(body)
+    lo = max(0, first.start() - EXCERPT_CHARS // 4) if first and len(body) > EXCERPT_CHARS else 0
+    hi = lo + EXCERPT_CHARS
+    part = body[lo:hi]
+    out, pos = [], 0
+    for m in words.finditer(part):
+        out += [html.escape(part[pos:m.start()]), "<mark>", html.escape(m.group()), "</mark>"]
+        pos = m.end()
+    out.append(html.escape(part[pos:]))
+    return ("…" if lo else "") + "".join(out) + ("…" if hi < len(body) else "")
+
+
+class _Match:
+    """The query for one backend: the WHERE clause and rank of each kind."""
+
+    def __init__(self, db: Session, terms: list[str]):
+        self.pg = db.get_bind().dialect.name == "postgresql"
+        if self.pg:
+            self.query = func.to_tsquery(_PG_CONFIG, " & ".join(f"{t}:*" for t in terms))
+        else:
+            self.query = " ".join(f'"{t}"*' for t in terms)
+
+    def select_from(self, stmt, kind: str):
+        """`stmt` over the kind's model, joined to its FTS table on SQLite."""
+        if self.pg:
+            return stmt
+        model = _SOURCES[kind][0]
+        fts = _FTS[kind]
+        return stmt.select_from(fts).join(model, model.id == fts.c.rowid)
+
+    def where(self, kind: str):
+        model = _SOURCES[kind][0]
+        if self.pg:
+            return model.search_tsv.op("@@")(self.query)
+        return literal_column(_FTS[kind].name).op("MATCH")(self.query)
+
+    def rank(self, kind: str):
+        """Higher is better on both backends (bm25 scores better matches lower)."""
+        if self.pg:
+            return func.ts_rank(_SOURCES[kind][0].search_tsv, self.query, type_=Float)
+        return -func.bm25(literal_column(_FTS[kind].name), type_=Float)
+
+    def newest_first(self, kind: str):
+        # SQLite: FTS5 returns rowids in order, so the LIMIT stops the match early
+        return _SOURCES[kind][0].id.desc() if self.pg else _FTS[kind].c.rowid.desc()
+
+
+@dataclass
+class SearchPage(Page):
+    """A Page of hits; `truncated` when some kind had more than RANK_WINDOW matches (only those were ranked)."""
+    truncated: bool = False
+
+
+def _filtered(stmt, kind: str, project_id, category_id, start, end):
+    model, day = _SOURCES[kind]
+    if project_id:
+        stmt = stmt.where(model.project_id == project_id)
+    if category_id:
+        stmt = stmt.join(Project, Project.id == model.project_id).where(Project.category_id == category_id)
+    if start:
+        stmt = stmt.where(day >= start)
+    if end:
+        stmt = stmt.where(day <= end)
+    return stmt
+
+
+def _hits_stmt(match: _Match, kind: str, project_id, category_id, start, end):
+    """The kind's newest RANK_WINDOW matches with their rank (computed for those rows only)."""
+    model = _SOURCES[kind][0]
+    stmt = select(
+        literal_column(f"'{kind}'", String).label("kind"),
+        model.id.label("id"),
+        match.rank(kind).label("rank"),
+    )
+    stmt = match.select_from(stmt, kind).where(match.where(kind))
+    stmt = _filtered(stmt, kind, project_id, category_id, start, end)
+    window = stmt.order_by(match.newest_first(kind)).limit(RANK_WINDOW).subquery()
+    return select(window)
+
+
+def _window_full(db: Session, match: _Match, kind: str, project_id, category_id, start, end) -> bool:
+    """More than RANK_WINDOW matches of the kind: the older ones were left out (counts RANK_WINDOW + 1 at most)."""
+    stmt = match.select_from(select(_SOURCES[kind][0].id), kind).where(match.where(kind))
+    stmt = _filtered(stmt, kind, project_id, category_id, start, end).limit(RANK_WINDOW + 1)
+    return db.execute(select(func.count()).select_from(stmt.subquery())).scalar_one() > RANK_WINDOW
+
+
+def _details(db: Session, kind: str, ids: list[int], terms: list[str]) -> dict[int, SimpleNamespace]:
+    """Display rows of one kind's hits, with the highlighted excerpt."""
+    if kind == "action":
+        stmt = (
+            select(
+                Action.id, Action.date, Action.minutes, Action.project_id, Action.milestone_id,
+                Project.name.label("project_name"), Milestone.name.label("milestone_name"),
+                Action.comment.label("body"),
+            )
+            .join(Project, Project.id == Action.project_id)
+            .join(Milestone, Milestone.id == Action.milestone_id, isouter=True)
+            .where(Action.id.in_(ids))
+        )
+    else:
+        stmt = (
+            select(
+                Milestone.id, Milestone.end_date.label("date"), literal_column("NULL").label("minutes"),
+                Milestone.project_id, Milestone.id.label("milestone_id"),
+                Project.name.label("project_name"), Milestone.name.label("milestone_name"),
+                Milestone.note.label("body"),
+            )
+            .join(Project, Project.id == Milestone.project_id)
+            .where(Milestone.id.in_(ids))
+        )
+    return {r.id: SimpleNamespace(
+        kind=kind, id=r.id, date=r.date, minutes=r.minutes, project_id=r.project_id,
+        project_name=r.project_name, milestone_id=r.milestone_id, milestone_name=r.milestone_name,
+        highlight=excerpt_html(r.body, terms),
+    ) for r in db.execute(stmt)}
+
+
+def search_text(
+    db: Session,
+    q: str,
+    *,
+    kind: Optional[str] = None,
+    project_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> SearchPage:
+    """
+    Actions (by comment) and milestones (by note) matching every word of `q`, best
+    match first (among the newest RANK_WINDOW matches of each kind; `truncated`
+    tells when there were more). `kind` narrows to one of KINDS; dates filter
+    action dates and milestone end dates. Items carry `rank` and `highlight`, an
+    HTML excerpt.
+    """
+    if kind and kind not in KINDS:
+        raise ValueError("kind must be action or milestone")
+    terms = query_terms(q)
+    if not terms:
+        return SearchPage([], None)
+    if not fulltext_available(db):
+        raise ValueError("Full-text search is not available on this database")
+
+    match = _Match(db, terms)
+    kinds = [k for k in KINDS if kind in (None, k)]
+    branches = [_hits_stmt(match, k, project_id, category_id, start, end) for k in kinds]
+    hits = (branches[0] if len(branches) == 1 else union_all(*branches)).subquery("hits")
+    keyset = Keyset((hits.c.rank, True), (hits.c.kind, True), (hits.c.id, True))
+    page = keyset.page(db, select(hits), cursor, limit)
+
+    rows: dict[tuple[str, int], SimpleNamespace] = {}
+    for k in KINDS:
+        ids = [h.id for h in page.items if h.kind == k]
+        if ids:
+            rows.update({(k, i): r for i, r in _details(db, k, ids, terms).items()})
+    items = []
+    for h in page.items:
+        row = rows.get((h.kind, h.id))
+        if row is not None:  # deleted between the two queries
+            row.rank = float(h.rank)
+            items.append(row)
+    truncated = any(_window_full(db, match, k, project_id, category_id, start, end) for k in kinds)
+    return SearchPage(items, page.next_cursor, truncated)
@@ -0,0 +1,74 @@
+"""
+Workspaces and their members (see app/tenancy.py). Run these on unscoped
+sessions: they are what a session gets scoped to.
+"""
+from __future__ import annotations
+import hashlib
+import secrets
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from ..models import User, Workspace
+
+# the workspace a single-user instance's data moves into (migration 0007)
+DEFAULT_WORKSPACE = "Default"
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def list_workspaces(db: Session) -> list[Workspace]:
+    return list(db.execute(select(Workspace).order_by(Workspace.id)).scalars())
+
+
+def get_workspace_by_name(db: Session, name: str) -> Workspace | None:
+    return db.execute(select(Workspace).where(Workspace.name == name)).scalars().first()
+
+
+def create_workspace(db: Session, name: str) -> Workspace:
+    name = name.strip()
+    if not name:
+        raise ValueError("Workspace name is required")
+    if get_workspace_by_name(db, name):
+        raise ValueError(f"Workspace '{name}' already exists")
+    ws = Workspace(name=name)
+    db.add(ws)
+    db.flush()
+    return ws
+
+
+def default_workspace_id(db: Session) -> int:
+    """The first workspace (an upgraded instance's data), created when there is none yet."""
+    ws_id = db.execute(select(func.min(Workspace.id))).scalar()
+    if ws_id is None:
+        ws_id = create_workspace(db, DEFAULT_WORKSPACE).id
+    return int(ws_id)
+
+
+def issue_api_token(db: Session, workspace_id: int) -> str:
+    """New /api/v1 bearer token for the workspace (replaces the previous one); only its hash is stored."""
+    ws = db.get(Workspace, workspace_id)
+    if not ws:
+        raise ValueError("Workspace not found")
+    token = secrets.token_urlsafe(32)
+    ws.api_token_hash = _token_hash(token)
+    db.flush()
+    return token
+
+
+def workspace_for_token(db: Session, token: str) -> int | None:
+    return db.execute(select(Workspace.id).where(Workspace.api_token_hash == _token_hash(token))).scalar()
+
+
+def add_user(db: Session, workspace_id: int, email: str, password_hash: str) -> User:
+    email = email.strip().lower()
+    if db.execute(select(User.id).where(User.email == email)).first():
+        raise ValueError(f"User '{email}' already exists")
+    if not db.get(Workspace, workspace_id):
+        raise ValueError("Workspace not found")
+    user = User(workspace_id=workspace_id, email=email, password_hash=password_hash)
+    db.add(user)
+    db.flush()
+    return user
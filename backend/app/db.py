@@ -1,18 +1,43 @@
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from .settings import settings
+from .tenancy import WORKSPACE_KEY
 
 engine = create_engine(settings.database_url, pool_pre_ping=True, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
 
+# Request handlers use the async engine; startup, migrations, CLI and report
+# workers keep the sync one above.
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_url(url: str) -> str:
+    u = make_url(url)
+    driver = _ASYNC_DRIVERS.get(u.get_backend_name())
+    if not driver:
+        raise ValueError(f"No async driver configured for {u.get_backend_name()}")
+    return u.set(drivername=driver).render_as_string(hide_password=False)
+
+_async_db_url = settings.async_database_url or async_url(settings.database_url)
+# aiosqlite gets a NullPool, which takes no sizing
+_pool_args = {} if _async_db_url.startswith("sqlite") else {
+    "pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow,
+}
+async_engine = create_async_engine(_async_db_url, pool_pre_ping=True, **_pool_args)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 class Base(DeclarativeBase):
     pass
 
+# Pass a workspace id to see (and write) only that workspace's rows, see app/tenancy.py;
+# without one the session is unscoped (CLI, maintenance, job dispatch).
+
 @contextmanager
-def session_scope():
-    db = SessionLocal()
+def session_scope(workspace_id: int | None = None):
+    db = SessionLocal(info={WORKSPACE_KEY: workspace_id})
     try:
         yield db
         db.commit()
@@ -22,3 +47,14 @@ def session_scope():
     finally:
         db.close()
 
+@asynccontextmanager
+async def async_session_scope(workspace_id: int | None = None):
+    db: AsyncSession = AsyncSessionLocal(info={WORKSPACE_KEY: workspace_id})
+    try:
+        yield db
+        await db.commit()
+    except:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
@@ -0,0 +1,272 @@
+"""
+Live updates for open pages, streamed by GET /events (Server-Sent Events).
+
+Writers call emit(db, event, data) inside their transaction, from the crud
+functions, the way they invalidate cached reports; events are published once the
+transaction commits and dropped with it (or with a savepoint) on rollback.
+Subscribers get the events of their own workspace:
+
+  report-job   {id, status, progress, ...}  queued, running, progress, done, failed
+  report-file  {id, period_type, period_start, period_end, created_at}
+  action       {id, date}                   one action added
+  actions      {count, start, end}          a batch (bulk API, imports)
+  totals       {start, end}                 minutes of these days moved: fetch them
+  changes      {}                           the change log grew (crud/changes.py)
+
+The broker is picked by EVENTS_BACKEND:
+
+- "local" (default): fan-out inside the process. Clients hear about writes made by
+  the process they are connected to; report worker processes relay theirs to the
+  web process that started them (jobs.py).
+- "postgres": events go out with NOTIFY from the writing transaction and every web
+  process LISTENs, so several web workers, `report-worker` processes and CLI
+  imports all reach every client. NOTIFY payloads are capped at 8000 bytes: keep
+  events small, clients fetch anything bigger.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import select as _select
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from .settings import settings
+from .tenancy import session_workspace
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "focuspoint_events"
+# events a subscriber may fall behind by; past that its stream ends (browsers reconnect)
+QUEUE_SIZE = 256
+
+_PENDING = "pending_events"
+_COMMITTING = "events_committing"
+
+
+def _json_default(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    raise TypeError(f"{type(v).__name__} is not JSON serializable")
+
+
+def _message(workspace_id: int, name: str, data: dict) -> str:
+    return json.dumps({"w": workspace_id, "e": name, "d": data}, separators=(",", ":"), default=_json_default)
+
+
+class Subscription:
+    """One listener (an /events stream): a bounded queue of (event, data JSON) on its event loop."""
+
+    def __init__(self, workspace_id: int):
+        self.workspace_id = workspace_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(QUEUE_SIZE)
+        self.dropped = False
+
+    def offer(self, item: tuple[str, str]) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped = True
+
+    async def get(self, timeout: float) -> tuple[str, str] | None:
+        """Next (event, data JSON), or None after `timeout` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """In-process fan-out: published after commit, to the subscribers of this process."""
+
+    shared = False
+
+    def __init__(self):
+        self._subs: dict[int, set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, workspace_id: int) -> Subscription:
+        sub = Subscription(workspace_id)
+        with self._lock:
+            self._subs[workspace_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs[sub.workspace_id].discard(sub)
+            if not self._subs[sub.workspace_id]:
+                del self._subs[sub.workspace_id]
+
+    def deliver(self, message: str) -> None:
+        """Hand a published message to its workspace's subscribers (from any thread)."""
+        msg = json.loads(message)
+        with self._lock:
+            subs = list(self._subs.get(msg["w"], ()))
+        if not subs:
+            return
+        item = (msg["e"], json.dumps(msg["d"], separators=(",", ":")))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, item)
+            except RuntimeError:  # its loop is closed
+                self.unsubscribe(sub)
+
+    def before_commit(self, db: Session, messages: list[str]) -> None:
+        pass
+
+    def after_commit(self, messages: list[str]) -> None:
+        for m in messages:
+            self.deliver(m)
+
+
+class PostgresBroker(LocalBroker):
+    """NOTIFY in the writing transaction; a LISTEN thread per process delivers to its subscribers."""
+
+    shared = True
+
+    def __init__(self):
+        super().__init__()
+        self._listener: threading.Thread | None = None
+
+    def subscribe(self, workspace_id: int) -> Subscription:
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="events-listen", daemon=True)
+                self._listener.start()
+        return super().subscribe(workspace_id)
+
+    def before_commit(self, db: Session, messages: list[str]) -> None:
+        for m in messages:
+            db.execute(select(func.pg_notify(CHANNEL, m)))
+
+    def after_commit(self, messages: list[str]) -> None:
+        pass  # comes back through the listener, like everyone else's
+
+    def _listen(self) -> None:
+        from .db import engine
+        while True:
+            conn = None
+            try:
+                conn = engine.raw_connection()
+                conn.detach()  # held for good: not the pool's any more
+                pg = conn.driver_connection
+                pg.autocommit = True
+                pg.cursor().execute(f"LISTEN {CHANNEL}")
+                while True:
+                    if _select.select([pg], [], [], 30)[0]:
+                        pg.poll()
+                        while pg.notifies:
+                            self.deliver(pg.notifies.pop(0).payload)
+            except Exception:
+                log.exception("event listener lost its connection, reconnecting")
+                if conn is not None:
+                    conn.invalidate()
+                time.sleep(5)
+
+
+class _Relay(LocalBroker):
+    """Worker processes under the local broker: committed events go to the parent through a queue."""
+
+    def __init__(self, queue):
+        super().__init__()
+        self._queue = queue
+
+    def after_commit(self, messages: list[str]) -> None:
+        for m in messages:
+            self._queue.put(m)
+
+
+_broker: LocalBroker = PostgresBroker() if settings.events_backend == "postgres" else LocalBroker()
+
+
+def broker() -> LocalBroker:
+    return _broker
+
+
+def shared_backend() -> bool:
+    """Whether events reach other processes by themselves (no relay needed)."""
+    return _broker.shared
+
+
+def relay_to(queue) -> None:
+    """In a worker process: send committed events to `queue` (the parent runs relay_from)."""
+    global _broker
+    _broker = _Relay(queue)
+
+
+def relay_from(queue) -> threading.Thread:
+    """Deliver what worker processes put on `queue` here, until a None arrives."""
+    def run():
+        while True:
+            message = queue.get()
+            if message is None:
+                return
+            _broker.deliver(message)
+
+    t = threading.Thread(target=run, name="events-relay", daemon=True)
+    t.start()
+    return t
+
+
+def emit(db: Session, name: str, data: dict, workspace_id: int | None = None) -> None:
+    """Publish an event when `db`'s transaction commits; to the session's workspace unless given."""
+    ws = workspace_id or session_workspace(db)
+    if ws is None:
+        return
+    message = _message(ws, name, data)
+    pending = db.info.setdefault(_PENDING, [])
+    if all(m != message for _, m in pending):
+        pending.append((db.get_nested_transaction() or db.get_transaction(), message))
+
+
+@contextmanager
+def subscribe(workspace_id: int):
+    sub = _broker.subscribe(workspace_id)
+    try:
+        yield sub
+    finally:
+        _broker.unsubscribe(sub)
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(db: Session) -> None:
+    if db.get_nested_transaction() is not None or not db.info.get(_PENDING):
+        return  # a savepoint: its events wait for the outer commit
+    _broker.before_commit(db, [m for _, m in db.info[_PENDING]])
+    db.info[_COMMITTING] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(db: Session) -> None:
+    if db.info.pop(_COMMITTING, False):
+        _broker.after_commit([m for _, m in db.info.pop(_PENDING, [])])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(db: Session, previous_transaction) -> None:
+    pending = db.info.get(_PENDING)
+    if not pending or previous_transaction.parent is None:
+        return  # the whole transaction: _after_transaction_end clears up
+
+    def rolled_back(txn) -> bool:
+        while txn is not None:
+            if txn is previous_transaction:
+                return True
+            txn = txn.parent
+        return False
+
+    db.info[_PENDING] = [(t, m) for t, m in pending if not rolled_back(t)]
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(db: Session, transaction) -> None:
+    if transaction.parent is None:  # committed (published already), rolled back or closed
+        db.info.pop(_PENDING, None)
+        db.info.pop(_COMMITTING, None)
@@ -0,0 +1,109 @@
+"""
+Bulk import of time entries (actions) from CSV / NDJSON.
+
+Uploads are parsed incrementally (utils.importing.RecordParser), validated against
+id maps loaded once (crud.actions.load_action_refs) and written in batches of
+IMPORT_BATCH_SIZE rows, one INSERT plus one rollup update per distinct
+(date, project, milestone) each. Every batch is committed on its own, so a long
+import makes steady progress and a bad row only costs its own line.
+
+    POST /api/actions/import                  (raw body or multipart `file`)
+    python -m app.manage import-actions FILE [--format csv|ndjson]
+"""
+from __future__ import annotations
+from types import SimpleNamespace
+from typing import AsyncIterator, BinaryIO
+
+from .crud import actions as ca, aio
+from .db import session_scope, async_session_scope
+from .settings import settings
+from .utils.importing import ImportReport, RecordParser, ParsedRecord
+
+READ_CHUNK = 64 * 1024
+
+Batch = list[tuple[int, dict]]
+
+
+class ActionImport:
+    """Parsing, validation and batching state of one import; the drivers below do the I/O."""
+
+    def __init__(self, fmt: str, refs: SimpleNamespace, batch_size: int | None = None):
+        self.parser = RecordParser(fmt)
+        self.refs = refs
+        self.batch_size = max(1, batch_size or settings.import_batch_size)
+        self.report = ImportReport(max_errors=settings.import_max_errors)
+        self._batch: Batch = []
+
+    def feed(self, chunk: bytes) -> list[Batch]:
+        return self._take(self.parser.feed(chunk), final=False)
+
+    def close(self) -> list[Batch]:
+        return self._take(self.parser.close(), final=True)
+
+    def done(self, batch: Batch, errors: list[tuple[int, str]]) -> None:
+        for line, message in errors:
+            self.report.error(line, message)
+        self.report.imported += len(batch) - len(errors)
+        self.report.batches += 1
+
+    def _take(self, records: list[ParsedRecord], final: bool) -> list[Batch]:
+        ready = []
+        for rec in records:
+            if rec.error:
+                self.report.error(rec.line, rec.error)
+                continue
+            try:
+                self._batch.append((rec.line, ca.action_from_import(rec.data, self.refs)))
+            except ValueError as e:
+                self.report.error(rec.line, str(e))
+                continue
+            if len(self._batch) >= self.batch_size:
+                ready.append(self._batch)
+                self._batch = []
+        if final and self._batch:
+            ready.append(self._batch)
+            self._batch = []
+        return ready
+
+
+def import_actions_file(fp: BinaryIO, fmt: str, batch_size: int | None = None,
+                        on_batch=None, workspace_id: int | None = None) -> ImportReport:
+    """
+    Sync driver (CLI). `on_batch(report)` is called after each committed batch.
+    Rows may reference projects of any workspace unless `workspace_id` is given.
+    """
+    with session_scope(workspace_id) as db:
+        imp = ActionImport(fmt, ca.load_action_refs(db), batch_size)
+
+        def write(batch: Batch) -> None:
+            errors = ca.insert_actions_batch(db, batch)
+            db.commit()
+            imp.done(batch, errors)
+            if on_batch:
+                on_batch(imp.report)
+
+        while chunk := fp.read(READ_CHUNK):
+            for batch in imp.feed(chunk):
+                write(batch)
+        for batch in imp.close():
+            write(batch)
+    return imp.report
+
+
+async def import_actions_stream(chunks: AsyncIterator[bytes], fmt: str, batch_size: int | None = None,
+                                workspace_id: int | None = None) -> ImportReport:
+    """Async driver (HTTP): consumes the body as it arrives, into the uploader's workspace."""
+    async with async_session_scope(workspace_id) as db:
+        imp = ActionImport(fmt, await aio.actions.load_action_refs(db), batch_size)
+
+        async def write(batch: Batch) -> None:
+            errors = await aio.actions.insert_actions_batch(db, batch)
+            await db.commit()
+            imp.done(batch, errors)
+
+        async for chunk in chunks:
+            for batch in imp.feed(chunk):
+                await write(batch)
+        for batch in imp.close():
+            await write(batch)
+    return imp.report
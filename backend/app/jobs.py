@@ -0,0 +1,198 @@
+"""
+Background report generation.
+
+`POST /api/reports/generate` only enqueues a ReportJob row. A ReportJobRunner
+(started with the web app, or standalone via `python -m app.manage report-worker`)
+claims queued jobs and renders them in a bounded pool of worker processes, so
+WeasyPrint never runs on a request thread. The queue is shared by all workspaces;
+each job renders and files its report within the workspace that queued it. Jobs live in the database: they
+survive restarts (stale `running` rows are requeued) and are retried with
+backoff until `max_attempts`.
+
+Job progress and new files are published as events (events.py). With the local
+events backend the worker processes relay theirs to the process that started them.
+"""
+from __future__ import annotations
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from . import events
+from .db import session_scope
+from .settings import settings
+from .crud import reports as cr
+from .utils.dates import period_bounds
+
+log = logging.getLogger(__name__)
+
+# the dispatcher refreshes heartbeat_at of the jobs it is rendering this often, so a
+# long write_pdf is not taken for a dead one; the stale threshold is kept well above
+HEARTBEAT_SECONDS = 30
+MIN_STALE_SECONDS = 4 * HEARTBEAT_SECONDS
+
+
+def run_report_job(job_id: int, templates_dir: str, reports_dir: str, app_name: str) -> int:
+    """Worker-process entry point: render one claimed job and register its file."""
+    from .utils.reporting import render_report_pdf
+
+    with session_scope() as db:
+        job = cr.get_report_job(db, job_id)
+        if not job:
+            raise ValueError(f"Report job {job_id} not found")
+        period_type, start, workspace_id = job.period_type, job.period_start, job.workspace_id
+
+    def progress(pct: int) -> None:
+        with session_scope() as db:
+            cr.set_report_job_progress(db, job_id, pct)
+
+    out_path = render_report_pdf(
+        Path(templates_dir), Path(reports_dir), period_type, start, app_name, progress=progress,
+        workspace_id=workspace_id,
+    )
+    ps, pe = period_bounds(period_type, start)
+    with session_scope(workspace_id) as db:
+        row = cr.create_report_file(db, period_type, ps, pe, str(out_path))
+        cr.finish_report_job(db, job_id, row.id)
+        return int(row.id)
+
+
+def _warm_worker(templates_dir: str, events_queue=None) -> None:
+    """Pool initializer: fonts, stylesheets and templates are loaded once per worker process."""
+    from .utils.reporting import warm_renderer
+    if events_queue is not None:
+        events.relay_to(events_queue)
+    try:
+        warm_renderer(Path(templates_dir))
+    except Exception:
+        log.exception("could not pre-warm the report renderer")
+
+
+class ReportJobRunner:
+    """Dispatcher thread feeding a process pool of at most `workers` renders at a time."""
+
+    def __init__(self, templates_dir: Path, reports_dir: Path, app_name: str,
+                 workers: int, poll_interval: float = 2.0):
+        self.templates_dir = templates_dir
+        self.reports_dir = reports_dir
+        self.app_name = app_name
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._pool: ProcessPoolExecutor | None = None
+        self._thread: threading.Thread | None = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._inflight: dict[Future, int] = {}  # future -> job id
+        self._events = None  # worker events for the local backend (events.relay_from)
+
+    # --- lifecycle ---
+
+    def start(self) -> None:
+        if self.workers <= 0 or self._thread:
+            return
+        self._stop.clear()
+        if not events.shared_backend():
+            self._events = multiprocessing.get_context("spawn").Queue()
+            events.relay_from(self._events)
+        self._pool = self._new_pool()
+        self._thread = threading.Thread(target=self._loop, name="report-jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._pool:
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+            self._pool = None
+        if self._events is not None:
+            self._events.put(None)
+            self._events = None
+
+    def wake(self) -> None:
+        """Dispatch right away instead of at the next poll (call after enqueueing)."""
+        self._wake.set()
+
+    def run_forever(self) -> None:
+        self.start()
+        try:
+            while self._thread and self._thread.is_alive():
+                self._thread.join(timeout=1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop(wait=True)
+
+    # --- internals ---
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: children build their own engine instead of inheriting pooled connections
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+            initargs=(str(self.templates_dir), self._events),
+        )
+
+    def _loop(self) -> None:
+        last_sweep = last_beat = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - last_beat > HEARTBEAT_SECONDS:
+                    with self._lock:
+                        running = list(self._inflight.values())
+                    with session_scope() as db:
+                        cr.heartbeat_report_jobs(db, running)
+                    last_beat = time.monotonic()
+                if time.monotonic() - last_sweep > 60:
+                    stale = max(settings.report_job_stale_seconds, MIN_STALE_SECONDS)
+                    with session_scope() as db:
+                        n = cr.requeue_stale_report_jobs(db, stale)
+                    if n:
+                        log.warning("requeued or failed %d stale report job(s)", n)
+                    last_sweep = time.monotonic()
+                self._dispatch()
+            except Exception:
+                log.exception("report job dispatch failed")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _dispatch(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                if len(self._inflight) >= self.workers:
+                    return
+            with session_scope() as db:
+                job = cr.claim_report_job(db)
+                job_id = int(job.id) if job else None
+            if job_id is None:
+                return
+            args = (run_report_job, job_id, str(self.templates_dir), str(self.reports_dir), self.app_name)
+            try:
+                fut = self._pool.submit(*args)
+            except BrokenProcessPool:
+                self._pool = self._new_pool()
+                fut = self._pool.submit(*args)
+            with self._lock:
+                self._inflight[fut] = job_id
+            fut.add_done_callback(lambda f, jid=job_id: self._done(jid, f))
+
+    def _done(self, job_id: int, fut: Future) -> None:
+        with self._lock:
+            self._inflight.pop(fut, None)
+        exc = None if fut.cancelled() else fut.exception()
+        if fut.cancelled() or exc is not None:
+            reason = "cancelled" if exc is None else f"{type(exc).__name__}: {exc}"
+            log.warning("report job %d failed: %s", job_id, reason)
+            try:
+                with session_scope() as db:
+                    cr.fail_report_job(db, job_id, reason, retry_seconds=settings.report_job_retry_seconds)
+            except Exception:
+                log.exception("could not record failure of report job %d", job_id)
+        self._wake.set()
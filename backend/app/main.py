@@ -1,41 +1,46 @@
 from pathlib import Path
-from datetime import date
+from datetime import date, timedelta
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import Response, HTMLResponse, RedirectResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.templating import Jinja2Templates
 
 from .crud import actions as ca   # ADD THIS
+from .crud import aio
 from .utils.formatting import parse_dmy, minutes_to_hhmm  # keep parse_dmy; minutes_to_hhmm optional
 
 from .settings import settings
-from .db import engine, Base, session_scope
-from .models import User
+from .db import session_scope, async_session_scope, async_engine
+from .migrations import migrate
 from .security.auth import (
-    login_user, logout_user, verify_password, current_user_id, bootstrap_admin
+    login_user, logout_user, verify_password_async, current_user_id, current_workspace_id, workspace_scope,
+    bootstrap_admin
 )
 from .security.csrf import get_or_set_csrf, validate_csrf
+from .schemas import MilestoneBatch
 
-from .crud import reports as cr
-from .crud.actions import totals_by_day_range, totals_by_project_range, total_minutes_range
-from .utils.dates import week_bounds, month_bounds, year_bounds
-from .utils.formatting import parse_dmy, minutes_to_hhmm, dmy
+from .utils.dates import week_bounds
+from .utils.formatting import parse_dmy, minutes_to_hhmm, dmy, report_filename
 
 
 # CRUD layers
-from .crud import categories as cc
-from .crud import projects as cp
-from .crud import milestones as cm
 from .crud import dependencies as cd
-from .crud import reports as cr
-from .utils.dates import week_bounds, month_bounds, year_bounds
+from .crud import portfolio as cpf
+from .utils.dates import week_bounds
 from .utils.formatting import parse_dmy
-from .utils.reporting import render_report_pdf
+from .jobs import ReportJobRunner
+from .maintenance import MaintenanceThread, run_all as run_maintenance
+from .utils.reporting import build_report_context, render_context_html, report_contexts
+from .utils.executors import render_executor, run_in, shutdown_executors
+from .utils.importing import FORMATS as IMPORT_FORMATS, detect_format
+from .imports import import_actions_stream
+from .exports import ExportFilters, MEDIA_TYPES as EXPORT_MEDIA_TYPES, export_filename, stream_actions_export
+from .api_v1 import router as api_v1_router
+from . import events
+from .crud.search import RANK_WINDOW, SearchPage
 
 # --- App & FS
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(title=settings.app_name)
 app.add_middleware(SessionMiddleware, secret_key=settings.secret_key, session_cookie=settings.session_cookie_name)
 
@@ -45,40 +50,69 @@ reports_dir = Path(__file__).parent / "reports"
 reports_dir.mkdir(parents=True, exist_ok=True)
 
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+app.include_router(api_v1_router)
 
 templates = Jinja2Templates(directory=str(templates_dir))
 templates.env.globals["APP_NAME"] = settings.app_name
 templates.env.filters["hhmm"] = minutes_to_hhmm
 
+report_jobs = ReportJobRunner(templates_dir, reports_dir, settings.app_name, workers=settings.report_workers)
+maintenance = MaintenanceThread(settings.maintenance_interval_seconds)
+
+# rows per page on the HTML lists (keyset pages: `cursor` is the next_cursor of the previous one)
+LIST_PAGE_SIZE = 50
+DAY_PAGE_SIZE = 100
+ACTIONS_WINDOW_DAYS = 7
+
+async def _keyset_page(fetch, cursor: str | None):
+    """fetch(cursor) for one page; a malformed cursor (edited URL) falls back to the first page."""
+    try:
+        return await fetch(cursor)
+    except ValueError:
+        return await fetch(None)
+
 def render(tpl: str, **ctx):
     template = templates.get_template(tpl)
     return HTMLResponse(template.render(**ctx))
 
 @app.on_event("startup")
 def startup():
+    migrate()
     bootstrap_admin()
+    with session_scope() as db:
+        ca.ensure_action_rollup(db)
+    run_maintenance()  # creates this/next year's actions partitions before the first insert
+    maintenance.start()
+    report_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    report_jobs.stop()
+    maintenance.stop()
+    shutdown_executors()
+    await async_engine.dispose()
 
 # ------------------
 # Auth
 # ------------------
 @app.get("/login")
-def login_page(request: Request):
+async def login_page(request: Request):
     return render("auth/login.html", request=request, csrf_token=get_or_set_csrf(request), title="Login")
 
 @app.post("/login")
-def login_submit(request: Request, email: str = Form(...), password: str = Form(...), csrf_token: str = Form(...)):
+async def login_submit(request: Request, email: str = Form(...), password: str = Form(...), csrf_token: str = Form(...)):
     validate_csrf(request, csrf_token)
-    with session_scope() as db:
-        user = db.query(User).filter(User.email == email).first()
-        if not user or not verify_password(password, user.password_hash):
-            return render("auth/login.html", request=request, csrf_token=get_or_set_csrf(request),
-                          title="Login", error="Invalid credentials")
-        user_id = int(user.id)  # capture before session closes
+    async with async_session_scope() as db:
+        user = await aio.users.get_user_by_email(db, email)
+    if not user or not await verify_password_async(password, user.password_hash):
+        return render("auth/login.html", request=request, csrf_token=get_or_set_csrf(request),
+                      title="Login", error="Invalid credentials")
+    user_id, workspace_id = int(user.id), int(user.workspace_id)
     resp = RedirectResponse(url="/", status_code=303)
-    return login_user(resp, request, user_id)
+    return login_user(resp, request, user_id, workspace_id)
 
 @app.post("/logout")
-def logout(request: Request, csrf_token: str = Form(...)):
+async def logout(request: Request, csrf_token: str = Form(...)):
     validate_csrf(request, csrf_token)
     resp = RedirectResponse(url="/login", status_code=303)
     return logout_user(resp, request)
@@ -87,13 +121,13 @@ def logout(request: Request, csrf_token: str = Form(...)):
 # Pages
 # ------------------
 @app.get("/")
-def home(request: Request):
+async def home(request: Request):
     if not current_user_id(request):
         return RedirectResponse(url="/login", status_code=302)
     return RedirectResponse(url="/add-action", status_code=302)
 
 @app.get("/add-action")
-def add_action_page(request: Request, day_dmy: str | None = None):
+async def add_action_page(request: Request, day_dmy: str | None = None, cursor: str | None = None):
     if not current_user_id(request):
         return RedirectResponse(url="/login", status_code=302)
 
@@ -108,11 +142,11 @@ def add_action_page(request: Request, day_dmy: str | None = None):
     else:
         sel_date = _date.today()
 
-    with session_scope() as db:
-        # For the autocomplete
-        all_ms = cp.list_all_milestones_with_project_name(db)
-        # Today’s actions list
-        rows = ca.list_actions_by_date(db, sel_date)
+    async with workspace_scope(request) as db:
+        # The day's actions, a page at a time (milestones are searched as the user types:
+        # /api/milestones/search); the total comes from the rollup, not the rows shown
+        page = await _keyset_page(lambda c: aio.actions.page_actions_by_date(db, sel_date, c, DAY_PAGE_SIZE), cursor)
+        day_total = await aio.actions.total_minutes_range(db, sel_date, sel_date)
 
     return render(
         "tabs/add_action.html",
@@ -120,14 +154,17 @@ def add_action_page(request: Request, day_dmy: str | None = None):
         csrf_token=get_or_set_csrf(request),
         title="Add Action",
         day_dmy=_dmy(sel_date),
-        milestones=all_ms,
-        actions=rows
+        day_iso=sel_date.isoformat(),
+        actions=page.items,
+        day_total=day_total,
+        next_cursor=page.next_cursor,
+        paged=bool(cursor)
     )
 
 
 
 @app.post("/api/actions/add")
-def api_actions_add(
+async def api_actions_add(
     request: Request,
     csrf_token: str = Form(...),
     date_dmy: str = Form(...),
@@ -137,20 +174,29 @@ def api_actions_add(
     comment: str = Form("")
 ):
     validate_csrf(request, csrf_token)
+    # Fragment mode (forms.js, Accept: application/json): answer with the new row and the
+    # day total instead of redirecting to a full re-render of the page.
+    fragment = "application/json" in request.headers.get("accept", "")
+
+    def fail(message: str, status_code: int = 400):
+        if fragment:
+            return JSONResponse({"error": message}, status_code=status_code)
+        return HTMLResponse(message, status_code=status_code)
 
     # Validate IDs
     if not project_id.strip():
-        return HTMLResponse("Project is required", status_code=400)
+        return fail("Project is required")
     pid = int(project_id)
     mid = int(milestone_id) if milestone_id.strip() else None
 
     # Validate date & time inside CRUD; but pre-check to give friendly errors
-    if not parse_dmy(date_dmy.strip()):
-        return HTMLResponse("Invalid date (use DD/MM/YYYY)", status_code=400)
+    day = parse_dmy(date_dmy.strip())
+    if not day:
+        return fail("Invalid date (use DD/MM/YYYY)")
 
-    with session_scope() as db:
-        try:
-            ca.add_action(
+    try:
+        async with workspace_scope(request) as db:
+            a = await aio.actions.add_action(
                 db,
                 project_id=pid,
                 milestone_id=mid,
@@ -158,51 +204,158 @@ def api_actions_add(
                 hhmm=hhmm.strip(),
                 comment=(comment.strip() or None),
             )
-        except ValueError as e:
-            # Re-render the page with an error message
-            from datetime import date as _date
-            from .utils.formatting import dmy as _dmy
-            all_ms = cp.list_all_milestones_with_project_name(db)
-            rows = ca.list_actions_by_date(db, parse_dmy(date_dmy.strip()) or _date.today())
-            return render(
-                "tabs/add_action.html",
-                request=request,
-                csrf_token=get_or_set_csrf(request),
-                title="Add Action",
-                day_dmy=_dmy(parse_dmy(date_dmy.strip()) or _date.today()),
-                milestones=all_ms,
-                actions=rows,
-                error=str(e)
-            )
+            if fragment:
+                row = await aio.actions.get_action_row(db, a.id, day)
+                day_total = await aio.actions.total_minutes_range(db, day, day)
+    except ValueError as e:
+        # The failed write is rolled back by now; the page is rendered from a fresh session
+        if fragment:
+            return fail(str(e))
+        async with workspace_scope(request) as db:
+            page = await aio.actions.page_actions_by_date(db, day, None, DAY_PAGE_SIZE)
+            day_total = await aio.actions.total_minutes_range(db, day, day)
+        return render(
+            "tabs/add_action.html",
+            request=request,
+            csrf_token=get_or_set_csrf(request),
+            title="Add Action",
+            day_dmy=dmy(day),
+            day_iso=day.isoformat(),
+            actions=page.items,
+            day_total=day_total,
+            next_cursor=page.next_cursor,
+            error=str(e)
+        )
+
+    if fragment:
+        return JSONResponse({
+            "action_id": row.id,
+            "date_dmy": dmy(day),
+            "row_html": templates.get_template("includes/action_row.html").render(a=row),
+            "day_total_minutes": day_total,
+            "day_total_hhmm": minutes_to_hhmm(day_total),
+        }, status_code=201)
 
     # Redirect back to same day
     return RedirectResponse(url=f"/add-action?day_dmy={date_dmy.strip()}", status_code=303)
 
+# One action as a row of the day list (live.js inserts actions added elsewhere)
+@app.get("/api/actions/{action_id}/row")
+async def api_action_row(request: Request, action_id: int, day: date):
+    async with workspace_scope(request) as db:
+        row = await aio.actions.get_action_row(db, action_id, day)
+    if not row:
+        return JSONResponse({"detail": "Not found"}, status_code=404)
+    return JSONResponse({
+        "action_id": row.id,
+        "date_dmy": dmy(day),
+        "row_html": templates.get_template("includes/action_row.html").render(a=row),
+    })
+
+# Actions over a date window (several days), newest first, a keyset page at a time
+@app.get("/actions")
+async def actions_page(request: Request, start_dmy: str = "", end_dmy: str = "",
+                       project_id: int | None = None, cursor: str | None = None):
+    if not current_user_id(request):
+        return RedirectResponse(url="/login", status_code=302)
+    end = parse_dmy(end_dmy.strip()) or date.today()
+    start = parse_dmy(start_dmy.strip()) or end - timedelta(days=ACTIONS_WINDOW_DAYS - 1)
+    if start > end:
+        start, end = end, start
+    async with workspace_scope(request) as db:
+        page = await _keyset_page(
+            lambda c: aio.actions.page_actions(db, start, end, project_id, c, LIST_PAGE_SIZE), cursor)
+        if project_id:
+            by_project = await aio.actions.totals_by_project_range(db, start, end)
+            total = next((p.total_minutes for p in by_project if p.project_id == project_id), 0)
+        else:
+            total = await aio.actions.total_minutes_range(db, start, end)
+    return render(
+        "tabs/actions.html",
+        request=request,
+        csrf_token=get_or_set_csrf(request),
+        title="Actions",
+        actions=page.items,
+        next_cursor=page.next_cursor,
+        paged=bool(cursor),
+        start_dmy=dmy(start),
+        end_dmy=dmy(end),
+        project_id=project_id,
+        project_name=page.items[0].project_name if project_id and page.items else None,
+        total_minutes=total
+    )
+
+# Full-text search of action comments and milestone notes, best match first
+@app.get("/search")
+async def search_page(request: Request, q: str = "", kind: str = "", project_id: int | None = None,
+                      category_id: int | None = None, start_dmy: str = "", end_dmy: str = "",
+                      cursor: str | None = None):
+    if not current_user_id(request):
+        return RedirectResponse(url="/login", status_code=302)
+    start, end = parse_dmy(start_dmy.strip()), parse_dmy(end_dmy.strip())
+    error = None
+    async with workspace_scope(request) as db:
+        cats = await aio.categories.list_categories(db)
+        try:
+            page = await _keyset_page(lambda c: aio.search.search_text(
+                db, q, kind=kind or None, project_id=project_id, category_id=category_id,
+                start=start, end=end, cursor=c, limit=LIST_PAGE_SIZE), cursor)
+        except ValueError as e:
+            page, error = SearchPage([], None), str(e)
+    return render(
+        "tabs/search.html",
+        request=request,
+        csrf_token=get_or_set_csrf(request),
+        title="Search",
+        q=q,
+        kind=kind,
+        categories=cats,
+        category_id=category_id,
+        project_id=project_id,
+        project_name=page.items[0].project_name if project_id and page.items else None,
+        start_dmy=dmy(start) if start else "",
+        end_dmy=dmy(end) if end else "",
+        hits=page.items,
+        next_cursor=page.next_cursor,
+        paged=bool(cursor),
+        truncated=page.truncated,
+        rank_window=RANK_WINDOW,
+        error=error
+    )
+
 @app.get("/categories")
-def categories_page(request: Request):
+async def categories_page(request: Request, cursor: str | None = None):
     if not current_user_id(request):
         return RedirectResponse(url="/login", status_code=302)
     ok = request.query_params.get("ok")
-    with session_scope() as db:
-        cats = cc.list_categories(db)
+    async with workspace_scope(request) as db:
+        page = await _keyset_page(lambda c: aio.categories.page_categories(db, c, LIST_PAGE_SIZE), cursor)
     return render(
         "tabs/categories.html",
         request=request,
         csrf_token=get_or_set_csrf(request),
         title="Categories",
-        categories=cats,
+        categories=page.items,
+        next_cursor=page.next_cursor,
+        paged=bool(cursor),
         success=("Saved" if ok else None)
     )
 
 @app.get("/projects")
-def projects_page(request: Request, category_id: int | None = None, project_id: int | None = None, view: str = "list"):
+async def projects_page(request: Request, category_id: int | None = None, project_id: int | None = None,
+                        view: str = "list", cursor: str | None = None):
     if not current_user_id(request):
         return RedirectResponse(url="/login", status_code=302)
-    with session_scope() as db:
-        cats = cc.list_categories(db)
-        projs = cp.list_projects(db, category_id=category_id)
+    async with workspace_scope(request) as db:
+        cats = await aio.categories.list_categories(db)
+        page = await _keyset_page(lambda c: aio.projects.page_projects(db, category_id, None, c, LIST_PAGE_SIZE), cursor)
+        projs = list(page.items)
         sel_id = project_id or (projs[0].id if projs else None)
-        ms = cp.list_milestones_for_project(db, sel_id) if sel_id else []
+        if sel_id and all(p.id != sel_id for p in projs):
+            # the open project stays selectable when it is not on this page
+            sel = await aio.projects.get_project(db, sel_id)
+            projs = [sel] + projs if sel else projs
+        ms = await aio.projects.list_milestones_for_project(db, sel_id) if sel_id else []
     return render(
         "tabs/projects.html",
         request=request,
@@ -213,11 +366,14 @@ def projects_page(request: Request, category_id: int | None = None, project_id:
         milestones=ms,
         category_id=category_id,
         selected_pid=sel_id,
-        view=view
+        view=view,
+        today=date.today(),
+        next_cursor=page.next_cursor,
+        paged=bool(cursor)
     )
 
 @app.get("/reviews")
-def reviews_page(request: Request, week_start_dmy: str | None = None):
+async def reviews_page(request: Request, week_start_dmy: str | None = None):
     if not current_user_id(request):
         return RedirectResponse(url="/login", status_code=302)
 
@@ -232,10 +388,12 @@ def reviews_page(request: Request, week_start_dmy: str | None = None):
     ws, we = week_bounds(ws)  # normalize to Mon–Sun
 
     # Pull data
-    with session_scope() as db:
-        days = totals_by_day_range(db, ws, we)          # [(date, minutes)]
-        per_project = totals_by_project_range(db, ws, we, limit=None)
-        week_total = total_minutes_range(db, ws, we)
+    async with workspace_scope(request) as db:
+        days = await aio.actions.totals_by_day_range(db, ws, we)          # [(date, minutes)]
+        per_project = await aio.actions.totals_by_project_range(db, ws, we, limit=None)
+        week_total = await aio.actions.total_minutes_range(db, ws, we)
+        # open milestones due by the end of next week, overdue ones included
+        review_ms = await aio.milestones.list_review_milestones(db, we + timedelta(days=7), today)
 
     # Prepare template-friendly rows
     series_max = max((m for _, m in days), default=0)
@@ -243,6 +401,7 @@ def reviews_page(request: Request, week_start_dmy: str | None = None):
     for d, minutes in days:
         pct = int((minutes * 100) / series_max) if series_max > 0 else 0
         day_rows.append({
+            "date": d.isoformat(),
             "label": d.strftime("%a"),
             "minutes": minutes,
             "hhmm": minutes_to_hhmm(minutes),
@@ -260,7 +419,6 @@ def reviews_page(request: Request, week_start_dmy: str | None = None):
         })
 
     # Prev/next links (Mon-based)
-    from datetime import timedelta
     prev_ws = ws - timedelta(days=7)
     next_ws = ws + timedelta(days=7)
 
@@ -273,38 +431,122 @@ def reviews_page(request: Request, week_start_dmy: str | None = None):
         day_rows=day_rows,
         proj_rows=proj_rows,
         week_total_hhmm=minutes_to_hhmm(week_total),
+        review_ms=review_ms,
         prev_ws_dmy=dmy(prev_ws),
         this_ws_dmy=dmy(week_bounds(today)[0]),
         next_ws_dmy=dmy(next_ws),
     )
 
+@app.get("/portfolio")
+async def portfolio_page(request: Request, category_id: int | None = None):
+    if not current_user_id(request):
+        return RedirectResponse(url="/login", status_code=302)
+    async with workspace_scope(request) as db:
+        cats = await aio.categories.list_categories(db)
+        data, _ = await aio.portfolio.portfolio(db, date.today(), category_id)
+    return render(
+        "tabs/portfolio.html",
+        request=request,
+        csrf_token=get_or_set_csrf(request),
+        title="Portfolio",
+        categories=cats,
+        category_id=category_id,
+        portfolio=data,
+    )
+
 @app.get("/reports")
-def reports_page(request: Request):
+async def reports_page(request: Request, cursor: str | None = None):
     if not current_user_id(request):
         return RedirectResponse(url="/login", status_code=302)
     ok = request.query_params.get("ok")
-    with session_scope() as db:
-        files = cr.list_report_files(db)
+    async with workspace_scope(request) as db:
+        page = await _keyset_page(lambda c: aio.reports.page_report_files(db, c, LIST_PAGE_SIZE), cursor)
+        jobs = await aio.reports.list_report_jobs(db, limit=10)
     return render("tabs/reports.html",
                   request=request,
                   csrf_token=get_or_set_csrf(request),
                   title="Reports",
-                  reports=files,
-                  success=("Report generated" if ok else None))
+                  reports=page.items,
+                  next_cursor=page.next_cursor,
+                  paged=bool(cursor),
+                  jobs=jobs,
+                  success=("Report queued" if ok else None))
 
 @app.get("/settings")
-def settings_page(request: Request):
+async def settings_page(request: Request):
     if not current_user_id(request):
         return RedirectResponse(url="/login", status_code=302)
     return render("tabs/settings.html", request=request, csrf_token=get_or_set_csrf(request), title="Settings")
 
+# Bulk import: multipart upload (settings page) or a raw CSV/NDJSON body with X-CSRF-Token
+async def _upload_chunks(upload, size: int = 64 * 1024):
+    while chunk := await upload.read(size):
+        yield chunk
+
+@app.post("/api/actions/import")
+async def api_actions_import(request: Request, format: str | None = None):
+    if not current_user_id(request):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+    ctype = request.headers.get("content-type", "")
+    if ctype.startswith("multipart/form-data"):
+        form = await request.form()
+        validate_csrf(request, str(form.get("csrf_token") or ""))
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            return JSONResponse({"detail": "No file uploaded"}, status_code=400)
+        fmt = format or form.get("format") or detect_format(upload.filename, upload.content_type)
+        chunks = _upload_chunks(upload)
+    else:
+        validate_csrf(request, request.headers.get("x-csrf-token", ""))
+        fmt = format or detect_format(content_type=ctype)
+        chunks = request.stream()
+    if fmt not in IMPORT_FORMATS:
+        return JSONResponse({"detail": "Unknown format (use csv or ndjson)"}, status_code=400)
+
+    report = await import_actions_stream(chunks, fmt, workspace_id=current_workspace_id(request))
+    if "text/html" in request.headers.get("accept", ""):
+        return render("tabs/settings.html", request=request, csrf_token=get_or_set_csrf(request),
+                      title="Settings", import_result=report.as_dict())
+    return JSONResponse(report.as_dict())
+
 # ------------------
 # API (forms)
 # ------------------
 
+# Streaming export (server-side cursor; gzip=1 compresses on the fly)
+@app.get("/api/actions/export")
+async def api_actions_export(
+    request: Request,
+    format: str = "csv",
+    start_dmy: str = "",
+    end_dmy: str = "",
+    project_id: int | None = None,
+    category_id: int | None = None,
+    gzip: bool = False,
+):
+    if not current_user_id(request):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+    if format not in EXPORT_MEDIA_TYPES:
+        return JSONResponse({"detail": "Unknown format (use csv or ndjson)"}, status_code=400)
+    filters = ExportFilters(project_id=project_id, category_id=category_id,
+                            workspace_id=current_workspace_id(request))
+    for name, raw in (("start", start_dmy), ("end", end_dmy)):
+        if raw.strip():
+            d = parse_dmy(raw.strip())
+            if not d:
+                return JSONResponse({"detail": f"Invalid {name} date (DD/MM/YYYY)"}, status_code=400)
+            setattr(filters, name, d)
+
+    filename = export_filename(format, filters, gzip)
+    return StreamingResponse(
+        stream_actions_export(format, filters, gzip),
+        media_type="application/gzip" if gzip else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 # Categories
 @app.post("/api/categories/upsert")
-def api_categories_upsert(
+async def api_categories_upsert(
     request: Request,
     csrf_token: str = Form(...),
     id: str = Form(""),
@@ -312,14 +554,14 @@ def api_categories_upsert(
     description: str = Form("")
 ):
     validate_csrf(request, csrf_token)
-    with session_scope() as db:
+    async with workspace_scope(request) as db:
         cid = int(id) if id.strip() else None
-        cc.upsert_category(db, id=cid, name=name.strip(), description=(description.strip() or None))
+        await aio.categories.upsert_category(db, id=cid, name=name.strip(), description=(description.strip() or None))
     return RedirectResponse(url="/categories?ok=1", status_code=303)
 
 # Projects
 @app.post("/api/projects/upsert")
-def api_projects_upsert(
+async def api_projects_upsert(
     request: Request,
     csrf_token: str = Form(...),
     id: str = Form(""),
@@ -334,8 +576,8 @@ def api_projects_upsert(
     validate_csrf(request, csrf_token)
     pid = int(id) if id.strip() else None
     cat_id = int(category_id) if category_id.strip() else None
-    with session_scope() as db:
-        p = cp.upsert_project(
+    async with workspace_scope(request) as db:
+        p = await aio.projects.upsert_project(
             db, id=pid, category_id=cat_id, name=name.strip(),
             objective=(objective.strip() or None), description=(description.strip() or None),
             color=(color.strip() or None), end_date_dmy=end_date_dmy.strip(), status=status
@@ -345,7 +587,7 @@ def api_projects_upsert(
 
 # Milestones
 @app.post("/api/milestones/upsert")
-def api_milestones_upsert(
+async def api_milestones_upsert(
     request: Request,
     csrf_token: str = Form(...),
     id: str = Form(""),
@@ -360,48 +602,118 @@ def api_milestones_upsert(
     validate_csrf(request, csrf_token)
     mid = int(id) if id.strip() else None
     dep = int(dependent_to_id) if dependent_to_id.strip() else None
-    with session_scope() as db:
-        m = cm.upsert_milestone(
-            db, id=mid, project_id=project_id, name=name.strip(),
-            end_date_dmy=end_date_dmy.strip(), percent_complete=percent_complete,
-            status=status, note=(note.strip() or None), dependent_to_id=dep
-        )
-        sel_project = int(m.project_id)
+    try:
+        async with workspace_scope(request) as db:
+            m = await aio.milestones.upsert_milestone(
+                db, id=mid, project_id=project_id, name=name.strip(),
+                end_date_dmy=end_date_dmy.strip(), percent_complete=percent_complete,
+                status=status, note=(note.strip() or None), dependent_to_id=dep
+            )
+            sel_project = int(m.project_id)
+    except ValueError as e:
+        # e.g. the dependency would close a cycle; nothing was written
+        return HTMLResponse(str(e), status_code=400)
     return RedirectResponse(url=f"/projects?project_id={sel_project}&view=list#m-{m.id}", status_code=303)
 
+@app.get("/api/milestones/search")
+async def api_milestones_search(request: Request, q: str = "", limit: int = 20):
+    if not current_user_id(request):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+    async with workspace_scope(request) as db:
+        results = await aio.milestones.search_milestones(db, q, limit=limit)
+    return JSONResponse(results)
+
+@app.post("/api/milestones/batch")
+async def api_milestones_batch(request: Request, body: MilestoneBatch):
+    # JSON body; CSRF token in the X-CSRF-Token header
+    if not current_user_id(request):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+    validate_csrf(request, request.headers.get("x-csrf-token", ""))
+    changes = [c.model_dump(exclude_unset=True) for c in body.changes]
+    async with workspace_scope(request) as db:
+        results = await aio.milestones.apply_milestone_changes(db, changes)
+    return JSONResponse({
+        "updated": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "results": results,
+    })
+
 @app.post("/api/milestones/{mid}/percent")
-def api_milestones_percent(request: Request, mid: int, csrf_token: str = Form(...), value_num: int = Form(...)):
+async def api_milestones_percent(request: Request, mid: int, csrf_token: str = Form(...), value_num: int = Form(...)):
     validate_csrf(request, csrf_token)
-    with session_scope() as db:
-        m = cm.set_percent(db, mid, value_num)
+    async with workspace_scope(request) as db:
+        m = await aio.milestones.set_percent(db, mid, value_num)
         pid = int(m.project_id)
     return RedirectResponse(url=f"/projects?project_id={pid}&view=list#m-{mid}", status_code=303)
 
 @app.post("/api/milestones/{mid}/note")
-def api_milestones_note(request: Request, mid: int, csrf_token: str = Form(...), note: str = Form("")):
+async def api_milestones_note(request: Request, mid: int, csrf_token: str = Form(...), note: str = Form("")):
     validate_csrf(request, csrf_token)
-    with session_scope() as db:
-        m = cm.set_note(db, mid, (note.strip() or None))
+    async with workspace_scope(request) as db:
+        m = await aio.milestones.set_note(db, mid, (note.strip() or None))
         pid = int(m.project_id)
     return RedirectResponse(url=f"/projects?project_id={pid}&view=list#m-{mid}", status_code=303)
 
-# Node graph data (vis-network)
+# Node graph data (vis-network), compact format expanded by static/js/nodeview_vis.js
 @app.get("/api/projects/{pid}/graph")
-def project_graph(pid: int):
-    from datetime import date as _date
-    with session_scope() as db:
-        data = cd.graph_for_project(db, pid, _date.today())
-        # also expose milestone status for client-side hiding
-        # (graph_for_project already sizes & colors)
-        # ensure nodes have 'status' key:
-        # (backfill if missing)
-        for n in data.get("nodes", []):
-            n.setdefault("status", "active")
-        return data
+async def project_graph(request: Request, pid: int):
+    if not current_user_id(request):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+    today = date.today()
+    async with workspace_scope(request) as db:
+        version = await aio.projects.project_graph_version(db, pid)
+        if version is None:
+            return JSONResponse({"detail": "Project not found"}, status_code=404)
+        etag = cd.graph_etag(pid, version, today)
+        # no-cache: the browser keeps the body and revalidates it with If-None-Match
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        data = await aio.dependencies.graph_for_project(db, pid, today)
+    return JSONResponse(data, headers={**headers, "ETag": cd.graph_etag(pid, data["version"], today)})
+
+# Every active project's health summary and graph (static/js/nodeview_vis.js expands the graphs)
+@app.get("/api/portfolio")
+async def api_portfolio(request: Request, category_id: int | None = None):
+    if not current_user_id(request):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+    today = date.today()
+    async with workspace_scope(request) as db:
+        stamp = await aio.portfolio.portfolio_stamp(db)
+        etag = cpf.portfolio_etag(stamp, category_id, today)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        data, _ = await aio.portfolio.portfolio(db, today, category_id, stamp)
+    return JSONResponse(data, headers=headers)
+
+# Live updates (events.py) as Server-Sent Events; browsers reconnect by themselves
+EVENTS_PING_SECONDS = 15
+
+@app.get("/events")
+async def events_stream(request: Request):
+    workspace_id = current_workspace_id(request)
+    if not workspace_id:
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+
+    async def stream():
+        with events.subscribe(workspace_id) as sub:
+            yield "retry: 3000\n\n"
+            while not sub.dropped:  # too far behind: end it, the browser reconnects
+                item = await sub.get(EVENTS_PING_SECONDS)
+                if await request.is_disconnected():
+                    return
+                if item is None:
+                    yield ": ping\n\n"
+                else:
+                    yield f"event: {item[0]}\ndata: {item[1]}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Reports (basic generate/download hooks)
 @app.post("/api/reports/generate")
-def api_reports_generate(
+async def api_reports_generate(
     request: Request,
     csrf_token: str = Form(...),
     type: str = Form(...),
@@ -410,6 +722,10 @@ def api_reports_generate(
     validate_csrf(request, csrf_token)
     today = date.today()
 
+    if type not in ("weekly", "monthly", "yearly"):
+        return render("tabs/reports.html", request=request, csrf_token=get_or_set_csrf(request),
+                      title="Reports", error="Unknown report type", reports=[])
+
     # Resolve start date (DD/MM/YYYY or default period start)
     if start_dmy.strip():
         start = parse_dmy(start_dmy.strip())
@@ -421,37 +737,65 @@ def api_reports_generate(
             start, _ = week_bounds(today)
         elif type == "monthly":
             start = today.replace(day=1)
-        elif type == "yearly":
-            start = today.replace(month=1, day=1)
         else:
-            return render("tabs/reports.html", request=request, csrf_token=get_or_set_csrf(request),
-                          title="Reports", error="Unknown report type", reports=[])
+            start = today.replace(month=1, day=1)
 
-    # Get end bound for DB record
-    if type == "weekly":
-        ws, we = week_bounds(start)
-    elif type == "monthly":
-        ws, we = month_bounds(start)
-    else:
-        ws, we = year_bounds(start)
+    async with workspace_scope(request) as db:
+        job = await aio.reports.enqueue_report_job(db, type, start, max_attempts=settings.report_job_max_attempts)
+        job_id = int(job.id)
+    report_jobs.wake()
 
-    # Render PDF
-    out_path = render_report_pdf(templates_dir, reports_dir, type, start, settings.app_name)
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse({"job_id": job_id, "status": "queued",
+                             "status_url": f"/api/reports/jobs/{job_id}"}, status_code=202)
+    return RedirectResponse(url=f"/reports?ok=1&job={job_id}", status_code=303)
 
-    # Store DB row
-    with session_scope() as db:
-        cr.create_report_file(db, type, ws, we, str(out_path))
+@app.get("/reports/preview")
+async def report_preview(request: Request, type: str = "weekly", start_dmy: str = ""):
+    if not current_user_id(request):
+        return RedirectResponse(url="/login", status_code=302)
+    start = parse_dmy(start_dmy.strip()) if start_dmy.strip() else date.today()
+    if not start:
+        return HTMLResponse("Invalid start date (DD/MM/YYYY)", status_code=400)
+    if type not in ("weekly", "monthly", "yearly"):
+        return HTMLResponse("Unknown report type", status_code=400)
+    async with workspace_scope(request) as db:
+        ctx = await aio.run(db, build_report_context, type, start, settings.app_name, templates_dir)
+    return HTMLResponse(await run_in(render_executor, render_context_html, templates_dir, ctx))
+
+@app.get("/api/reports/cache")
+async def api_reports_cache(request: Request):
+    if not current_user_id(request):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+    return JSONResponse(report_contexts.stats())
 
-    return RedirectResponse(url="/reports?ok=1", status_code=303)
+@app.get("/api/reports/jobs/{job_id}")
+async def api_reports_job(request: Request, job_id: int):
+    if not current_user_id(request):
+        return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+    async with workspace_scope(request) as db:
+        job = await aio.reports.get_report_job(db, job_id)
+        if not job:
+            return JSONResponse({"detail": "Not found"}, status_code=404)
+        return JSONResponse({
+            "job_id": job.id,
+            "type": job.period_type,
+            "status": job.status,
+            "progress": job.progress,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "error": job.error,
+            "report_file_id": job.report_file_id,
+            "download_url": (f"/api/reports/download?id={job.report_file_id}" if job.report_file_id else None),
+        })
 
 @app.get("/api/reports/download")
-def api_reports_download(id: int):
-    from sqlalchemy import select as _select
+async def api_reports_download(request: Request, id: int):
     from .models import ReportFile
-    with session_scope() as db:
-        r = db.execute(_select(ReportFile).where(ReportFile.id == id)).scalars().first()
+    async with workspace_scope(request) as db:
+        r = await db.get(ReportFile, id)
         if not r:
             return HTMLResponse("Not found", status_code=404)
         return FileResponse(path=r.file_path, media_type="application/pdf",
-                            filename=Path(r.file_path).name)
+                            filename=report_filename(r.period_type, r.period_start, r.period_end))
 
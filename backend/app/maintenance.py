@@ -0,0 +1,77 @@
+"""
+Periodic housekeeping. `run_all` runs every task once (at startup and from
+`python -m app.manage maintenance`); MaintenanceThread repeats it in the web process.
+"""
+from __future__ import annotations
+import logging
+import threading
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .db import session_scope
+
+log = logging.getLogger(__name__)
+
+
+def analyze_sqlite(db: Session) -> None:
+    """
+    Planner statistics on SQLite, which (unlike PostgreSQL's autovacuum) collects
+    none by itself: without them it prefers the workspace index over primary-key
+    lookups, e.g. for search hits. analysis_limit samples each index, so this stays cheap.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    db.execute(text("PRAGMA analysis_limit = 1000"))
+    db.execute(text("ANALYZE"))
+
+
+def _tasks() -> list[tuple[str, Callable[[Session], object]]]:
+    from .partitions import ensure_action_partitions
+    from .crud.schedule import refresh_all_projections
+    from .crud.progress import refresh_all_project_progress
+    from .crud.changes import prune_changes
+    return [
+        ("action partitions", ensure_action_partitions),
+        # health moves with the date even when nothing is written
+        ("milestone projections", refresh_all_projections),
+        # after the projections: at-risk counts read them
+        ("project progress", refresh_all_project_progress),
+        ("change log", prune_changes),
+        ("planner statistics", analyze_sqlite),
+    ]
+
+
+def run_all() -> None:
+    """Each task in its own transaction; one failing task does not stop the others."""
+    for name, fn in _tasks():
+        try:
+            with session_scope() as db:
+                fn(db)
+        except Exception:
+            log.exception("maintenance task '%s' failed", name)
+
+
+class MaintenanceThread:
+    def __init__(self, interval_seconds: int):
+        self.interval = interval_seconds
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            run_all()
@@ -0,0 +1,295 @@
+"""
+Maintenance commands.
+
+    python -m app.manage rebuild-rollup [--start DD/MM/YYYY] [--end DD/MM/YYYY]
+    python -m app.manage report-worker [--workers N]
+    python -m app.manage migrate [--list]
+    python -m app.manage check-indexes
+    python -m app.manage import-actions FILE [--format csv|ndjson] [--batch-size N] [--workspace NAME]
+    python -m app.manage export-actions [-o FILE] [--format csv|ndjson] [--gzip] [--workspace NAME]
+                                        [--start DD/MM/YYYY] [--end DD/MM/YYYY] [--project ID] [--category ID]
+    python -m app.manage workspaces list|create|token [NAME]
+    python -m app.manage add-user EMAIL --workspace NAME [--password PASSWORD]
+    python -m app.manage maintenance
+    python -m app.manage reconcile-progress [--dry-run]
+    python -m app.manage partitions list|ensure|convert|verify
+    python -m app.manage partitions detach --before YEAR [--drop]
+"""
+from __future__ import annotations
+import argparse
+import sys
+
+from .db import engine, session_scope
+from .migrations import migrate
+from .utils.formatting import parse_dmy
+
+
+def _dmy_arg(s: str):
+    d = parse_dmy(s)
+    if not d:
+        raise argparse.ArgumentTypeError("use DD/MM/YYYY")
+    return d
+
+
+def _workspace_id(name: str | None) -> int | None:
+    """--workspace NAME (or id) → id; None when not given. Exits if there is no such workspace."""
+    if not name:
+        return None
+    from .crud.workspaces import get_workspace_by_name
+    from .models import Workspace
+    with session_scope() as db:
+        ws = get_workspace_by_name(db, name) or (db.get(Workspace, int(name)) if name.isdigit() else None)
+        if not ws:
+            sys.exit(f"no workspace '{name}' (see `workspaces list`)")
+        return int(ws.id)
+
+
+def cmd_rebuild_rollup(args) -> int:
+    from .crud import actions as ca
+    with session_scope() as db:
+        n = ca.rebuild_action_rollup(db, start=args.start, end=args.end)
+    print(f"action_daily: {n} row(s) rebuilt")
+    return 0
+
+
+def cmd_report_worker(args) -> int:
+    from pathlib import Path
+    from .jobs import ReportJobRunner
+    from .settings import settings
+    app_dir = Path(__file__).parent
+    runner = ReportJobRunner(app_dir / "templates", app_dir / "reports", settings.app_name,
+                             workers=args.workers or settings.report_workers or 1)
+    print(f"report-worker: {runner.workers} process(es), Ctrl+C to stop")
+    runner.run_forever()
+    return 0
+
+
+def cmd_migrate(args) -> int:
+    from .migrations import MIGRATIONS, applied_migrations
+    if args.list:
+        done = applied_migrations(engine)
+        for name in MIGRATIONS:
+            print(f"{'x' if name.split('_', 1)[0] in done else ' '} {name}")
+    return 0
+
+
+def cmd_check_indexes(args) -> int:
+    from .migrations.check import check_indexes
+    with session_scope() as db:
+        results = check_indexes(db)
+    for r in results:
+        status = "ok" if r["ok"] else "MISSING " + ", ".join(sorted(set(r["expected"]) - set(r["used"])))
+        print(f"{r['name']}: {status} (uses {', '.join(r['used']) or 'no index'})")
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+def cmd_import_actions(args) -> int:
+    from .imports import import_actions_file
+    from .utils.importing import detect_format
+    fmt = args.format or detect_format(args.file)
+    if not fmt:
+        print("cannot tell the format from the file name, pass --format csv|ndjson")
+        return 2
+
+    def progress(report):
+        print(f"  batch {report.batches}: {report.imported} imported, {report.failed} rejected", flush=True)
+
+    with open(args.file, "rb") as fp:
+        report = import_actions_file(fp, fmt, batch_size=args.batch_size or None, on_batch=progress,
+                                     workspace_id=_workspace_id(args.workspace))
+    for e in report.errors:
+        print(f"line {e['line']}: {e['error']}")
+    if report.failed > len(report.errors):
+        print(f"... and {report.failed - len(report.errors)} more rejected row(s)")
+    print(f"import-actions: {report.imported} imported, {report.failed} rejected")
+    return 0 if not report.failed else 1
+
+
+def cmd_export_actions(args) -> int:
+    from .exports import ExportFilters, write_actions_export
+    filters = ExportFilters(start=args.start, end=args.end, project_id=args.project, category_id=args.category,
+                            workspace_id=_workspace_id(args.workspace))
+    gzip = args.gzip or (args.output or "").endswith(".gz")
+    if args.output and args.output != "-":
+        with open(args.output, "wb") as fp:
+            n = write_actions_export(fp, args.format, filters, gzip)
+        print(f"export-actions: {n} bytes written to {args.output}", file=sys.stderr)
+    else:
+        write_actions_export(sys.stdout.buffer, args.format, filters, gzip)
+        sys.stdout.flush()
+    return 0
+
+
+def cmd_maintenance(args) -> int:
+    from .maintenance import run_all
+    run_all()
+    print("maintenance: done")
+    return 0
+
+
+def cmd_reconcile_progress(args) -> int:
+    from .crud.progress import reconcile_project_progress
+    with session_scope() as db:
+        mismatches = reconcile_project_progress(db, fix=not args.dry_run)
+    for m in mismatches:
+        fields = ", ".join(f"{c} {stored} -> {actual}" for c, (stored, actual) in m["fields"].items())
+        print(f"project {m['project_id']} ({m['name']}): {fields}")
+    verb = "found" if args.dry_run else "repaired"
+    print(f"reconcile-progress: {len(mismatches)} project(s) {verb}")
+    return 1 if mismatches else 0
+
+
+def cmd_workspaces(args) -> int:
+    from .crud import workspaces as cw
+    if args.action != "list" and not args.name:
+        print(f"workspaces {args.action}: NAME is required")
+        return 2
+    with session_scope() as db:
+        if args.action == "list":
+            for ws in cw.list_workspaces(db):
+                token = "token set" if ws.api_token_hash else "no token"
+                print(f"{ws.id}\t{ws.name}\t{token}")
+        elif args.action == "create":
+            try:
+                ws = cw.create_workspace(db, args.name)
+            except ValueError as e:
+                print(e)
+                return 1
+            print(f"workspace {ws.id} ({ws.name}) created")
+        elif args.action == "token":
+            ws_id = _workspace_id(args.name)
+            # shown once: only its hash is stored
+            print(cw.issue_api_token(db, ws_id))
+    return 0
+
+
+def cmd_add_user(args) -> int:
+    import getpass
+    from .crud.workspaces import add_user
+    from .security.auth import hash_password
+    ws_id = _workspace_id(args.workspace)
+    password = args.password or getpass.getpass(f"password for {args.email}: ")
+    with session_scope() as db:
+        try:
+            user = add_user(db, ws_id, args.email, hash_password(password))
+        except ValueError as e:
+            print(e)
+            return 1
+        print(f"user {user.id} ({user.email}) added to workspace {ws_id}")
+    return 0
+
+
+def cmd_partitions(args) -> int:
+    from datetime import date
+    from . import partitions as pt
+    with session_scope() as db:
+        if args.action != "convert" and not pt.actions_partitioned(db):
+            print("actions is not partitioned (PostgreSQL with PARTITION_ACTIONS=true, then `partitions convert`)")
+            return 1
+        if args.action == "list":
+            for name, bound in pt.list_action_partitions(db):
+                print(f"{name}\t{bound}")
+        elif args.action == "ensure":
+            created = pt.ensure_action_partitions(db)
+            print(f"created: {', '.join(created) or 'nothing'}")
+        elif args.action == "convert":
+            n = pt.convert_actions_to_partitioned(db, keep_legacy=args.keep_legacy)
+            print(f"actions: {n} row(s) copied into partitions")
+        elif args.action == "detach":
+            if not args.before:
+                print("--before YEAR is required")
+                return 2
+            out = pt.detach_action_partitions(db, args.before, drop=args.drop)
+            verb = "dropped" if args.drop else "detached"
+            print(f"{verb}: {', '.join(out) or 'nothing'}")
+        elif args.action == "verify":
+            today = date.today()
+            start = args.start or date(today.year, 1, 1)
+            end = args.end or today
+            failed = False
+            for name, res in pt.verify_pruning(db, start, end).items():
+                status = "ok" if res["ok"] else "NOT PRUNED"
+                failed |= not res["ok"]
+                print(f"{name}: {status} ({', '.join(res['scanned']) or 'no partitions'})")
+            return 1 if failed else 0
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rebuild-rollup", help="recompute the daily actions rollup")
+    p.add_argument("--start", type=_dmy_arg, default=None)
+    p.add_argument("--end", type=_dmy_arg, default=None)
+    p.set_defaults(func=cmd_rebuild_rollup)
+
+    p = sub.add_parser("report-worker", help="render queued report jobs in the foreground")
+    p.add_argument("--workers", type=int, default=0)
+    p.set_defaults(func=cmd_report_worker)
+
+    p = sub.add_parser("migrate", help="apply pending schema migrations")
+    p.add_argument("--list", action="store_true", help="also list migrations and whether they are applied")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("check-indexes", help="EXPLAIN the hot queries and report missing index use")
+    p.set_defaults(func=cmd_check_indexes)
+
+    p = sub.add_parser("import-actions", help="bulk-load time entries from CSV or NDJSON")
+    p.add_argument("file")
+    p.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    p.add_argument("--batch-size", type=int, default=0)
+    p.add_argument("--workspace", default=None, help="only projects of this workspace (default: any)")
+    p.set_defaults(func=cmd_import_actions)
+
+    p = sub.add_parser("export-actions", help="stream time entries as CSV or NDJSON")
+    p.add_argument("-o", "--output", default=None, help="file to write (default: stdout; .gz implies --gzip)")
+    p.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    p.add_argument("--gzip", action="store_true")
+    p.add_argument("--start", type=_dmy_arg, default=None)
+    p.add_argument("--end", type=_dmy_arg, default=None)
+    p.add_argument("--project", type=int, default=None)
+    p.add_argument("--category", type=int, default=None)
+    p.add_argument("--workspace", default=None, help="only this workspace (default: all)")
+    p.set_defaults(func=cmd_export_actions)
+
+    p = sub.add_parser("maintenance", help="run the periodic housekeeping tasks once")
+    p.set_defaults(func=cmd_maintenance)
+
+    p = sub.add_parser("reconcile-progress", help="check the stored project progress counters and repair them")
+    p.add_argument("--dry-run", action="store_true", help="only report mismatches")
+    p.set_defaults(func=cmd_reconcile_progress)
+
+    p = sub.add_parser("workspaces", help="list or create workspaces, issue a workspace's API token")
+    p.add_argument("action", choices=["list", "create", "token"])
+    p.add_argument("name", nargs="?", default=None)
+    p.set_defaults(func=cmd_workspaces)
+
+    p = sub.add_parser("add-user", help="add a user to a workspace")
+    p.add_argument("email")
+    p.add_argument("--workspace", required=True)
+    p.add_argument("--password", default=None, help="prompted for when omitted")
+    p.set_defaults(func=cmd_add_user)
+
+    p = sub.add_parser("partitions", help="manage yearly partitions of actions (PostgreSQL)")
+    p.add_argument("action", choices=["list", "ensure", "convert", "detach", "verify"])
+    p.add_argument("--before", type=int, default=None, help="detach: years before this one")
+    p.add_argument("--drop", action="store_true", help="detach: drop instead of keeping the table")
+    p.add_argument("--keep-legacy", action="store_true", help="convert: keep actions_legacy")
+    p.add_argument("--start", type=_dmy_arg, default=None, help="verify: range start")
+    p.add_argument("--end", type=_dmy_arg, default=None, help="verify: range end")
+    p.set_defaults(func=cmd_partitions)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    applied = migrate(engine)
+    if applied:
+        print(f"migrations applied: {', '.join(applied)}")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""
+Baseline: create every table the models declare (what `create_all` used to do at
+import). Existing databases already have them, so this only fills in gaps.
+"""
+from ..db import Base
+from .. import models  # noqa: F401  (register tables on Base.metadata)
+
+
+def upgrade(conn) -> None:
+    Base.metadata.create_all(bind=conn)
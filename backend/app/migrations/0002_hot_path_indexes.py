@@ -0,0 +1,31 @@
+"""
+Indexes for the hot query paths, built online. Databases created from the
+current models already have them (create_all), so every step is idempotent.
+
+  actions          day lists (date, id); FK lookups for project/milestone deletes
+  action_daily     range aggregations, covering on PostgreSQL; per-project dates
+  milestones       per-project lists by end date; open milestones by end date
+  dependencies     cascades from either milestone end
+"""
+from .ops import create_index, drop_index
+
+TRANSACTIONAL = False
+
+OPEN = "status <> 'done'"
+
+
+def upgrade(conn) -> None:
+    create_index(conn, "ix_actions_date_id", "actions", ["date", "id"])
+    create_index(conn, "ix_actions_project", "actions", ["project_id"])
+    create_index(conn, "ix_actions_milestone", "actions", ["milestone_id"])
+
+    create_index(conn, "ix_action_daily_date_project_ms", "action_daily",
+                 ["date", "project_id", "milestone_id"], include=["minutes", "entries"])
+    create_index(conn, "ix_action_daily_project_date", "action_daily", ["project_id", "date"])
+    drop_index(conn, "ix_action_daily_date_project")  # superseded by the covering index
+
+    create_index(conn, "ix_milestones_project_end_name", "milestones", ["project_id", "end_date", "name"])
+    create_index(conn, "ix_milestones_open_end_date", "milestones", ["end_date"], where=OPEN)
+
+    create_index(conn, "ix_dependencies_from_milestone", "dependencies", ["from_milestone_id"])
+    create_index(conn, "ix_dependencies_to_milestone", "dependencies", ["to_milestone_id"])
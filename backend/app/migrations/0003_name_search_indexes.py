@@ -0,0 +1,35 @@
+"""
+Indexes for the milestone / project name search (crud.milestones.search_milestones).
+
+PostgreSQL: pg_trgm GIN indexes on lower(name), serving substring and similarity
+matches. If the extension cannot be created (no privilege), the search falls back
+to prefix matching on the text_pattern_ops indexes. Other backends get plain
+lower(name) expression indexes for the prefix fallback.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from .ops import create_index
+
+TRANSACTIONAL = False
+
+log = logging.getLogger(__name__)
+
+
+def upgrade(conn) -> None:
+    if conn.dialect.name != "postgresql":
+        create_index(conn, "ix_milestones_name_lower", "milestones", ["lower(name)"])
+        create_index(conn, "ix_projects_name_lower", "projects", ["lower(name)"])
+        return
+
+    create_index(conn, "ix_milestones_name_lower", "milestones", ["lower(name) text_pattern_ops"])
+    create_index(conn, "ix_projects_name_lower", "projects", ["lower(name) text_pattern_ops"])
+    try:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        log.warning("pg_trgm unavailable, name search uses prefix matching: %s", e.orig)
+        return
+    create_index(conn, "ix_milestones_name_trgm", "milestones", ["lower(name) gin_trgm_ops"], using="gin")
+    create_index(conn, "ix_projects_name_trgm", "projects", ["lower(name) gin_trgm_ops"], using="gin")
@@ -0,0 +1,9 @@
+"""
+projects.graph_version: change counter behind the ETag of /api/projects/{pid}/graph.
+A constant default keeps the ADD COLUMN a catalog-only change on PostgreSQL 11+.
+"""
+from .ops import add_column_if_missing
+
+
+def upgrade(conn) -> None:
+    add_column_if_missing(conn, "projects", "graph_version", "INTEGER NOT NULL DEFAULT 0")
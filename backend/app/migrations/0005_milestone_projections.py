@@ -0,0 +1,11 @@
+"""
+milestones.projected_end / effective_risk: slip propagation results
+(crud.schedule). Left NULL here; the milestone projections maintenance task,
+run at startup, fills them in.
+"""
+from .ops import add_column_if_missing
+
+
+def upgrade(conn) -> None:
+    add_column_if_missing(conn, "milestones", "projected_end", "DATE")
+    add_column_if_missing(conn, "milestones", "effective_risk", "VARCHAR(10)")
@@ -0,0 +1,24 @@
+"""
+projects.ms_*: denormalized milestone counters (crud.progress). Totals, done
+and the percent sum are backfilled here; overdue / risk depend on the date and
+stay unset (progress_date NULL) until the project progress maintenance task,
+run at startup, fills them in.
+"""
+from sqlalchemy import text
+
+from .ops import add_column_if_missing
+
+COUNTERS = ("ms_total", "ms_done", "ms_percent_sum", "ms_overdue", "ms_risk")
+
+
+def upgrade(conn) -> None:
+    for column in COUNTERS:
+        add_column_if_missing(conn, "projects", column, "INTEGER NOT NULL DEFAULT 0")
+    add_column_if_missing(conn, "projects", "progress_date", "DATE")
+    conn.execute(text(
+        "UPDATE projects SET "
+        "ms_total = (SELECT COUNT(*) FROM milestones m WHERE m.project_id = projects.id), "
+        "ms_done = (SELECT COUNT(*) FROM milestones m WHERE m.project_id = projects.id AND m.status = 'done'), "
+        "ms_percent_sum = (SELECT COALESCE(SUM(m.percent_complete), 0) FROM milestones m "
+        "WHERE m.project_id = projects.id)"
+    ))
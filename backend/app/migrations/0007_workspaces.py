@@ -0,0 +1,55 @@
+"""
+Workspaces (app/tenancy.py). The existing data and users move into one
+workspace, "Default"; workspace-wide indexes are rebuilt led by workspace_id:
+
+  categories    unique (workspace_id, name), replacing unique (name)
+  projects      (workspace_id, name), replacing (name)
+  milestones    open ones by (workspace_id, end_date)
+  actions       (workspace_id, date, id), replacing (date, id)
+  action_daily  (workspace_id, date, project_id, milestone_id), covering
+  report files  and jobs by (workspace_id, id)
+
+Re-runnable: columns and indexes are only added when missing.
+"""
+from sqlalchemy import text
+
+from ..db import Base
+from .. import models  # noqa: F401  (register tables on Base.metadata)
+from .ops import add_column_if_missing, create_index, drop_index
+
+TRANSACTIONAL = False
+
+TABLES = ("users", "categories", "projects", "milestones", "dependencies", "actions", "action_daily",
+          "report_files", "report_jobs")
+OPEN = "status <> 'done'"
+
+
+def upgrade(conn) -> None:
+    Base.metadata.tables["workspaces"].create(bind=conn, checkfirst=True)
+    ws = conn.execute(text("SELECT MIN(id) FROM workspaces")).scalar()
+    if ws is None:
+        conn.execute(text("INSERT INTO workspaces (name, created_at) VALUES ('Default', CURRENT_TIMESTAMP)"))
+        ws = conn.execute(text("SELECT MIN(id) FROM workspaces")).scalar()
+
+    pg = conn.dialect.name == "postgresql"
+    for table in TABLES:
+        # the default only fills in the existing rows; new ones always name their workspace
+        ddl = f"INTEGER NOT NULL DEFAULT {int(ws)}"
+        if pg:
+            ddl += " REFERENCES workspaces(id) ON DELETE CASCADE"
+        if add_column_if_missing(conn, table, "workspace_id", ddl) and pg:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN workspace_id DROP DEFAULT"))
+
+    create_index(conn, "ix_categories_workspace_name", "categories", ["workspace_id", "name"], unique=True)
+    drop_index(conn, "ix_categories_name")
+    create_index(conn, "ix_projects_workspace_name", "projects", ["workspace_id", "name"])
+    drop_index(conn, "ix_projects_name")
+    create_index(conn, "ix_milestones_open_ws_end_date", "milestones", ["workspace_id", "end_date"], where=OPEN)
+    drop_index(conn, "ix_milestones_open_end_date")
+    create_index(conn, "ix_actions_ws_date_id", "actions", ["workspace_id", "date", "id"])
+    drop_index(conn, "ix_actions_date_id")
+    create_index(conn, "ix_action_daily_ws_date_project_ms", "action_daily",
+                 ["workspace_id", "date", "project_id", "milestone_id"], include=["minutes", "entries"])
+    drop_index(conn, "ix_action_daily_date_project_ms")
+    create_index(conn, "ix_report_files_workspace_id", "report_files", ["workspace_id", "id"])
+    create_index(conn, "ix_report_jobs_workspace_id", "report_jobs", ["workspace_id", "id"])
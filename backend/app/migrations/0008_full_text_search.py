@@ -0,0 +1,66 @@
+"""
+Full-text search over action comments and milestone notes (crud/search.py).
+
+PostgreSQL: a stored generated `search_tsv` column on actions and milestones, which
+the database keeps current on every insert and update, and a GIN index on it
+(built concurrently). Adding the column rewrites each table once. New databases
+get both from the models.
+
+SQLite: external-content FTS5 tables over the same columns (`actions_fts`,
+`milestones_fts`), kept in sync by triggers and filled here. Without FTS5 in the
+SQLite build this logs a warning and search reports itself unavailable.
+
+Re-runnable: columns, tables, triggers and indexes are only added when missing.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from ..models import search_tsv_expr
+from .ops import add_column_if_missing, create_index
+
+TRANSACTIONAL = False
+
+log = logging.getLogger(__name__)
+
+# table -> searched column
+SEARCHED = {"actions": "comment", "milestones": "note"}
+
+
+def _sqlite_fts(conn, table: str, col: str) -> None:
+    fts = f"{table}_fts"
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({col}, content='{table}', content_rowid='id')"
+    ))
+    # external content: the index is told about every change, deletes with the old value
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {col}) VALUES (new.id, new.{col}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col}) VALUES ('delete', old.id, old.{col}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col}) VALUES ('delete', old.id, old.{col}); "
+        f"INSERT INTO {fts}(rowid, {col}) VALUES (new.id, new.{col}); END"
+    ))
+    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def upgrade(conn) -> None:
+    if conn.dialect.name == "postgresql":
+        for table, col in SEARCHED.items():
+            add_column_if_missing(conn, table, "search_tsv",
+                                  f"tsvector GENERATED ALWAYS AS ({search_tsv_expr(col)}) STORED")
+            create_index(conn, f"ix_{table}_search", table, ["search_tsv"], using="gin")
+        return
+    if conn.dialect.name != "sqlite":
+        return
+    try:
+        for table, col in SEARCHED.items():
+            _sqlite_fts(conn, table, col)
+    except OperationalError as e:
+        log.warning("SQLite without FTS5, full-text search is unavailable: %s", e.orig)
@@ -0,0 +1,15 @@
+"""
+Change log for incremental sync (crud/changes.py): the `changes` table, and
+workspaces.changes_pruned_id, up to which maintenance has pruned it. Writes made
+before this have no entries: clients start with a full load and the head cursor.
+
+Re-runnable: the table and column are only added when missing.
+"""
+from ..db import Base
+from .. import models  # noqa: F401  (register tables on Base.metadata)
+from .ops import add_column_if_missing
+
+
+def upgrade(conn) -> None:
+    add_column_if_missing(conn, "workspaces", "changes_pruned_id", "INTEGER")
+    Base.metadata.tables["changes"].create(bind=conn, checkfirst=True)
@@ -0,0 +1,95 @@
+"""
+Versioned schema migrations.
+
+Each migration is a module in this package named `NNNN_description.py` with an
+`upgrade(conn)` function, listed in MIGRATIONS in order. Applied versions are
+recorded in `schema_migrations`. A migration runs in one transaction unless it
+sets `TRANSACTIONAL = False`; those get an autocommit connection (needed for
+CREATE INDEX CONCURRENTLY) and must be safe to re-run after a partial failure.
+
+Runs at web startup and from `python -m app.manage migrate`. On PostgreSQL an
+advisory lock keeps concurrently starting processes from racing each other.
+"""
+from __future__ import annotations
+import importlib
+import logging
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select, text
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS = [
+    "0001_baseline",
+    "0002_hot_path_indexes",
+    "0003_name_search_indexes",
+    "0004_project_graph_version",
+    "0005_milestone_projections",
+    "0006_project_progress",
+    "0007_workspaces",
+    "0008_full_text_search",
+    "0009_change_log",
+]
+
+_LOCK_KEY = 0x46504D47  # "FPMG"
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", String(20), primary_key=True),
+    Column("name", String(200)),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+def _load(name: str):
+    return importlib.import_module(f"{__name__}.{name}")
+
+
+def applied_migrations(engine: Engine) -> set[str]:
+    with engine.connect() as conn:
+        _meta.create_all(bind=conn)
+        conn.commit()
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine: Engine) -> list[str]:
+    done = applied_migrations(engine)
+    return [name for name in MIGRATIONS if name.split("_", 1)[0] not in done]
+
+
+def _record(conn, name: str) -> None:
+    conn.execute(schema_migrations.insert().values(
+        version=name.split("_", 1)[0], name=name, applied_at=datetime.utcnow()
+    ))
+
+
+def migrate(engine: Engine | None = None) -> list[str]:
+    """Apply pending migrations in order; returns the names applied."""
+    if engine is None:
+        from ..db import engine
+    lock = None
+    if engine.dialect.name == "postgresql":
+        # autocommit so holding the lock never holds a snapshot (CONCURRENTLY waits on those)
+        lock = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        lock.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _LOCK_KEY})
+    try:
+        applied = []
+        for name in pending_migrations(engine):
+            mod = _load(name)
+            log.info("applying migration %s", name)
+            if getattr(mod, "TRANSACTIONAL", True):
+                with engine.begin() as conn:
+                    mod.upgrade(conn)
+                    _record(conn, name)
+            else:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    mod.upgrade(conn)
+                    _record(conn, name)
+            applied.append(name)
+        return applied
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_KEY})
+            lock.close()
@@ -0,0 +1,140 @@
+"""
+EXPLAIN-based check that the hot queries use their indexes.
+
+Each check runs a real crud function with SQL capture switched on, EXPLAINs every
+SELECT it issued and collects the index names in the plans. On PostgreSQL the
+plans are taken with `enable_seqscan = off`: small tables make a sequential scan
+the cheapest choice, and the question here is whether an index is *usable*.
+Everything runs in a transaction that is rolled back, scoped to the workspace of
+the first project (app/tenancy.py): every hot query filters by workspace.
+
+    python -m app.manage check-indexes
+"""
+from __future__ import annotations
+import json
+import re
+from datetime import date, timedelta
+from typing import Callable
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from ..models import Project
+from ..tenancy import WORKSPACE_KEY
+from ..utils.pagination import encode_cursor
+
+
+def _checks(pid: int, today: date, trigram: bool,
+            tsvector: bool) -> list[tuple[str, Callable[[Session], object], set[str]]]:
+    from ..crud import actions as ca, reports as cr, milestones as cm, dependencies as cd, projects as cp
+    from ..crud import search as cs, changes as cc
+    week = today - timedelta(days=today.weekday())
+    search_ix = "ix_milestones_name_trgm" if trigram else "ix_milestones_name_lower"
+    checks = [
+        ("actions of a day", lambda db: ca.list_actions_by_date(db, today),
+         {"ix_actions_ws_date_id"}),
+        ("actions window", lambda db: ca.page_actions(db, week, week + timedelta(days=6), None, None, 50),
+         {"ix_actions_ws_date_id"}),
+        ("minutes per day", lambda db: ca.totals_by_day_range(db, week, week + timedelta(days=6)),
+         {"ix_action_daily_ws_date_project_ms"}),
+        ("period aggregation", lambda db: cr.aggregate_period(db, week, week + timedelta(days=6), 7),
+         {"ix_action_daily_ws_date_project_ms", "ix_milestones_open_ws_end_date"}),
+        ("overdue milestones", lambda db: cr.overdue_milestones(db, today),
+         {"ix_milestones_open_ws_end_date"}),
+        ("projects list", lambda db: cp.page_projects(db, None, None, None, 50),
+         {"ix_projects_workspace_name"}),
+        ("project milestones", lambda db: cm.list_project_milestones_health(db, pid, today),
+         {"ix_milestones_project_end_name"}),
+        ("dependency graph", lambda db: cd.graph_for_project(db, pid, today),
+         {"ix_milestones_project_end_name", "uq_dep_unique"}),
+        ("milestone search", lambda db: cm.search_milestones(db, "plan"),
+         {search_ix}),
+        ("change feed", lambda db: cc.read_changes(db, encode_cursor((0, 0)), 100),
+         {"ix_changes_workspace_txid_id"}),
+    ]
+    if tsvector:
+        # SQLite's FTS5 tables are virtual: their plans name no index
+        checks.append(("full-text search", lambda db: cs.search_text(db, "plan"),
+                       {"ix_actions_search", "ix_milestones_search"}))
+    return checks
+
+
+def _capture(db: Session, fn: Callable[[Session], object]) -> list[tuple[str, object]]:
+    conn = db.connection()
+    seen: list[tuple[str, object]] = []
+
+    def grab(_conn, _cursor, statement, parameters, _context, _many):
+        if statement.lstrip().upper().startswith("SELECT"):
+            seen.append((statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", grab)
+    try:
+        fn(db)
+    finally:
+        event.remove(conn, "before_cursor_execute", grab)
+    return seen
+
+
+def _pg_plan_indexes(plan: dict) -> set[str]:
+    found = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        found |= _pg_plan_indexes(child)
+    return found
+
+
+def _pg_root_index(db: Session, name: str) -> str:
+    """Partition-level index → the index on the partitioned parent it is attached to."""
+    while True:
+        parent = db.execute(text(
+            "SELECT p.relname FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE i.inhrelid = to_regclass(:n)"
+        ), {"n": name}).scalar()
+        if not parent:
+            return name
+        name = parent
+
+
+def _sqlite_index_name(db: Session, name: str) -> str:
+    """`sqlite_autoindex_<table>_<n>` → name of the n-th unique constraint of <table>."""
+    m = re.fullmatch(r"sqlite_autoindex_(\w+)_(\d+)", name)
+    if not m:
+        return name
+    uniques = inspect(db.connection()).get_unique_constraints(m.group(1))
+    n = int(m.group(2)) - 1
+    return (uniques[n]["name"] if n < len(uniques) else None) or name
+
+
+def _explain(db: Session, statement: str, parameters) -> set[str]:
+    conn = db.connection()
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return {_pg_root_index(db, n) for n in _pg_plan_indexes(plan[0]["Plan"])}
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return {_sqlite_index_name(db, m.group(1))
+            for r in rows for m in [re.search(r"INDEX (\w+)", str(r[-1]))] if m}
+
+
+def check_indexes(db: Session, today: date | None = None) -> list[dict]:
+    """[{name, expected, used, ok}] per check; `ok` when every expected index shows up."""
+    today = today or date.today()
+    pid, ws = db.execute(select(Project.id, Project.workspace_id).order_by(Project.id).limit(1)).first() or (0, 0)
+    db.info[WORKSPACE_KEY] = db.info.get(WORKSPACE_KEY) or ws
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+    from ..crud.milestones import trigram_search_available
+    from ..crud.search import fulltext_available
+    trigram = trigram_search_available(db)
+    tsvector = fulltext_available(db) and db.get_bind().dialect.name == "postgresql"
+    out = []
+    try:
+        for name, fn, expected in _checks(pid, today, trigram, tsvector):
+            used: set[str] = set()
+            for statement, parameters in _capture(db, fn):
+                used |= _explain(db, statement, parameters)
+            out.append({"name": name, "expected": sorted(expected), "used": sorted(used),
+                        "ok": expected <= used})
+    finally:
+        db.rollback()
+    return out
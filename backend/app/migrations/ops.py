@@ -0,0 +1,115 @@
+"""
+Schema operations for migrations. Index helpers build online on PostgreSQL
+(CONCURRENTLY, so writes keep flowing) and need an autocommit connection there;
+on other backends they fall back to plain idempotent DDL.
+"""
+from __future__ import annotations
+from typing import Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+PG_MAX_IDENT = 63
+
+
+def _is_pg(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def table_exists(conn: Connection, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def column_exists(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def add_column_if_missing(conn: Connection, table: str, column: str, ddl: str) -> bool:
+    """ALTER TABLE ADD COLUMN unless present; `ddl` is the type and options, e.g. "INTEGER NOT NULL DEFAULT 0"."""
+    if column_exists(conn, table, column):
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+def _pg_index_state(conn: Connection, name: str) -> bool | None:
+    """None if missing, else whether the index is valid (a failed CONCURRENTLY build leaves it invalid)."""
+    return conn.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :n AND c.relnamespace = current_schema()::regnamespace"
+    ), {"n": name}).scalar()
+
+
+def _pg_partitions(conn: Connection, table: str) -> list[str] | None:
+    """Partition names when `table` is partitioned, else None."""
+    kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}).scalar()
+    if kind != "p":
+        return None
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t) ORDER BY c.relname"
+    ), {"t": table}).scalars())
+
+
+def create_index(
+    conn: Connection,
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    *,
+    include: Sequence[str] = (),
+    where: str | None = None,
+    unique: bool = False,
+    using: str | None = None,
+) -> bool:
+    """
+    Create an index if it does not exist yet; returns True when something was built.
+
+    PostgreSQL: CREATE INDEX CONCURRENTLY. Invalid leftovers of an interrupted build
+    are dropped and rebuilt. A partitioned table cannot be indexed concurrently, so
+    the index is created ON ONLY the parent, built concurrently on each partition and
+    attached; the parent index turns valid once every partition is attached.
+    Elsewhere `include` and `using` (index method, e.g. gin) are ignored.
+    `columns` may be expressions, e.g. "lower(name) gin_trgm_ops".
+    """
+    cols = ", ".join(columns)
+    uniq = "UNIQUE " if unique else ""
+    pred = f" WHERE {where}" if where else ""
+    if not _is_pg(conn):
+        conn.execute(text(f"CREATE {uniq}INDEX IF NOT EXISTS {name} ON {table} ({cols}){pred}"))
+        return True
+
+    incl = f" INCLUDE ({', '.join(include)})" if include else ""
+    meth = f" USING {using}" if using else ""
+    state = _pg_index_state(conn, name)
+    if state:
+        return False
+
+    partitions = _pg_partitions(conn, table)
+    if partitions is None:
+        if state is False:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE {uniq}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}{meth} ({cols}){incl}{pred}"))
+        return True
+
+    conn.execute(text(f"CREATE {uniq}INDEX IF NOT EXISTS {name} ON ONLY {table}{meth} ({cols}){incl}{pred}"))
+    for part in partitions:
+        part_idx = f"{name}_{part[len(table) + 1:]}"[:PG_MAX_IDENT]
+        if _pg_index_state(conn, part_idx) is False:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {part_idx}"))
+        conn.execute(text(f"CREATE {uniq}INDEX CONCURRENTLY IF NOT EXISTS {part_idx} ON {part}{meth} ({cols}){incl}{pred}"))
+        attached = conn.execute(text(
+            "SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:c) AND inhparent = to_regclass(:p)"
+        ), {"c": part_idx, "p": name}).first()
+        if not attached:
+            conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {part_idx}"))
+    return True
+
+
+def drop_index(conn: Connection, name: str) -> None:
+    if _is_pg(conn) and conn.execute(text(
+        "SELECT 1 FROM pg_class WHERE oid = to_regclass(:n) AND relkind = 'i'"
+    ), {"n": name}).first():
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    else:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -1,8 +1,13 @@
 from datetime import date, datetime
 from enum import Enum
-from sqlalchemy import String, Text, Integer, Date, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import (
+    String, Text, Integer, BigInteger, Date, DateTime, ForeignKey, UniqueConstraint, Index, Computed, text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
+from .settings import settings
+from .tenancy import WorkspaceScoped
 
 # --- Enums ---
 
@@ -12,45 +17,98 @@ class StatusEnum(str, Enum):
     archived = "archived"
     done = "done"
 
-# --- User ---
+# --- Workspaces & users ---
+
+class Workspace(Base):
+    """A tenant: its users see and write only its rows (see app/tenancy.py)."""
+    __tablename__ = "workspaces"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(200), unique=True)
+    # sha256 of the workspace's /api/v1 bearer token (manage.py workspaces token)
+    api_token_hash: Mapped[str | None] = mapped_column(String(64), unique=True, nullable=True)
+    # last of its changes pruned from the change log: older sync cursors are refused
+    changes_pruned_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(primary_key=True)
+    workspace_id: Mapped[int] = mapped_column(ForeignKey("workspaces.id", ondelete="CASCADE"))
     email: Mapped[str] = mapped_column(String(255), unique=True, index=True)
     password_hash: Mapped[str] = mapped_column(String(255))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 # --- Categories / Projects ---
 
-class Category(Base):
+class Category(WorkspaceScoped, Base):
     __tablename__ = "categories"
     id: Mapped[int] = mapped_column(primary_key=True)
-    name: Mapped[str] = mapped_column(String(200), unique=True, index=True)
+    name: Mapped[str] = mapped_column(String(200))
     description: Mapped[str | None] = mapped_column(Text(), nullable=True)
 
     projects: Mapped[list["Project"]] = relationship(back_populates="category", cascade="all, delete-orphan")
 
-class Project(Base):
+    __table_args__ = (Index("ix_categories_workspace_name", "workspace_id", "name", unique=True),)
+
+class Project(WorkspaceScoped, Base):
     __tablename__ = "projects"
     id: Mapped[int] = mapped_column(primary_key=True)
     category_id: Mapped[int | None] = mapped_column(ForeignKey("categories.id", ondelete="SET NULL"))
-    name: Mapped[str] = mapped_column(String(200), index=True)
+    name: Mapped[str] = mapped_column(String(200))
     objective: Mapped[str | None] = mapped_column(Text(), nullable=True)
     description: Mapped[str | None] = mapped_column(Text(), nullable=True)
     color: Mapped[str | None] = mapped_column(String(16), nullable=True)
     end_date: Mapped[date] = mapped_column(Date)
     status: Mapped[StatusEnum] = mapped_column(String(20), default=StatusEnum.active)
+    # bumped whenever its milestones or dependencies change; the graph endpoint's ETag
+    graph_version: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"))
+    # milestone counters kept by crud.progress on every milestone write; overdue / risk
+    # depend on the date too and hold as of progress_date (refreshed daily by maintenance)
+    ms_total: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"))
+    ms_done: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"))
+    ms_percent_sum: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"))
+    ms_overdue: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"))
+    ms_risk: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"))
+    progress_date: Mapped[date | None] = mapped_column(Date, nullable=True)
 
     category: Mapped["Category"] = relationship(back_populates="projects")
     milestones: Mapped[list["Milestone"]] = relationship(back_populates="project", cascade="all, delete-orphan")
     actions: Mapped[list["Action"]] = relationship(back_populates="project", cascade="all, delete-orphan")
 
-    __table_args__ = (UniqueConstraint("category_id", "name", name="uq_category_project_name"),)
+    __table_args__ = (
+        UniqueConstraint("category_id", "name", name="uq_category_project_name"),
+        Index("ix_projects_workspace_name", "workspace_id", "name"),
+    )
+
+    @property
+    def avg_percent(self) -> float:
+        return self.ms_percent_sum / self.ms_total if self.ms_total else 0.0
+
+# Indexes below follow the hot queries (see app/migrations/check.py); existing
+# databases get them from app/migrations/0002_hot_path_indexes.py and, led by the
+# workspace for workspace-wide queries, 0007_workspaces.py. Per-project indexes
+# stay led by project_id: a project's rows all belong to one workspace.
+
+# Full-text search over action comments and milestone notes (crud/search.py). On
+# PostgreSQL a stored generated tsvector, GIN-indexed, which the database keeps current
+# on every insert and update; SQLite gets FTS5 tables instead (migration 0008).
+FULLTEXT_TSVECTOR = settings.database_url.startswith("postgresql")
+# no stemming or stop words: comments mix languages, names and jargon
+SEARCH_CONFIG = "simple"
+
+def search_tsv_expr(column: str) -> str:
+    return f"to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce({column}, ''))"
+
+def _search_tsv(column: str):
+    # deferred: only the search queries read it
+    return mapped_column(TSVECTOR, Computed(search_tsv_expr(column), persisted=True), deferred=True)
+
+def _search_index(table: str) -> list[Index]:
+    return [Index(f"ix_{table}_search", "search_tsv", postgresql_using="gin")] if FULLTEXT_TSVECTOR else []
 
 # --- Milestones & Dependencies ---
 
-class Milestone(Base):
+class Milestone(WorkspaceScoped, Base):
     __tablename__ = "milestones"
     id: Mapped[int] = mapped_column(primary_key=True)
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"))
@@ -59,6 +117,11 @@ class Milestone(Base):
     end_date: Mapped[date] = mapped_column(Date)
     percent_complete: Mapped[int] = mapped_column(Integer, default=0)  # 0..100
     status: Mapped[StatusEnum] = mapped_column(String(20), default=StatusEnum.active)
+    # derived from the dependencies (crud/schedule.py): end date after upstream slips, ok/risk/late
+    projected_end: Mapped[date | None] = mapped_column(Date, nullable=True)
+    effective_risk: Mapped[str | None] = mapped_column(String(10), nullable=True)
+    if FULLTEXT_TSVECTOR:
+        search_tsv: Mapped[str | None] = _search_tsv("note")
 
     project: Mapped["Project"] = relationship(back_populates="milestones")
     outgoing: Mapped[list["Dependency"]] = relationship(
@@ -72,7 +135,16 @@ class Milestone(Base):
         cascade="all, delete-orphan"
     )
 
-class Dependency(Base):
+    __table_args__ = (
+        # per-project lists, ordered by end date then name
+        Index("ix_milestones_project_end_name", "project_id", "end_date", "name"),
+        # overdue/upcoming lookups only ever look at open milestones
+        Index("ix_milestones_open_ws_end_date", "workspace_id", "end_date",
+              postgresql_where=text("status <> 'done'"), sqlite_where=text("status <> 'done'")),
+        *_search_index("milestones"),
+    )
+
+class Dependency(WorkspaceScoped, Base):
     __tablename__ = "dependencies"
     id: Mapped[int] = mapped_column(primary_key=True)
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"))
@@ -82,26 +154,66 @@ class Dependency(Base):
     from_ms: Mapped["Milestone"] = relationship(foreign_keys=[from_milestone_id], back_populates="outgoing")
     to_ms: Mapped["Milestone"] = relationship(foreign_keys=[to_milestone_id], back_populates="incoming")
 
-    __table_args__ = (UniqueConstraint("project_id", "from_milestone_id", "to_milestone_id",
-                                       name="uq_dep_unique"),)
+    __table_args__ = (
+        UniqueConstraint("project_id", "from_milestone_id", "to_milestone_id", name="uq_dep_unique"),
+        # milestone deletes cascade through both ends
+        Index("ix_dependencies_from_milestone", "from_milestone_id"),
+        Index("ix_dependencies_to_milestone", "to_milestone_id"),
+    )
 
 # --- Actions (time logs) ---
 
-class Action(Base):
+# On PostgreSQL `actions` is range-partitioned by year on `date` (see app/partitions.py);
+# the partition key has to be part of the primary key there.
+ACTIONS_PARTITIONED = settings.partition_actions and settings.database_url.startswith("postgresql")
+
+class Action(WorkspaceScoped, Base):
     __tablename__ = "actions"
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"))
     milestone_id: Mapped[int | None] = mapped_column(ForeignKey("milestones.id", ondelete="SET NULL"))
-    date: Mapped[date] = mapped_column(Date)
+    date: Mapped[date] = mapped_column(Date, primary_key=ACTIONS_PARTITIONED)
     minutes: Mapped[int] = mapped_column(Integer)   # store minutes internally
     comment: Mapped[str | None] = mapped_column(Text(), nullable=True)
+    if FULLTEXT_TSVECTOR:
+        search_tsv: Mapped[str | None] = _search_tsv("comment")
 
     project: Mapped["Project"] = relationship(back_populates="actions")
     milestone: Mapped["Milestone"] = relationship()
 
+    __table_args__ = (
+        Index("ix_actions_ws_date_id", "workspace_id", "date", "id"),  # day lists, newest first
+        Index("ix_actions_project", "project_id"),
+        Index("ix_actions_milestone", "milestone_id"),
+        *_search_index("actions"),
+        {"postgresql_partition_by": "RANGE (date)"} if ACTIONS_PARTITIONED else {},
+    )
+
+class ActionDaily(WorkspaceScoped, Base):
+    """
+    Per-(date, project, milestone) rollup of `actions`, maintained by crud.actions
+    in the same transaction as the action write. All range aggregations read from here.
+    No unique key on purpose: milestone_id is nullable, and every reader SUMs, so a
+    split row (e.g. two concurrent first inserts) is harmless; a rebuild compacts it.
+    """
+    __tablename__ = "action_daily"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    date: Mapped[date] = mapped_column(Date)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"))
+    milestone_id: Mapped[int | None] = mapped_column(ForeignKey("milestones.id", ondelete="SET NULL"))
+    minutes: Mapped[int] = mapped_column(Integer, default=0)
+    entries: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        # range aggregations read only this index on PostgreSQL (minutes/entries are included)
+        Index("ix_action_daily_ws_date_project_ms", "workspace_id", "date", "project_id", "milestone_id",
+              postgresql_include=["minutes", "entries"]),
+        Index("ix_action_daily_project_date", "project_id", "date"),
+    )
+
 # --- Reports registry ---
 
-class ReportFile(Base):
+class ReportFile(WorkspaceScoped, Base):
     __tablename__ = "report_files"
     id: Mapped[int] = mapped_column(primary_key=True)
     period_type: Mapped[str] = mapped_column(String(20))  # weekly/monthly/yearly
@@ -110,3 +222,61 @@ class ReportFile(Base):
     file_path: Mapped[str] = mapped_column(Text())
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (Index("ix_report_files_workspace_id", "workspace_id", "id"),)
+
+
+class ReportJob(WorkspaceScoped, Base):
+    """Queued PDF generation; worked off by app.jobs.ReportJobRunner."""
+    __tablename__ = "report_jobs"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    period_type: Mapped[str] = mapped_column(String(20))  # weekly/monthly/yearly
+    period_start: Mapped[date] = mapped_column(Date)
+    status: Mapped[str] = mapped_column(String(20), default="queued")  # queued/running/done/failed
+    progress: Mapped[int] = mapped_column(Integer, default=0)  # 0..100
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    error: Mapped[str | None] = mapped_column(Text(), nullable=True)
+    report_file_id: Mapped[int | None] = mapped_column(ForeignKey("report_files.id", ondelete="SET NULL"), nullable=True)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    report_file: Mapped["ReportFile"] = relationship()
+
+    __table_args__ = (
+        # the queue is shared by all workspaces
+        Index("ix_report_jobs_status_run_after", "status", "run_after"),
+        Index("ix_report_jobs_workspace_id", "workspace_id", "id"),
+    )
+
+class CacheVersion(Base):
+    """
+    Version stamps for cached report contexts. Writes bump the keys of the
+    periods they touch (crud.reports.invalidate_report_*) right after they
+    commit; every process validates its cached entries against them.
+    """
+    __tablename__ = "cache_versions"
+    key: Mapped[str] = mapped_column(String(80), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+# --- Change log (incremental sync, crud/changes.py) ---
+
+# PostgreSQL: the id of the writing transaction. Change ids are handed out before
+# commit, so a smaller id can still become visible after a larger one; the feed
+# orders by (txid, id) and only reads transactions older than every running one.
+# SQLite has one writer at a time: ids are in commit order, txid stays 0.
+CHANGE_TXID = (text("(pg_current_xact_id()::text::bigint)") if settings.database_url.startswith("postgresql")
+               else text("0"))
+
+class Change(WorkspaceScoped, Base):
+    """One written row: entity (category/project/milestone/dependency/action), its id, upsert or delete."""
+    __tablename__ = "changes"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    entity: Mapped[str] = mapped_column(String(20))
+    entity_id: Mapped[int] = mapped_column(Integer)
+    op: Mapped[str] = mapped_column(String(10))  # upsert/delete
+    txid: Mapped[int] = mapped_column(BigInteger, server_default=CHANGE_TXID)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_changes_workspace_txid_id", "workspace_id", "txid", "id"),)
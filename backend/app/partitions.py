@@ -0,0 +1,188 @@
+"""
+Yearly range partitioning of `actions` (PostgreSQL only).
+
+`actions` is declared `PARTITION BY RANGE (date)` with one partition per year
+(`actions_y2026`, ...) plus `actions_default` as a safety net for far back-/forward-
+dated entries. Partitions for the current and next year are created at startup
+and by the maintenance loop, so year rollover needs no manual step.
+
+Reports read the `action_daily` rollup; the queries that still hit `actions` by date
+(day lists, rollup rebuilds) are checked for partition pruning by `verify_pruning`.
+
+    python -m app.manage partitions ensure|convert|detach|verify
+"""
+from __future__ import annotations
+import json
+import logging
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .models import Action, ACTIONS_PARTITIONED
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PARTITION = "actions_default"
+
+
+def partition_name(year: int) -> str:
+    return f"actions_y{year}"
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _exists(db: Session, relname: str) -> bool:
+    return db.execute(text("SELECT to_regclass(:n) IS NOT NULL"), {"n": relname}).scalar()
+
+
+def actions_partitioned(db: Session) -> bool:
+    if not _is_postgres(db):
+        return False
+    kind = db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('actions')")).scalar()
+    return kind == "p"
+
+
+def list_action_partitions(db: Session) -> list[tuple[str, str]]:
+    """[(partition, bound expression)] in name order."""
+    rows = db.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'actions'::regclass ORDER BY c.relname"
+    )).all()
+    return [(r[0], r[1]) for r in rows]
+
+
+def _copy_columns() -> str:
+    """Columns a row copy writes; generated ones (search_tsv) are computed by the target."""
+    return ", ".join(c.name for c in Action.__table__.columns if c.computed is None)
+
+
+def create_year_partition(db: Session, year: int) -> bool:
+    """
+    Create and attach the partition of `year` if missing. Rows of that year that
+    landed in the default partition are moved over first, so attaching never fails.
+    """
+    name = partition_name(year)
+    if _exists(db, name):
+        return False
+    lo, hi = date(year, 1, 1), date(year + 1, 1, 1)
+    db.execute(text(f"CREATE TABLE {name} (LIKE actions INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)"))
+    if _exists(db, DEFAULT_PARTITION):
+        cols = _copy_columns()
+        db.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :lo AND date < :hi RETURNING {cols}) "
+            f"INSERT INTO {name} ({cols}) SELECT {cols} FROM moved"
+        ), {"lo": lo, "hi": hi})
+    db.execute(text(
+        f"ALTER TABLE actions ATTACH PARTITION {name} FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+    ))
+    log.info("created partition %s", name)
+    return True
+
+
+def ensure_action_partitions(db: Session, today: date | None = None) -> list[str]:
+    """Default partition plus this year's and next year's. No-op unless `actions` is partitioned."""
+    if not actions_partitioned(db):
+        return []
+    today = today or date.today()
+    db.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF actions DEFAULT"))
+    return [partition_name(y) for y in (today.year, today.year + 1) if create_year_partition(db, y)]
+
+
+def convert_actions_to_partitioned(db: Session, keep_legacy: bool = False) -> int:
+    """
+    One-off migration of an existing plain `actions` table: rename it away, create
+    the partitioned table from the model, create one partition per year of data,
+    copy rows over and carry the id sequence forward. Runs in the caller's
+    transaction and holds an exclusive lock on `actions` until commit.
+    Returns the number of rows copied.
+    """
+    if not _is_postgres(db):
+        raise ValueError("Partitioning needs PostgreSQL")
+    if not ACTIONS_PARTITIONED:
+        raise ValueError("Set PARTITION_ACTIONS=true before converting")
+    if actions_partitioned(db):
+        return 0
+
+    db.execute(text("LOCK TABLE actions IN ACCESS EXCLUSIVE MODE"))
+    db.execute(text("ALTER TABLE actions RENAME TO actions_legacy"))
+    db.execute(text("ALTER TABLE actions_legacy RENAME CONSTRAINT actions_pkey TO actions_legacy_pkey"))
+    db.execute(text("ALTER SEQUENCE IF EXISTS actions_id_seq RENAME TO actions_legacy_id_seq"))
+    for idx in Action.__table__.indexes:
+        db.execute(text(f"ALTER INDEX IF EXISTS {idx.name} RENAME TO {idx.name}_legacy"))
+    Action.__table__.create(bind=db.connection())
+
+    lo, hi = db.execute(text("SELECT MIN(date), MAX(date) FROM actions_legacy")).one()
+    today = date.today()
+    first = lo.year if lo else today.year
+    last = max(hi.year if hi else today.year, today.year + 1)
+    db.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF actions DEFAULT"))
+    for year in range(first, last + 1):
+        create_year_partition(db, year)
+
+    cols = _copy_columns()
+    copied = db.execute(text(f"INSERT INTO actions ({cols}) SELECT {cols} FROM actions_legacy")).rowcount
+    db.execute(text(
+        "SELECT setval(pg_get_serial_sequence('actions', 'id'), "
+        "COALESCE((SELECT MAX(id) FROM actions), 0) + 1, false)"
+    ))
+    if not keep_legacy:
+        db.execute(text("DROP TABLE actions_legacy"))
+    return int(copied or 0)
+
+
+def detach_action_partitions(db: Session, before_year: int, drop: bool = False) -> list[str]:
+    """
+    Detach year partitions older than `before_year`. Detached tables stay in the
+    database as plain tables (dump them with pg_dump to archive) unless `drop`.
+    Their minutes remain in the `action_daily` rollup, so reports are unaffected.
+    """
+    out = []
+    for name, _bound in list_action_partitions(db):
+        if not name.startswith("actions_y"):
+            continue
+        year = int(name[len("actions_y"):])
+        if year >= before_year:
+            continue
+        db.execute(text(f"ALTER TABLE actions DETACH PARTITION {name}"))
+        if drop:
+            db.execute(text(f"DROP TABLE {name}"))
+        out.append(name)
+    return out
+
+
+def _plan_relations(plan: dict) -> set[str]:
+    found = set()
+    if "Relation Name" in plan:
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= _plan_relations(child)
+    return found
+
+
+def verify_pruning(db: Session, start: date, end: date) -> dict[str, dict]:
+    """
+    EXPLAIN the date-filtered `actions` queries of crud.actions for [start, end]
+    and report which partitions each one scans. `ok` is False when a partition
+    outside the requested years shows up in the plan.
+    """
+    from .crud.actions import actions_by_date_stmt, rollup_source_stmt
+
+    checks = {
+        "list_actions_by_date": (actions_by_date_stmt(start), {start.year}),
+        "rebuild_action_rollup": (rollup_source_stmt(start, end), set(range(start.year, end.year + 1))),
+    }
+    dialect = db.get_bind().dialect
+    out = {}
+    for name, (stmt, years) in checks.items():
+        sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scanned = {r for r in _plan_relations(plan[0]["Plan"]) if r.startswith("actions_")}
+        allowed = {partition_name(y) for y in years} | {DEFAULT_PARTITION}
+        out[name] = {"scanned": sorted(scanned), "ok": scanned <= allowed}
+    return out
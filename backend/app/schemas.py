@@ -32,6 +32,15 @@ class MilestoneCreate(BaseModel):
     note: str | None = None
     dependent_to_id: int | None = None
 
+class MilestoneChange(BaseModel):
+    id: int
+    percent_complete: int | None = Field(default=None, ge=0, le=100)
+    note: str | None = None      # omitted = unchanged, "" or null = cleared
+    status: str | None = None
+
+class MilestoneBatch(BaseModel):
+    changes: list[MilestoneChange] = Field(max_length=500)
+
 class ActionCreate(BaseModel):
     project_id: int
     milestone_id: int | None = None
@@ -39,3 +48,5 @@ class ActionCreate(BaseModel):
     hhmm: str          # HH:MM
     comment: str | None = None
 
+class ActionBulk(BaseModel):
+    actions: list[ActionCreate] = Field(max_length=1000)
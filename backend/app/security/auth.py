@@ -4,13 +4,15 @@ from fastapi import Request, HTTPException
 from passlib.context import CryptContext
 from starlette.responses import RedirectResponse
 
-from ..db import session_scope
+from ..db import session_scope, async_session_scope
 from ..models import User
 from ..settings import settings
+from ..utils.executors import password_executor, run_in
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 SESSION_KEY = "user_id"
+WORKSPACE_SESSION_KEY = "workspace_id"
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -18,28 +20,52 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
-def login_user(resp: RedirectResponse, request: Request, user_id: int):
+async def hash_password_async(password: str) -> str:
+    return await run_in(password_executor, hash_password, password)
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    """bcrypt takes ~100ms of CPU by design; keep it off the event loop."""
+    return await run_in(password_executor, verify_password, password, password_hash)
+
+def login_user(resp: RedirectResponse, request: Request, user_id: int, workspace_id: int):
     request.session[SESSION_KEY] = user_id
+    request.session[WORKSPACE_SESSION_KEY] = workspace_id
     # optional: set expiry by custom cookie (SessionMiddleware handles cookie)
     return resp
 
 def logout_user(resp: RedirectResponse, request: Request):
     request.session.pop(SESSION_KEY, None)
+    request.session.pop(WORKSPACE_SESSION_KEY, None)
     return resp
 
 def current_user_id(request: Request) -> Optional[int]:
+    # sessions from before workspaces carry none: those sign in again
+    if WORKSPACE_SESSION_KEY not in request.session:
+        return None
     return request.session.get(SESSION_KEY)
 
+def current_workspace_id(request: Request) -> Optional[int]:
+    return request.session.get(WORKSPACE_SESSION_KEY) if current_user_id(request) else None
+
+def workspace_scope(request: Request):
+    """async_session_scope of the signed-in user's workspace (401 without a login)."""
+    workspace_id = current_workspace_id(request)
+    if not workspace_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return async_session_scope(workspace_id)
+
 def require_login(request: Request):
     if not current_user_id(request):
         raise HTTPException(status_code=401, detail="Not authenticated")
 
 def bootstrap_admin():
-    """Ensure one admin user exists using env credentials."""
+    """Ensure one admin user exists using env credentials, in the default workspace."""
+    from ..crud.workspaces import default_workspace_id
     with session_scope() as db:
         admin = db.query(User).filter(User.email == settings.admin_email).first()
         if not admin:
             db.add(User(
+                workspace_id=default_workspace_id(db),
                 email=settings.admin_email,
                 password_hash=hash_password(settings.admin_password)
             ))
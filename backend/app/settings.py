@@ -11,6 +11,56 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str = "postgresql+psycopg2://focuspoint:focuspoint@db:5432/focuspoint"
+    # Request handlers run on an async engine; derived from DATABASE_URL (asyncpg /
+    # aiosqlite) unless set explicitly
+    async_database_url: str = ""
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    # PostgreSQL: keep `actions` partitioned by year (new databases; existing ones
+    # are converted with `python -m app.manage partitions convert`)
+    partition_actions: bool = True
+    # Housekeeping loop in the web process (seconds, 0 = only at startup)
+    maintenance_interval_seconds: int = 6 * 3600
+
+    # Threads for blocking work called from async handlers (bcrypt, report previews)
+    password_hash_workers: int = 2
+    render_workers: int = 2
+
+    # Bulk import of actions: rows per INSERT/commit, row errors kept in the report
+    import_batch_size: int = 5000
+    import_max_errors: int = 1000
+    # Rows fetched per server-side cursor round trip when exporting
+    export_batch_size: int = 2000
+
+    # Report jobs (0 workers = run them with `python -m app.manage report-worker` instead)
+    report_workers: int = 2
+    report_job_max_attempts: int = 3
+    report_job_retry_seconds: int = 30
+    report_job_stale_seconds: int = 300  # at least 4 heartbeats (jobs.HEARTBEAT_SECONDS)
+
+    # Reuse a stored PDF when the report content is unchanged. By default the
+    # "Generated" date is not part of the fingerprint, so a re-run of a closed
+    # period returns the earlier PDF (showing its original generation date).
+    report_fingerprint_include_generated: bool = False
+
+    # Computed report contexts kept per process (LRU)
+    report_cache_size: int = 64
+
+    # Project dependency graphs kept per process (LRU, see utils/depgraph.py)
+    graph_cache_size: int = 256
+
+    # Portfolio payloads kept per process, one per (category filter, day)
+    portfolio_cache_size: int = 16
+
+    # Days of the change log (GET /api/v1/changes) kept for clients to catch up on (0 = forever)
+    change_log_days: int = 30
+
+    # Live page updates (GET /events): "local" reaches the clients of the process that made
+    # the write; "postgres" goes through NOTIFY/LISTEN, for several web or worker processes
+    events_backend: str = "local"
+
+    # Bearer token for scripts calling /api/v1 without a browser session (empty = sessions only)
+    api_token: str = ""
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -42,3 +42,62 @@
   });
 })();
 
+
+// Fragment forms: <form data-fragment data-fragment-rows="tbodyId" data-fragment-total="spanId"
+// data-fragment-day="DD/MM/YYYY" data-fragment-error="id" data-fragment-notice="id"> are posted with fetch (Accept: application/json). The server
+// answers {action_id, row_html, date_dmy, day_total_hhmm} or {error}; the new row is prepended to the
+// table when it belongs to the day on screen. Without JS the form posts normally.
+(function () {
+  document.querySelectorAll('form[data-fragment]').forEach((form) => {
+    const rows = document.getElementById(form.dataset.fragmentRows);
+    const total = document.getElementById(form.dataset.fragmentTotal);
+    const errorBox = document.getElementById(form.dataset.fragmentError);
+    const noticeBox = document.getElementById(form.dataset.fragmentNotice);
+    let busy = false;
+
+    function show(box, text) {
+      if (!box) return;
+      box.textContent = text || '';
+      box.hidden = !text;
+    }
+
+    form.addEventListener('submit', async (ev) => {
+      ev.preventDefault();
+      if (busy) return;
+      busy = true;
+      show(errorBox, '');
+      show(noticeBox, '');
+      try {
+        const res = await fetch(form.action, {
+          method: 'POST',
+          body: new FormData(form),
+          headers: {'Accept': 'application/json'},
+        });
+        const data = await res.json().catch(() => ({error: 'Unexpected response (' + res.status + ')'}));
+        if (!res.ok) {
+          show(errorBox, data.error || data.detail || 'Could not save');
+          return;
+        }
+        if (rows && data.date_dmy === form.dataset.fragmentDay) {
+          rows.querySelectorAll('.empty-row').forEach((r) => r.remove());
+          // live.js may have inserted it already
+          if (!rows.querySelector('[data-action-id="' + data.action_id + '"]')) {
+            rows.insertAdjacentHTML('afterbegin', data.row_html);
+          }
+          if (total) total.textContent = data.day_total_hhmm;
+        } else {
+          show(noticeBox, 'Saved for ' + data.date_dmy);
+        }
+        // keep date and milestone for the next entry; clear the per-entry fields
+        form.querySelectorAll('[data-fragment-reset], input[name="hhmm"], input[name="comment"]')
+          .forEach((el) => { el.value = ''; });
+        const first = form.querySelector('input[name="hhmm"]');
+        if (first) first.focus();
+      } catch (e) {
+        show(errorBox, 'Network error, please retry');
+      } finally {
+        busy = false;
+      }
+    });
+  });
+})();
@@ -0,0 +1,55 @@
+// Live updates: a page holding a [data-live] element opens one EventSource on /events
+// and gets the server's events as `live:<event>` document events (detail = the data):
+// report-job, report-file, action, actions, totals, changes. The browser reconnects by
+// itself; `live:reconnected` then tells pages that events may have been missed.
+(function () {
+  window.FocusPointLive = {
+    hhmm(minutes) {
+      const h = Math.floor(minutes / 60), m = minutes % 60;
+      return String(h).padStart(2, '0') + ':' + String(m).padStart(2, '0');
+    },
+    dmy(iso) {
+      const [y, m, d] = iso.split('-');
+      return d + '/' + m + '/' + y;
+    },
+    // Keeps the minutes of [start, end] (ISO dates) current: after a "totals" event that
+    // overlaps them (or a reconnect), fetches /api/v1/totals, which by then includes the
+    // committed write, and calls apply({date: minutes}, total). A burst of events sends
+    // one request; an answer overtaken by a newer request is dropped.
+    followTotals(start, end, apply) {
+      let timer = null, seq = 0;
+      function refresh() {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+          const mine = ++seq;
+          try {
+            const res = await fetch('/api/v1/totals?by=day&start=' + start + '&end=' + end,
+                                    {headers: {'Accept': 'application/json'}});
+            if (!res.ok || mine !== seq) return;
+            const data = await res.json();
+            const days = {};
+            data.rows.forEach((r) => { days[r.date] = r.minutes; });
+            apply(days, data.total);
+          } catch (e) { /* the next event retries */ }
+        }, 250);
+      }
+      document.addEventListener('live:totals', (ev) => {
+        if (ev.detail.end >= start && ev.detail.start <= end) refresh();
+      });
+      document.addEventListener('live:reconnected', refresh);
+    },
+  };
+
+  if (!window.EventSource || !document.querySelector('[data-live]')) return;
+  const source = new EventSource('/events');
+  let opened = false;
+  source.addEventListener('open', () => {
+    if (opened) document.dispatchEvent(new CustomEvent('live:reconnected'));
+    opened = true;
+  });
+  ['report-job', 'report-file', 'action', 'actions', 'totals', 'changes'].forEach((name) => {
+    source.addEventListener(name, (ev) => {
+      document.dispatchEvent(new CustomEvent('live:' + name, {detail: JSON.parse(ev.data)}));
+    });
+  });
+})();
@@ -1,35 +1,86 @@
-// Generic vis-network DAG mount (not used if page provides its own inline script)
+// vis-network DAG helpers. expand() turns the compact /api/projects/{pid}/graph
+// payload (rows + field names) into styled vis nodes and edges. From format 3 the
+// server sends topological levels, so nodes get fixed positions and vis-network's
+// hierarchical layout pass is skipped.
 window.FocusPointGraph = (function () {
-  function mount(container, data, opts = {}) {
-    const nodes = new vis.DataSet((data.nodes || []).map(n => ({
-      ...n,
-      shape: 'box',
-      borderWidth: 3,
+  const HEALTH_BORDER = { ok: '#2ec27e', risk: '#ffcc66', late: '#ff6b6b' };
+  const LEVEL_SEPARATION = 220, NODE_SPACING = 110;
+  const EDGE_STYLE = {
+    arrows: { to: {enabled: true, type: 'vee', scaleFactor: 1.6} },
+    width: 4,
+    color: { color:'#2f1bb3', highlight:'#7c4dff', hover:'#7c4dff' },
+    smooth: { type: 'cubicBezier' }
+  };
+
+  function rows(fields, list) {
+    return (list || []).map(r => Object.fromEntries(fields.map((f, i) => [f, r[i]])));
+  }
+
+  function slackText(n) {
+    if (n.slack == null) return '';
+    return n.slack < 0 ? ` · ${-n.slack}d past a dependent milestone` : ` · slack ${n.slack}d`;
+  }
+
+  // x by level, rows within a level in payload order (end date), centred on y = 0
+  function place(nodes) {
+    const byLevel = {};
+    nodes.forEach(n => { (byLevel[n.level] = byLevel[n.level] || []).push(n); });
+    Object.values(byLevel).forEach(list => list.forEach((n, i) => {
+      n.x = n.level * LEVEL_SEPARATION;
+      n.y = (i - (list.length - 1) / 2) * NODE_SPACING;
+    }));
+    return nodes;
+  }
+
+  function expand(data) {
+    if (!(data.format >= 2)) throw new Error('Unsupported graph format ' + data.format);
+    const critical = new Set((data.critical || []).map(String));
+    let nodes = rows(data.node_fields, data.nodes).map(n => ({
+      id: String(n.id),
+      label: `${n.name}\n${n.percent}% · ${n.projected ? n.end + ' → ' + n.projected : n.end}`,
+      title: `${n.name} — ends ${n.end}${n.projected ? ` (projected ${n.projected})` : ''}${slackText(n)}${critical.has(String(n.id)) ? ' · critical path' : ''}`,
+      name: n.name,
+      status: n.status,
+      health: n.health,
+      level: n.level,
+      borderWidth: critical.has(String(n.id)) ? 5 : 3,
+      size: 20 + (n.percent / 100) * 20,  // 20..40
       color: {
         background: '#ffffff',
-        border: (n.border || '#cccccc'),
-        highlight: {background:'#ffffff', border:'#7c4dff'}
-      },
-      font: { color:'#111', size:12, face:'Inter, system-ui, sans-serif', multi:true },
-      margin: 10
-    })));
-
-    const edges = new vis.DataSet((data.edges || []).map(e => ({
-      ...e,
-      arrows: { to: {enabled: true, type: 'vee', scaleFactor: 1.6} },
-      width: 4,
-      color: { color:'#2f1bb3', highlight:'#7c4dff', hover:'#7c4dff' },
-      smooth: { type: 'cubicBezier' }
-    })));
+        border: HEALTH_BORDER[n.health] || '#dddddd',
+        highlight: {background:'#ffffff', border:'#7c4dff'},
+        hover: {background:'#ffffff', border:'#7c4dff'}
+      }
+    }));
+    const edges = rows(data.edge_fields, data.edges).map(e => ({
+      id: String(e.id), from: String(e.from), to: String(e.to), ...EDGE_STYLE,
+      dashes: critical.has(String(e.from)) && critical.has(String(e.to)) ? false : [6, 4]
+    }));
+    const positioned = nodes.length > 0 && nodes.every(n => n.level != null);
+    if (positioned) place(nodes);
+    return { nodes, edges, positioned, cycle: data.cycle || null };
+  }
 
-    const network = new vis.Network(container, { nodes, edges }, {
-      layout: { hierarchical: { enabled: true, direction: 'LR', levelSeparation: 160, nodeSpacing: 120 } },
-      physics: false,
-      interaction: { hover: true, tooltipDelay: 80, zoomView: true, dragView: true }
-    });
+  const OPTIONS = {
+    nodes: {
+      shape: 'box', borderWidth: 3, margin: 10,
+      font: { color:'#111', size:12, face:'Inter, system-ui, sans-serif', multi:true },
+      widthConstraint: { maximum: 260 }, heightConstraint: { minimum: 36 }
+    },
+    edges: EDGE_STYLE,
+    layout: { hierarchical: { enabled: true, direction: 'LR', levelSeparation: 160, nodeSpacing: 120 } },
+    physics: false,
+    interaction: { hover: true, tooltipDelay: 80, zoomView: true, dragView: true }
+  };
 
+  function mount(container, data, opts = {}) {
+    const g = data.format ? expand(data) : data;
+    const nodes = new vis.DataSet(g.nodes);
+    const edges = new vis.DataSet(g.edges);
+    const layout = g.positioned ? { hierarchical: { enabled: false } } : OPTIONS.layout;
+    const network = new vis.Network(container, { nodes, edges }, { ...OPTIONS, layout, ...opts });
     return { network, nodes, edges };
   }
-  return { mount };
-})();
 
+  return { expand, mount, place, OPTIONS };
+})();
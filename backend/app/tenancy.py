@@ -0,0 +1,69 @@
+"""
+Workspaces (tenants). Categories, projects, milestones, dependencies, actions,
+the daily rollup, report files and report jobs each belong to one workspace
+(a `workspace_id` column, WorkspaceScoped), and every user to one workspace.
+
+A session opened for a workspace (`session_scope(workspace_id)` /
+`async_session_scope(workspace_id)`) only sees that workspace:
+
+- every ORM SELECT, UPDATE and DELETE it runs gets `workspace_id = :ws` for each
+  scoped entity in it, joins and subqueries included (with_loader_criteria), so
+  the crud functions read as if there were a single workspace;
+- objects added to it are stamped with the workspace on flush.
+
+Core INSERTs (bulk inserts, rollup upserts) are not ORM-scoped: they set
+workspace_id themselves, from the project they write for.
+
+Sessions opened without a workspace (CLI, maintenance, the report job
+dispatcher) see every workspace; tenant rows they create need an explicit
+workspace_id. Request handlers always pass the signed-in user's workspace
+(security.auth.workspace_scope).
+"""
+from __future__ import annotations
+
+from sqlalchemy import ForeignKey, event
+from sqlalchemy.orm import Mapped, ORMExecuteState, Session, mapped_column, with_loader_criteria
+
+WORKSPACE_KEY = "workspace_id"
+
+
+class WorkspaceScoped:
+    """Mixin for tenant tables. Indexes serving workspace-wide queries lead with workspace_id."""
+    workspace_id: Mapped[int] = mapped_column(ForeignKey("workspaces.id", ondelete="CASCADE"))
+
+
+def session_workspace(db) -> int | None:
+    """Workspace a (sync or async) session is scoped to; None for unscoped sessions."""
+    return db.info.get(WORKSPACE_KEY)
+
+
+def cache_scope(db) -> str:
+    """Prefix for process cache and cache_versions keys: one namespace per workspace."""
+    ws = session_workspace(db)
+    return f"w{ws}:" if ws is not None else ""
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_statement(state: ORMExecuteState) -> None:
+    ws = state.session.info.get(WORKSPACE_KEY)
+    if ws is None or state.is_column_load or state.is_relationship_load:
+        # relationship / deferred loads start from rows that were already scoped
+        return
+    if state.is_select or state.is_update or state.is_delete:
+        state.statement = state.statement.options(
+            with_loader_criteria(WorkspaceScoped, lambda cls: cls.workspace_id == ws, include_aliases=True)
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_new(db: Session, flush_context, instances) -> None:
+    ws = db.info.get(WORKSPACE_KEY)
+    for obj in db.new:
+        if not isinstance(obj, WorkspaceScoped):
+            continue
+        if obj.workspace_id is None:
+            if ws is None:
+                raise ValueError(f"{type(obj).__name__} created outside a workspace")
+            obj.workspace_id = ws
+        elif ws is not None and obj.workspace_id != ws:
+            raise ValueError(f"{type(obj).__name__} belongs to another workspace")
@@ -23,3 +23,13 @@ def year_bounds(d: date) -> tuple[date, date]:
     end = d.replace(month=12, day=31)
     return start, end
 
+
+def period_bounds(period_type: str, d: date) -> tuple[date, date]:
+    """Bounds of the weekly/monthly/yearly period containing d."""
+    if period_type == "weekly":
+        return week_bounds(d)
+    if period_type == "monthly":
+        return month_bounds(d)
+    if period_type == "yearly":
+        return year_bounds(d)
+    raise ValueError("Unknown report type")
@@ -0,0 +1,233 @@
+"""
+Milestone dependency graph of one project: adjacency built once from the
+Dependency rows, then cycle checks, topological levels, critical path and slack
+in O(V+E). Graphs are cached per project and rebuilt when the project's
+graph_version moves (see crud.dependencies.project_dep_graph).
+
+Edge direction follows Dependency: from_milestone -> to_milestone means
+"to" depends on "from" (it cannot finish before "from").
+
+`propagate` carries slips downstream: a milestone's projected end is its own
+(planned, or today when overdue) or its latest predecessor's projected end plus
+the window it planned after it, whichever is later.
+"""
+from __future__ import annotations
+import heapq
+from collections import deque
+from datetime import date, timedelta
+from typing import Iterable
+
+from ..settings import settings
+from .cache import LRUCache
+
+# an at-risk or late predecessor ending at most this many days before a milestone puts it at risk
+RISK_WINDOW_DAYS = 7
+
+
+class DepGraph:
+    def __init__(self, ends: dict[int, date], edges: Iterable[tuple[int, int]]):
+        """`ends`: milestone id -> planned end date; `edges`: (from_id, to_id) pairs."""
+        self.ends = dict(ends)
+        self.succ: dict[int, list[int]] = {m: [] for m in self.ends}
+        self.pred: dict[int, list[int]] = {m: [] for m in self.ends}
+        for a, b in edges:
+            if a in self.ends and b in self.ends:
+                self.succ[a].append(b)
+                self.pred[b].append(a)
+        self._order, self._cyclic = self._topological()
+        self._position = {m: i for i, m in enumerate(self._order)}
+        self._levels: dict[int, int] | None = None
+        self._slack: dict[int, int] | None = None
+
+    # --- structure ---
+
+    def _topological(self) -> tuple[list[int], set[int]]:
+        """Kahn's algorithm; nodes left over are on (or behind) a cycle."""
+        indeg = {m: len(p) for m, p in self.pred.items()}
+        queue = deque(sorted(m for m, d in indeg.items() if d == 0))
+        order = []
+        while queue:
+            m = queue.popleft()
+            order.append(m)
+            for s in self.succ[m]:
+                indeg[s] -= 1
+                if indeg[s] == 0:
+                    queue.append(s)
+        return order, {m for m, d in indeg.items() if d > 0}
+
+    @property
+    def acyclic(self) -> bool:
+        return not self._cyclic
+
+    def find_cycle(self) -> list[int] | None:
+        """One cycle as [a, b, ..., a], or None. Only walks the nodes Kahn could not order."""
+        if not self._cyclic:
+            return None
+        # every leftover node has a leftover predecessor, so walking back must loop
+        m = min(self._cyclic)
+        seen: dict[int, int] = {}
+        path = []
+        while m not in seen:
+            seen[m] = len(path)
+            path.append(m)
+            m = next(p for p in self.pred[m] if p in self._cyclic)
+        cycle = path[seen[m]:]
+        cycle.reverse()
+        return cycle + [cycle[0]]
+
+    def path_between(self, start: int, goal: int) -> list[int] | None:
+        """A dependency path start -> ... -> goal (BFS over successors), or None."""
+        if start not in self.succ or goal not in self.succ:
+            return None
+        back = {start: None}
+        queue = deque([start])
+        while queue:
+            m = queue.popleft()
+            if m == goal:
+                path = []
+                while m is not None:
+                    path.append(m)
+                    m = back[m]
+                return path[::-1]
+            for s in self.succ[m]:
+                if s not in back:
+                    back[s] = m
+                    queue.append(s)
+        return None
+
+    def cycle_if_added(self, from_id: int, to_id: int) -> list[int] | None:
+        """The cycle that edge from_id -> to_id would close (to_id already reaches from_id), else None."""
+        if from_id == to_id:
+            return [from_id, from_id]
+        path = self.path_between(to_id, from_id)
+        return [from_id] + path if path else None
+
+    def downstream(self, seeds: Iterable[int]) -> set[int]:
+        """The seeds and every milestone depending on them, directly or not."""
+        seen = {m for m in seeds if m in self.succ}
+        stack = list(seen)
+        while stack:
+            for s in self.succ[stack.pop()]:
+                if s not in seen:
+                    seen.add(s)
+                    stack.append(s)
+        return seen
+
+    # --- layout & schedule ---
+
+    def levels(self) -> dict[int, int]:
+        """Longest-path layering: sources at 0, every node one right of its deepest predecessor.
+        Nodes on cycles (legacy data) go one level past the rest."""
+        if self._levels is None:
+            lv: dict[int, int] = {}
+            for m in self._order:
+                lv[m] = max((lv[p] + 1 for p in self.pred[m]), default=0)
+            tail = max(lv.values(), default=-1) + 1
+            for m in self._cyclic:
+                lv[m] = tail
+            self._levels = lv
+        return self._levels
+
+    def slack(self) -> dict[int, int]:
+        """
+        Days each milestone can slip before it delays a later milestone.
+        A milestone's window is the gap between its end and the latest end among its
+        predecessors; late finish = min over successors of (their late finish - window),
+        with sinks finishing on their planned end. Negative slack means the plan is
+        already inconsistent (a successor ends before this milestone).
+        Milestones on cycles get no value.
+        """
+        if self._slack is None:
+            window = {}
+            for m in self._order:
+                prev = max((self.ends[p] for p in self.pred[m]), default=None)
+                window[m] = max(0, (self.ends[m] - prev).days) if prev else 0
+            late: dict[int, date] = {}
+            for m in reversed(self._order):
+                options = [late[s].toordinal() - window[s] for s in self.succ[m] if s in late]
+                late[m] = date.fromordinal(min(options)) if options else self.ends[m]
+            self._slack = {m: (late[m] - self.ends[m]).days for m in self._order}
+        return self._slack
+
+    def critical_path(self) -> list[int]:
+        """Chain ending at the latest-ending milestone, following the latest-ending
+        predecessor back each step: the milestones that set the project's end date."""
+        if not self._order:
+            return []
+        m = max(self._order, key=lambda x: (self.ends[x], x))
+        path = [m]
+        while self.pred[m]:
+            m = max(self.pred[m], key=lambda x: (self.ends[x], x))
+            path.append(m)
+        return path[::-1]
+
+    # --- slip propagation ---
+
+    def _project(self, m: int, own: tuple[date, str], values: dict) -> tuple[date, str]:
+        end = self.ends[m]
+        projected, risk = own
+        preds = self.pred[m]
+        if preds:
+            window = max(0, (end - max(self.ends[p] for p in preds)).days)
+            projected = max(projected, max(values[p][0] for p in preds) + timedelta(days=window))
+            if risk == "ok" and any(values[p][1] != "ok" and (end - self.ends[p]).days <= RISK_WINDOW_DAYS
+                                    for p in preds):
+                risk = "risk"
+        if projected > end:
+            risk = "late"
+        return projected, risk
+
+    def propagate(self, seeds: Iterable[int], own: dict[int, tuple[date, str]],
+                  current: dict[int, tuple[date, str]], done: set[int] = frozenset()) -> dict[int, tuple[date, str]]:
+        """
+        Recompute (projected end, effective risk) for the seeds and downstream of them.
+
+        `own[m]`: m's values ignoring its dependencies, for every node in downstream(seeds);
+        `current[m]`: stored values, for those nodes and their predecessors.
+        Nodes are visited in topological order; past the seeds, a branch stops at the
+        first node whose values come out unchanged. Done milestones keep their own
+        values (they no longer wait on anything). Returns only the changed nodes.
+        """
+        values = dict(current)
+        changed: dict[int, tuple[date, str]] = {}
+        seeds = set(seeds)
+        for m in seeds - self._position.keys():
+            # on a cycle (legacy data): no order to propagate in, own values only
+            if m in own and own[m] != values.get(m):
+                values[m] = changed[m] = own[m]
+        heap = [(self._position[m], m) for m in seeds if m in self._position]
+        heapq.heapify(heap)
+        queued = {m for _, m in heap}
+        while heap:
+            _, m = heapq.heappop(heap)
+            new = own[m] if m in done else self._project(m, own[m], values)
+            if new != values.get(m):
+                values[m] = changed[m] = new
+            elif m not in seeds:
+                continue
+            for s in self.succ[m]:
+                if s not in queued and s in self._position:
+                    queued.add(s)
+                    heapq.heappush(heap, (self._position[s], s))
+        return changed
+
+
+
+class DepGraphCache:
+    """LRU of DepGraph per project, stamped with the graph_version it was built under."""
+
+    def __init__(self, maxsize: int):
+        self.lru = LRUCache(maxsize)
+
+    def get(self, project_id: int, version: int, build) -> DepGraph:
+        entry = self.lru.get(project_id, is_valid=lambda e: e[0] == version)
+        if entry is None:
+            entry = (version, build())
+            self.lru.put(project_id, entry)
+        return entry[1]
+
+    def stats(self) -> dict[str, int]:
+        return self.lru.stats()
+
+
+dep_graphs = DepGraphCache(settings.graph_cache_size)
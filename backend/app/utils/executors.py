@@ -0,0 +1,56 @@
+"""
+Explicit executors for blocking work reached from async request handlers, so
+it never runs on (or starves) the event loop and never competes with Starlette's
+default threadpool. PDF rendering has its own process pool (app.jobs).
+"""
+from __future__ import annotations
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from ..settings import settings
+
+T = TypeVar("T")
+
+
+class ThreadPool:
+    """
+    A ThreadPoolExecutor started on first use. shutdown() ends the current one only,
+    so the app can be started again in the same process (tests, reloads).
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.thread_name_prefix)
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# bcrypt releases the GIL, so a couple of threads give real parallelism
+password_executor = ThreadPool(settings.password_hash_workers, thread_name_prefix="pwhash")
+# report previews: context build runs async, only the Jinja render lands here
+render_executor = ThreadPool(settings.render_workers, thread_name_prefix="render")
+
+
+async def run_in(pool: ThreadPool, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool.executor(), partial(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    for pool in (password_executor, render_executor):
+        pool.shutdown()
@@ -52,3 +52,13 @@ def minutes_to_hhmm(total_minutes: int | None) -> str:
     m = total % 60
     return f"{h:02d}:{m:02d}"
 
+
+# ------- Report file names -------
+
+def report_filename(period_type: str, start: date, end: date) -> str:
+    """Human-facing PDF name for a report period (the stored artifact is content-addressed)."""
+    if period_type == "weekly":
+        return f"weekly_{start.strftime('%Y-%m-%d')}_to_{end.strftime('%Y-%m-%d')}.pdf"
+    if period_type == "monthly":
+        return f"monthly_{start.strftime('%Y-%m')}.pdf"
+    return f"yearly_{start.year}.pdf"
@@ -0,0 +1,193 @@
+"""
+Incremental parsing of time-entry uploads (CSV with a header row, or NDJSON).
+
+RecordParser is push-based: feed it byte chunks as they arrive (an HTTP body, a
+file read in blocks) and it returns the complete records seen so far, so an
+upload is never held in memory as a whole. Each chunk is scanned once, and only
+the unfinished last line is carried over, so feeding costs time in proportion to
+the chunk and the async driver can call it on the event loop. Lines may end in
+\n, \r\n or a bare \r.
+
+Columns / keys: date (DD/MM/YYYY or YYYY-MM-DD), project_id, milestone_id
+(optional), minutes or hhmm, comment (optional).
+"""
+from __future__ import annotations
+import codecs
+import csv
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, NamedTuple
+
+FORMATS = ("csv", "ndjson")
+
+# A quoted CSV field may span lines, but a stray quote must not swallow the rest of
+# the upload: a record still open past these is rejected and parsing resumes at the
+# next line.
+MAX_RECORD_LINES = 100
+MAX_RECORD_CHARS = 64 * 1024
+
+_EOL = re.compile(r"\r\n|\r|\n")
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class ParsedRecord(NamedTuple):
+    line: int                    # first line of the record in the upload (1-based)
+    data: dict[str, Any] | None  # None when the record could not be parsed
+    error: str | None = None
+
+
+def detect_format(filename: str | None = None, content_type: str | None = None) -> str | None:
+    if content_type:
+        fmt = CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+class RecordParser:
+    def __init__(self, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown import format '{fmt}' (use csv or ndjson)")
+        self.fmt = fmt
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._tail: list[str] = []  # pieces of the unfinished last line
+        self._tail_chars = 0
+        self._skipping = False      # dropping an over-long line up to its line break
+        self._cr_end = False        # the text so far ends in \r (a \n may follow)
+        self._line = 0
+        self._header: list[str] | None = None
+        self._pending: list[str] = []  # CSV lines of a record with an open quoted field
+        self._pending_line = 0
+        self._pending_quotes = 0
+        self._pending_chars = 0
+
+    def feed(self, chunk: bytes) -> list[ParsedRecord]:
+        return self._text(self._decoder.decode(chunk))
+
+    def close(self) -> list[ParsedRecord]:
+        out = self._text(self._decoder.decode(b"", final=True))
+        tail = "".join(self._tail)
+        self._tail, self._tail_chars = [], 0
+        if tail and not self._skipping:
+            out += self._lines([tail])
+        if self._pending:
+            out.append(ParsedRecord(self._pending_line, None, "Unterminated quoted field"))
+            self._pending = []
+        return out
+
+    def _text(self, text: str) -> list[ParsedRecord]:
+        if self._cr_end and text.startswith("\n"):
+            text = text[1:]  # the \n of a \r\n split between two chunks
+        if text:
+            self._cr_end = text.endswith("\r")
+        *lines, rest = _EOL.split(text)
+        out = []
+        if lines:
+            head, self._tail, self._tail_chars = self._tail, [], 0
+            if self._skipping:
+                self._skipping = False
+                self._line += 1
+                lines = lines[1:]
+            else:
+                lines[0] = "".join(head) + lines[0]
+            out += self._lines(lines)
+        if rest and not self._skipping:
+            self._tail.append(rest)
+            self._tail_chars += len(rest)
+            if self._tail_chars > MAX_RECORD_CHARS:
+                out.append(self._too_long(self._line + 1))
+                self._tail, self._tail_chars, self._skipping = [], 0, True
+        return out
+
+    def _lines(self, lines: list[str]) -> list[ParsedRecord]:
+        out = []
+        for line in lines:
+            self._line += 1
+            if len(line) > MAX_RECORD_CHARS:
+                rec = self._too_long(self._line)
+            else:
+                rec = self._csv_line(line) if self.fmt == "csv" else self._json_line(line)
+            if rec is not None:
+                out.append(rec)
+        return out
+
+    def _too_long(self, line: int) -> ParsedRecord:
+        """A line past MAX_RECORD_CHARS is rejected, with the CSV record it would continue."""
+        if self._pending:
+            line, self._pending = self._pending_line, []
+        return ParsedRecord(line, None, f"Record longer than {MAX_RECORD_CHARS} characters")
+
+    def _json_line(self, line: str) -> ParsedRecord | None:
+        if not line.strip():
+            return None
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            return ParsedRecord(self._line, None, f"Invalid JSON: {e.msg}")
+        if not isinstance(data, dict):
+            return ParsedRecord(self._line, None, "Each line must be a JSON object")
+        return ParsedRecord(self._line, data)
+
+    def _csv_line(self, line: str) -> ParsedRecord | None:
+        # A quoted field may span lines: keep collecting until the quotes balance.
+        if not self._pending:
+            self._pending_line = self._line
+            self._pending_quotes = self._pending_chars = 0
+        self._pending.append(line)
+        self._pending_quotes += line.count('"')
+        self._pending_chars += len(line) + 1
+        if self._pending_quotes % 2:
+            if len(self._pending) < MAX_RECORD_LINES and self._pending_chars <= MAX_RECORD_CHARS:
+                return None
+            self._pending = []
+            return ParsedRecord(self._pending_line, None,
+                                f"Unterminated quoted field (still open after {self._line - self._pending_line + 1} lines)")
+        text = "\n".join(self._pending)
+        self._pending = []
+        if not text.strip():
+            return None
+        values = next(csv.reader([text]))
+        if self._header is None:
+            self._header = [h.strip().lower() for h in values]
+            return None
+        if len(values) != len(self._header):
+            return ParsedRecord(self._pending_line, None,
+                                f"Expected {len(self._header)} columns, got {len(values)}")
+        return ParsedRecord(self._pending_line, dict(zip(self._header, values)))
+
+
+@dataclass
+class ImportReport:
+    """Running totals of one import; keeps the first `max_errors` row errors."""
+    max_errors: int = 1000
+    imported: int = 0
+    failed: int = 0
+    batches: int = 0
+    errors: list[dict[str, Any]] = field(default_factory=list)
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
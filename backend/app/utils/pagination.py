@@ -0,0 +1,109 @@
+"""
+Keyset (cursor) pagination: a page is "the next `limit` rows after the last one
+seen" in a stable, unique sort order, so every page is one index range scan
+however deep it is (OFFSET re-reads all the rows it skips).
+
+    KEYSET = Keyset((Project.name, False), (Project.id, False))
+    page = KEYSET.page(db, select(Project), cursor, limit)
+    page.items, page.next_cursor   # next_cursor is None on the last page
+
+The cursor is the sort key of a page's last row, JSON in url-safe base64. It is
+opaque to clients but not signed: a forged one only moves where a page starts.
+"""
+from __future__ import annotations
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Sequence
+
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import Session
+
+MAX_PAGE_SIZE = 500
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: str | None
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values],
+                     separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, columns: Sequence) -> tuple:
+    """Sort key from a cursor, date / datetime values parsed back per column type; ValueError if malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Invalid cursor")
+    out = []
+    for col, v in zip(columns, values):
+        kind = getattr(col.type, "python_type", None) if hasattr(col, "type") else None
+        if v is not None and kind in (date, datetime):
+            try:
+                v = kind.fromisoformat(v)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+        out.append(v)
+    return tuple(out)
+
+
+def clamp_limit(limit: int | None, default: int = 50) -> int:
+    return max(1, min(int(limit or default), MAX_PAGE_SIZE))
+
+
+class Keyset:
+    """
+    A sort order for keyset pagination: (column, descending) pairs, the last one
+    unique (usually the primary key) so every row has a distinct position. Columns
+    must not be NULL. Back it with an index in the same column order.
+    """
+
+    def __init__(self, *order: tuple[Any, bool]):
+        self.columns = [c for c, _ in order]
+        self.descending = [d for _, d in order]
+
+    def order_by(self):
+        return [c.desc() if d else c.asc() for c, d in zip(self.columns, self.descending)]
+
+    def after(self, values: Sequence[Any]):
+        """WHERE clause for the rows strictly after the sort key `values`."""
+        if len(set(self.descending)) == 1:
+            # one direction: a row-value comparison, which the index can seek on
+            cols, vals = tuple_(*self.columns), tuple_(*values)
+            return cols < vals if self.descending[0] else cols > vals
+        ors = []
+        for i, (col, desc) in enumerate(zip(self.columns, self.descending)):
+            eq = [c == v for c, v in zip(self.columns[:i], values[:i])]
+            ors.append(and_(*eq, col < values[i] if desc else col > values[i]))
+        return or_(*ors)
+
+    def apply(self, stmt, cursor: str | None, limit: int):
+        """`stmt` ordered, filtered past `cursor`, with one row beyond the page to tell whether more follow."""
+        if cursor:
+            stmt = stmt.where(self.after(decode_cursor(cursor, self.columns)))
+        return stmt.order_by(*self.order_by()).limit(limit + 1)
+
+    def key(self, row) -> tuple:
+        return tuple(getattr(row, c.key) for c in self.columns)
+
+    def page(self, db: Session, stmt, cursor: str | None, limit: int | None, *,
+             scalars: bool = False, key: Callable[[Any], tuple] | None = None) -> Page:
+        """
+        Run `stmt` for one page. `scalars` for ORM entity selects; `key` reads the
+        sort key off a result row (default: attributes named like the columns).
+        """
+        limit = clamp_limit(limit)
+        result = db.execute(self.apply(stmt, cursor, limit))
+        rows = list(result.scalars() if scalars else result.all())
+        more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor((key or self.key)(rows[-1])) if more else None
+        return Page(rows, next_cursor)
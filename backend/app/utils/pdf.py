@@ -1,9 +1,97 @@
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
 from pathlib import Path
+from time import perf_counter
+
+from jinja2 import Environment
 from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
 
-def render_html_to_pdf(html_str: str, output_path: Path, css_paths: list[Path] | None = None):
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    css_objs = [CSS(filename=str(p)) for p in (css_paths or [])]
-    HTML(string=html_str).write_pdf(str(output_path), stylesheets=css_objs)
-    return output_path
 
+@dataclass
+class RenderTimings:
+    """Seconds spent per stage of one report render."""
+    context: float = 0.0
+    html: float = 0.0
+    layout: float = 0.0
+    write: float = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            setattr(self, name, getattr(self, name) + perf_counter() - t0)
+
+    def as_ms(self) -> dict[str, int]:
+        return {f.name: int(getattr(self, f.name) * 1000) for f in fields(self)}
+
+
+class PdfRenderer:
+    """
+    Long-lived HTML → PDF renderer. Keeps one FontConfiguration, parses each
+    stylesheet once (re-parsed when its mtime changes) and renders templates
+    from a shared Jinja environment (which reloads changed templates itself).
+    Meant to live for the whole process, e.g. one per report worker.
+    """
+
+    def __init__(self, env: Environment | None = None):
+        self.env = env
+        self.font_config = FontConfiguration()
+        self._css: dict[str, tuple[float, CSS]] = {}
+        self._lock = threading.Lock()
+
+    def stylesheet(self, path: Path) -> CSS:
+        key = str(path)
+        mtime = path.stat().st_mtime
+        with self._lock:
+            hit = self._css.get(key)
+            if hit and hit[0] == mtime:
+                return hit[1]
+            css = CSS(filename=key, font_config=self.font_config)
+            self._css[key] = (mtime, css)
+            return css
+
+    def source_digest(self, template_name: str, css_paths: list[Path] | None = None) -> str:
+        """Digest of the template source and stylesheet bytes, so style edits invalidate cached PDFs."""
+        h = hashlib.sha256()
+        source, filename, _ = self.env.loader.get_source(self.env, template_name)
+        h.update(source.encode("utf-8"))
+        for p in css_paths or []:
+            h.update(str(p).encode("utf-8"))
+            h.update(Path(p).read_bytes())
+        return h.hexdigest()
+
+    def render_html(self, template_name: str, ctx: dict, timings: RenderTimings | None = None) -> str:
+        timings = timings or RenderTimings()
+        with timings.stage("html"):
+            return self.env.get_template(template_name).render(**ctx)
+
+    def write_pdf(self, html_str: str, output_path: Path, css_paths: list[Path] | None = None,
+                  timings: RenderTimings | None = None) -> Path:
+        timings = timings or RenderTimings()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with timings.stage("layout"):
+            css_objs = [self.stylesheet(p) for p in (css_paths or [])]
+            doc = HTML(string=html_str).render(stylesheets=css_objs, font_config=self.font_config)
+        with timings.stage("write"):
+            # write next to the target and swap in, so readers never see a partial PDF
+            tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+            doc.write_pdf(str(tmp_path))
+            os.replace(tmp_path, output_path)
+        return output_path
+
+
+_default_renderer: PdfRenderer | None = None
+
+
+def render_html_to_pdf(html_str: str, output_path: Path, css_paths: list[Path] | None = None):
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = PdfRenderer()
+    return _default_renderer.write_pdf(html_str, output_path, css_paths)
@@ -1,42 +1,99 @@
 from __future__ import annotations
+import hashlib
+import json
+import logging
 from pathlib import Path
 from datetime import date, timedelta, datetime
 from types import SimpleNamespace
+from typing import Callable
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
-from ..utils.formatting import minutes_to_hhmm
-from ..utils.pdf import render_html_to_pdf
-from ..utils.dates import week_bounds, month_bounds, year_bounds
-from ..crud.actions import (
-    totals_by_day_range,
-    totals_by_project_range,
-    totals_by_category_range,
-    total_minutes_range,
-)
+from ..settings import settings
+from ..utils.formatting import minutes_to_hhmm, report_filename
+from ..utils.pdf import PdfRenderer, RenderTimings
+from ..utils.cache import LRUCache
+from ..tenancy import cache_scope
+from ..utils.dates import week_bounds, month_bounds, year_bounds, period_bounds
 from ..crud.reports import (
-    project_progress_overview,
-    overdue_milestones,
-    upcoming_milestones,
-    times_by_project_range_map,
-    project_milestone_health,
+    aggregate_period,
+    PeriodAggregates,
+    cache_versions,
+    period_cache_key,
+    CACHE_GLOBAL,
+    CACHE_MILESTONES,
 )
 
 
+log = logging.getLogger(__name__)
+
+
 def _env(templates_dir: Path) -> Environment:
     env = Environment(
         loader=FileSystemLoader(str(templates_dir)),
         autoescape=select_autoescape(["html", "xml"]),
+        auto_reload=True,
     )
     env.filters["hhmm"] = minutes_to_hhmm
     env.globals["zip"] = zip
     return env
 
 
+_renderers: dict[Path, PdfRenderer] = {}
+
+
+def get_renderer(templates_dir: Path) -> PdfRenderer:
+    """Process-wide warm renderer for a templates dir (built on first use)."""
+    r = _renderers.get(templates_dir)
+    if r is None:
+        r = _renderers[templates_dir] = PdfRenderer(_env(templates_dir))
+    return r
+
+
 def _static_pdf_css_path(templates_dir: Path) -> Path:
     return templates_dir.parent / "static" / "css" / "pdf.css"
 
 
+REPORT_TEMPLATES = ("reports/report_week.html", "reports/report_month.html", "reports/report_year.html")
+
+
+def warm_renderer(templates_dir: Path) -> PdfRenderer:
+    """Parse pdf.css and compile the report templates ahead of the first render."""
+    r = get_renderer(templates_dir)
+    r.stylesheet(_static_pdf_css_path(templates_dir))
+    for name in REPORT_TEMPLATES:
+        r.env.get_template(name)
+    return r
+
+
+# ---------- artifact cache ----------
+
+def _json_default(o):
+    if isinstance(o, (date, datetime)):
+        return o.isoformat()
+    if isinstance(o, SimpleNamespace):
+        return vars(o)
+    if isinstance(o, Path):
+        return str(o)
+    raise TypeError(f"Cannot fingerprint {type(o).__name__}")
+
+
+def report_fingerprint(ctx: dict, renderer: PdfRenderer, include_generated: bool = False) -> str:
+    """
+    Content hash of everything that ends up in the PDF: the report context
+    (without the `generated` date unless asked) plus template and CSS sources.
+    """
+    data = {k: v for k, v in ctx.items() if include_generated or k != "generated"}
+    h = hashlib.sha256()
+    h.update(json.dumps(data, default=_json_default, sort_keys=True).encode("utf-8"))
+    h.update(renderer.source_digest(ctx["template_name"], ctx["css_paths"]).encode("ascii"))
+    return h.hexdigest()
+
+
+def artifact_path(reports_dir: Path, fingerprint: str) -> Path:
+    return reports_dir / "objects" / fingerprint[:2] / f"{fingerprint}.pdf"
+
+
 # ---------- small helpers ----------
 
 def _active_days_and_streak(day_totals: list[tuple[date, int]]):
@@ -81,39 +138,57 @@ def _enrich_projects_with_health(projects: list[SimpleNamespace], health_map: di
     return out
 
 
+def _busiest(labels: list[str], values: list[int]) -> tuple[str, int]:
+    if not values:
+        return "-", 0
+    max_idx = max(range(len(values)), key=lambda i: values[i])
+    return labels[max_idx], values[max_idx]
+
+
+def _base_context(agg: PeriodAggregates, app_name: str, templates_dir: Path,
+                  series_labels: list[str], series_values: list[int], top_n: int) -> dict:
+    """Context keys shared by the three period reports, all derived from one PeriodAggregates."""
+    busiest_label, busiest_value = _busiest(series_labels, series_values)
+    projs_raw = agg.projects[:top_n]
+    top1, top3 = _top_shares([p.total_minutes for p in projs_raw])
+    total = agg.total
+    active_days, longest_streak = _active_days_and_streak(agg.days)
+    avg_active = int(total / active_days) if active_days else 0
+    return {
+        "app_name": app_name,
+        "generated": date.today(),
+        "start": agg.start,
+        "end": agg.end,
+        "busiest_label": busiest_label,
+        "busiest_value": minutes_to_hhmm(busiest_value),
+        "series_labels": series_labels,
+        "series_values": series_values,
+        "series_max": max(series_values) if series_values else 0,
+        "categories_data": agg.categories,
+        "projects": _enrich_projects_with_health(projs_raw, agg.health),
+        "active_days": active_days,
+        "avg_active_hhmm": minutes_to_hhmm(avg_active),
+        "longest_streak": longest_streak,
+        "top1_share": f"{top1:.1f}%",
+        "top3_share": f"{top3:.1f}%",
+        "upcoming": agg.upcoming,
+        "overdue": agg.overdue,
+        "css_paths": [_static_pdf_css_path(templates_dir)],
+    }
+
+
 # ---------- weekly ----------
 
 def _weekly_context(db, start: date, app_name: str, templates_dir: Path) -> dict:
     ws, we = week_bounds(start)
-    day_totals = totals_by_day_range(db, ws, we)
-    series_labels = [d.strftime("%a") for d, _ in day_totals]
-    series_values = [m for _, m in day_totals]
-    series_max = max(series_values) if series_values else 0
-    # busiest day
-    if series_values:
-        max_idx = max(range(len(series_values)), key=lambda i: series_values[i])
-        busiest_label = series_labels[max_idx]
-        busiest_value = series_values[max_idx]
-    else:
-        busiest_label, busiest_value = "-", 0
-
-    cats = totals_by_category_range(db, ws, we)
-    projs_raw = totals_by_project_range(db, ws, we, limit=12)
-    proj_minutes_list = [p.total_minutes for p in projs_raw]
-    top1, top3 = _top_shares(proj_minutes_list)
-
-    week_total = sum(series_values)
-    active_days, longest_streak = _active_days_and_streak(day_totals)
-    avg_active = int(week_total / active_days) if active_days else 0
-
-    prog = project_progress_overview(db)
-    proj_times_map = times_by_project_range_map(db, ws, we)
-    health_map = project_milestone_health(db, we, lookahead_days=7)
-    projs = _enrich_projects_with_health(projs_raw, health_map)
+    agg = aggregate_period(db, ws, we, lookahead_days=7, limit=10)
+    series_labels = [d.strftime("%a") for d, _ in agg.days]
+    series_values = [m for _, m in agg.days]
+    ctx = _base_context(agg, app_name, templates_dir, series_labels, series_values, top_n=12)
 
     # Suggestions (GTD-friendly)
-    ups = upcoming_milestones(db, we + timedelta(days=1), we + timedelta(days=7), limit=10)
-    ods = overdue_milestones(db, we + timedelta(days=1), limit=10)
+    prog = agg.progress
+    ups, ods = agg.upcoming, agg.overdue
     suggestions = []
     for u in ups[:5]:
         p = prog.get(u.project_id)
@@ -121,39 +196,21 @@ def _weekly_context(db, start: date, app_name: str, templates_dir: Path) -> dict
             suggestions.append(f"Focus '{u.project}' → '{u.milestone}' due {u.end.strftime('%d/%m/%Y')} (progress {int(p.avg_percent)}%).")
     for o in ods[:5]:
         suggestions.append(f"Overdue '{o.project}' → '{o.milestone}' by {o.days_late} day(s).")
-    proj_with_time = {pid for pid, m in proj_times_map.items() if m > 0}
+    proj_with_time = {pid for pid, m in agg.project_minutes.items() if m > 0}
     for u in ups:
         if u.project_id not in proj_with_time:
             suggestions.append(f"Start '{u.project}': next milestone {u.end.strftime('%d/%m/%Y')} and no time logged this week.")
             break
 
-    return {
-        "app_name": app_name,
-        "generated": date.today(),
+    ctx.update({
         "series_title": "Week at a glance",
-        "start": ws,
-        "end": we,
-        "busiest_label": busiest_label,
-        "busiest_value": minutes_to_hhmm(busiest_value),
-        "series_labels": series_labels,
-        "series_values": series_values,
-        "series_max": series_max,
-        "categories_data": cats,
-        "projects": projs,
-        "week_total": week_total,
-        "week_total_hhmm": minutes_to_hhmm(week_total),
-        "active_days": active_days,
-        "avg_active_hhmm": minutes_to_hhmm(avg_active),
-        "longest_streak": longest_streak,
-        "top1_share": f"{top1:.1f}%",
-        "top3_share": f"{top3:.1f}%",
-        "upcoming": ups,
-        "overdue": ods,
+        "week_total": agg.total,
+        "week_total_hhmm": minutes_to_hhmm(agg.total),
         "suggestions": suggestions[:8],
-        "css_paths": [_static_pdf_css_path(templates_dir)],
         "template_name": "reports/report_week.html",
-        "suggested_filename": f"weekly_{ws.strftime('%Y-%m-%d')}_to_{we.strftime('%Y-%m-%d')}.pdf",
-    }
+        "suggested_filename": report_filename("weekly", ws, we),
+    })
+    return ctx
 
 
 # ---------- monthly ----------
@@ -172,72 +229,30 @@ def _monthly_context(db, start: date, app_name: str, templates_dir: Path) -> dic
         cur = ce + timedelta(days=1)
         idx += 1
 
-    values = [total_minutes_range(db, s, e) for s, e in bounds]
-    series_labels = labels
-    series_values = values
-    series_max = max(series_values) if series_values else 0
-    # busiest week-chunk
-    if series_values:
-        max_idx = max(range(len(series_values)), key=lambda i: series_values[i])
-        busiest_label = series_labels[max_idx]
-        busiest_value = series_values[max_idx]
-    else:
-        busiest_label, busiest_value = "-", 0
-
-    cats = totals_by_category_range(db, ms, me)
-    projs_raw = totals_by_project_range(db, ms, me, limit=15)
-    proj_minutes_list = [p.total_minutes for p in projs_raw]
-    top1, top3 = _top_shares(proj_minutes_list)
-
-    day_totals = totals_by_day_range(db, ms, me)
-    month_total = sum(m for _, m in day_totals)
-    active_days, longest_streak = _active_days_and_streak(day_totals)
-    avg_active = int(month_total / active_days) if active_days else 0
-
-    prog = project_progress_overview(db)
-    health_map = project_milestone_health(db, me, lookahead_days=14)
-    projs = _enrich_projects_with_health(projs_raw, health_map)
-
-    ups = upcoming_milestones(db, me + timedelta(days=1), me + timedelta(days=14), limit=20)
-    ods = overdue_milestones(db, me + timedelta(days=1), limit=20)
+    agg = aggregate_period(db, ms, me, lookahead_days=14, limit=20)
+    ctx = _base_context(agg, app_name, templates_dir, labels, agg.bucket(bounds), top_n=15)
 
+    prog = agg.progress
+    top1, _ = _top_shares([p.total_minutes for p in agg.projects[:15]])
     suggestions = []
     if top1 >= 60:
         suggestions.append("Strong focus detected. Consider checking balance across categories.")
-    for u in ups[:6]:
+    for u in agg.upcoming[:6]:
         p = prog.get(u.project_id)
         if p and p.avg_percent < 60:
             suggestions.append(f"Prepare '{u.project}' → '{u.milestone}' (due {u.end.strftime('%d/%m/%Y')}, progress {int(p.avg_percent)}%).")
-    for o in ods[:6]:
+    for o in agg.overdue[:6]:
         suggestions.append(f"Resolve overdue '{o.project}' → '{o.milestone}' ({o.days_late} day(s) late).")
 
-    return {
-        "app_name": app_name,
-        "generated": date.today(),
+    ctx.update({
         "series_title": "Weekly totals (inside month)",
-        "start": ms,
-        "end": me,
-        "busiest_label": busiest_label,
-        "busiest_value": minutes_to_hhmm(busiest_value),
-        "series_labels": series_labels,
-        "series_values": series_values,
-        "series_max": series_max,
-        "categories_data": cats,
-        "projects": projs,
-        "month_total": month_total,
-        "month_total_hhmm": minutes_to_hhmm(month_total),
-        "active_days": active_days,
-        "avg_active_hhmm": minutes_to_hhmm(avg_active),
-        "longest_streak": longest_streak,
-        "top1_share": f"{top1:.1f}%",
-        "top3_share": f"{top3:.1f}%",
-        "upcoming": ups,
-        "overdue": ods,
+        "month_total": agg.total,
+        "month_total_hhmm": minutes_to_hhmm(agg.total),
         "suggestions": suggestions[:10],
-        "css_paths": [_static_pdf_css_path(templates_dir)],
         "template_name": "reports/report_month.html",
-        "suggested_filename": f"monthly_{ms.strftime('%Y-%m')}.pdf",
-    }
+        "suggested_filename": report_filename("monthly", ms, me),
+    })
+    return ctx
 
 
 # ---------- yearly ----------
@@ -246,93 +261,128 @@ def _yearly_context(db, start: date, app_name: str, templates_dir: Path) -> dict
     ys, ye = year_bounds(start)
 
     series_labels = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
-    series_values = []
-    for month in range(1, 13):
-        ms = date(ys.year, month, 1)
-        me = (date(ys.year, month + 1, 1) - timedelta(days=1)) if month < 12 else ye
-        series_values.append(total_minutes_range(db, ms, me))
-    series_max = max(series_values) if series_values else 0
-    # busiest month
-    if series_values:
-        max_idx = max(range(len(series_values)), key=lambda i: series_values[i])
-        busiest_label = series_labels[max_idx]
-        busiest_value = series_values[max_idx]
-    else:
-        busiest_label, busiest_value = "-", 0
-
-    cats = totals_by_category_range(db, ys, ye)
-    projs_raw = totals_by_project_range(db, ys, ye, limit=20)
-    proj_minutes_list = [p.total_minutes for p in projs_raw]
-    top1, top3 = _top_shares(proj_minutes_list)
-
-    day_totals = totals_by_day_range(db, ys, ye)
-    year_total = sum(m for _, m in day_totals)
-    active_days, longest_streak = _active_days_and_streak(day_totals)
-    avg_active = int(year_total / active_days) if active_days else 0
-
-    health_map = project_milestone_health(db, ye, lookahead_days=30)
-    projs = _enrich_projects_with_health(projs_raw, health_map)
-
-    ups = upcoming_milestones(db, ye + timedelta(days=1), ye + timedelta(days=30), limit=30)
-    ods = overdue_milestones(db, ye + timedelta(days=1), limit=30)
+    bounds = [month_bounds(date(ys.year, month, 1)) for month in range(1, 13)]
+
+    agg = aggregate_period(db, ys, ye, lookahead_days=30, limit=30)
+    ctx = _base_context(agg, app_name, templates_dir, series_labels, agg.bucket(bounds), top_n=20)
 
+    _, top3 = _top_shares([p.total_minutes for p in agg.projects[:20]])
     suggestions = []
     if top3 < 50:
         suggestions.append("Attention spread across many projects. Consider limiting WIP for deeper focus.")
     # Nudge low-progress top projects
-    prog = project_progress_overview(db)
-    hot = [p for p in projs_raw[:5] if prog.get(p.project_id) and prog[p.project_id].avg_percent < 50]
+    prog = agg.progress
+    hot = [p for p in agg.projects[:5] if prog.get(p.project_id) and prog[p.project_id].avg_percent < 50]
     for h in hot:
         suggestions.append(f"Raise progress on '{h.name}' (only {int(prog[h.project_id].avg_percent)}%).")
-    for o in ods[:8]:
+    for o in agg.overdue[:8]:
         suggestions.append(f"Overdue '{o.project}' → '{o.milestone}' ({o.days_late} day(s) late).")
 
-    return {
-        "app_name": app_name,
-        "generated": date.today(),
+    ctx.update({
         "series_title": "Monthly totals",
-        "start": ys,
-        "end": ye,
-        "busiest_label": busiest_label,
-        "busiest_value": minutes_to_hhmm(busiest_value),
-        "series_labels": series_labels,
-        "series_values": series_values,
-        "series_max": series_max,
-        "categories_data": cats,
-        "projects": projs,
-        "year_total": year_total,
-        "year_total_hhmm": minutes_to_hhmm(year_total),
-        "active_days": active_days,
-        "avg_active_hhmm": minutes_to_hhmm(avg_active),
-        "longest_streak": longest_streak,
-        "top1_share": f"{top1:.1f}%",
-        "top3_share": f"{top3:.1f}%",
-        "upcoming": ups,
-        "overdue": ods,
+        "year_total": agg.total,
+        "year_total_hhmm": minutes_to_hhmm(agg.total),
         "suggestions": suggestions[:12],
-        "css_paths": [_static_pdf_css_path(templates_dir)],
         "template_name": "reports/report_year.html",
-        "suggested_filename": f"yearly_{ys.year}.pdf",
-    }
+        "suggested_filename": report_filename("yearly", ys, ye),
+    })
+    return ctx
 
 
-def render_report_pdf(templates_dir: Path, reports_dir: Path, period_type: str, start: date, app_name: str) -> Path:
-    from ..db import session_scope
+# ---------- context cache ----------
 
-    env = _env(templates_dir)
-    with session_scope() as db:
-        if period_type == "weekly":
-            ctx = _weekly_context(db, start, app_name, templates_dir)
-        elif period_type == "monthly":
-            ctx = _monthly_context(db, start, app_name, templates_dir)
-        elif period_type == "yearly":
-            ctx = _yearly_context(db, start, app_name, templates_dir)
-        else:
+_BUILDERS = {
+    "weekly": _weekly_context,
+    "monthly": _monthly_context,
+    "yearly": _yearly_context,
+}
+
+
+class ReportContextCache:
+    """
+    Read-through LRU of computed report contexts keyed by workspace, period_type and period_start.
+    Each entry carries the cache_versions stamp it was built under; a lookup reads
+    the current stamp (one small query) and rebuilds when a write has bumped it.
+    """
+
+    def __init__(self, maxsize: int):
+        self.lru = LRUCache(maxsize)
+
+    def get(self, db, period_type: str, start: date, app_name: str, templates_dir: Path) -> dict:
+        builder = _BUILDERS.get(period_type)
+        if not builder:
             raise ValueError("Unknown report type")
+        ps, _ = period_bounds(period_type, start)
+        keys = [period_cache_key(period_type, ps), CACHE_MILESTONES, CACHE_GLOBAL]
+        versions = cache_versions(db, keys)
+        stamp = tuple(versions.get(k, 0) for k in keys)
 
-    tpl = env.get_template(ctx["template_name"])
-    html = tpl.render(**ctx)
-    out_path = reports_dir / ctx["suggested_filename"]
-    render_html_to_pdf(html, out_path, css_paths=ctx["css_paths"])
-    return out_path
+        key = (cache_scope(db), period_type, ps, app_name)
+        entry = self.lru.get(key, is_valid=lambda e: e[0] == stamp)
+        if entry is None:
+            entry = (stamp, builder(db, ps, app_name, templates_dir))
+            self.lru.put(key, entry)
+        ctx = dict(entry[1])
+        ctx["generated"] = date.today()
+        return ctx
+
+    def stats(self) -> dict[str, int]:
+        return self.lru.stats()
 
+
+report_contexts = ReportContextCache(settings.report_cache_size)
+
+
+def build_report_context(db, period_type: str, start: date, app_name: str, templates_dir: Path) -> dict:
+    """Context for one report, shared by the HTML preview and the PDF path."""
+    return report_contexts.get(db, period_type, start, app_name, templates_dir)
+
+
+def render_context_html(templates_dir: Path, ctx: dict, css_href: str = "/static/css/pdf.css") -> str:
+    """Browser preview of a built context: same template as the PDF, stylesheet linked by URL."""
+    ctx["css_paths"] = [css_href]
+    return get_renderer(templates_dir).render_html(ctx["template_name"], ctx)
+
+
+def render_report_html(templates_dir: Path, period_type: str, start: date, app_name: str,
+                       css_href: str = "/static/css/pdf.css", workspace_id: int | None = None) -> str:
+    """Browser preview of a report: same context and template as the PDF."""
+    from ..db import session_scope
+
+    with session_scope(workspace_id) as db:
+        ctx = build_report_context(db, period_type, start, app_name, templates_dir)
+    return render_context_html(templates_dir, ctx, css_href)
+
+
+def render_report_pdf(
+    templates_dir: Path,
+    reports_dir: Path,
+    period_type: str,
+    start: date,
+    app_name: str,
+    progress: Callable[[int], None] | None = None,
+    workspace_id: int | None = None,
+) -> Path:
+    """PDF of one period for a workspace (all workspaces together when None)."""
+    from ..db import session_scope
+
+    report = progress or (lambda pct: None)
+    renderer = get_renderer(templates_dir)
+    timings = RenderTimings()
+    with timings.stage("context"), session_scope(workspace_id) as db:
+        ctx = build_report_context(db, period_type, start, app_name, templates_dir)
+    report(40)
+
+    fingerprint = report_fingerprint(ctx, renderer, settings.report_fingerprint_include_generated)
+    out_path = artifact_path(reports_dir, fingerprint)
+    if out_path.exists():
+        report(90)
+        log.info("reused %s for %s %s", out_path.name, ctx["suggested_filename"], timings.as_ms())
+        return out_path
+
+    html = renderer.render_html(ctx["template_name"], ctx, timings)
+    report(60)
+    renderer.write_pdf(html, out_path, css_paths=ctx["css_paths"], timings=timings)
+    report(90)
+    log.info("rendered %s as %s %s", ctx["suggested_filename"], out_path.name, timings.as_ms())
+    return out_path